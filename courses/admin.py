@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Student, Course, Enrollment, Teacher, UserProfile, CourseComment
+from .models import Student, Course, Enrollment, Teacher, UserProfile, CourseComment, WaitlistEntry
 
 
 @admin.register(UserProfile)
@@ -31,10 +31,16 @@ class StudentAdmin(admin.ModelAdmin):
 
 @admin.register(Course)
 class CourseAdmin(admin.ModelAdmin):
-    list_display = ('course_code', 'course_name', 'teacher', 'credits', 'get_current_enrollment_count', 'semester')
+    list_display = ('course_code', 'course_name', 'teacher', 'credits', 'active_enrollment_count', 'max_students', 'semester')
     search_fields = ('course_code', 'course_name', 'teacher__user__first_name')
     list_filter = ('credits', 'semester', 'created_at')
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('active_enrollment_count', 'created_at', 'updated_at')
+    actions = ['recount_enrollments']
+
+    @admin.action(description='重新計算選修人數')
+    def recount_enrollments(self, request, queryset):
+        updated = queryset.recount_active_enrollments()
+        self.message_user(request, f'已重新計算 {updated} 門課程的選修人數')
 
 
 @admin.register(Enrollment)
@@ -64,3 +70,15 @@ class CourseCommentAdmin(admin.ModelAdmin):
     def get_short_content(self, obj):
         return obj.content[:50] + '...' if len(obj.content) > 50 else obj.content
     get_short_content.short_description = '留言內容'
+
+
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ('get_user_name', 'course', 'created_at')
+    search_fields = ('user__first_name', 'user__last_name', 'course__course_code', 'course__course_name')
+    list_filter = ('course',)
+    readonly_fields = ('created_at',)
+
+    def get_user_name(self, obj):
+        return obj.user.get_full_name() or obj.user.username
+    get_user_name.short_description = '學生'
@@ -0,0 +1,125 @@
+"""
+課程目錄、課程詳情與儀表板的非同步視圖
+
+以 ASGI 部署時（gradeSystem/asgi.py 設定 ASYNC_VIEWS），urls.py 改用這裡的視圖，
+等待資料庫與慢速用戶端時不會佔住 worker 執行緒。行為與 views.py 中的同名視圖
+相同；互不相依的查詢（例如課程詳情的課程、修課名單與留言）以 asyncio.gather()
+同時送出。
+
+Django 的非同步 ORM 目前仍在單一執行緒中依序執行 SQL，gather() 省下的是
+請求之間的等待，同一個請求內的查詢要等資料庫驅動支援非同步後才會真正並行。
+
+模板渲染前所有資料都已載入，渲染時不會再觸發同步查詢。
+
+settings.MIDDLEWARE 中的中介層都必須同時支援同步與非同步，只要有一個只支援同步，
+整個請求就會改以 async_to_sync 在執行緒中執行，非同步視圖便失去意義（測試會檢查）。
+"""
+
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.shortcuts import aget_object_or_404, redirect, render
+
+from . import comments, conditional, grading, roles, views, waitlist
+from .models import Course, Enrollment
+from .pagination import apaginate, get_page_size
+
+
+async def _list(queryset):
+    return [obj async for obj in queryset]
+
+
+@conditional.conditional_page(conditional.catalog_state)
+async def course_list(request):
+    """課程列表"""
+    request.user = await request.auser()
+    search = request.GET.get('search', '')
+
+    if search:
+        page_obj = await sync_to_async(views._search_page)(request, search)
+    else:
+        courses = Course.objects.select_related('teacher__user')
+        page_obj = await apaginate(request, courses, 'course_code', get_page_size(request))
+
+    context = {
+        'courses': page_obj,
+        'page_obj': page_obj,
+        'search': search,
+        'page': 'course_list',
+        'title': '課程列表'
+    }
+    return render(request, 'courses/course_list.html', context)
+
+
+@conditional.conditional_page(conditional.course_state)
+async def course_detail(request, course_id):
+    """課程詳細信息和留言"""
+    request.user = await request.auser()
+    if request.method == 'POST':
+        # 留言的寫入沿用同步視圖
+        return await sync_to_async(views.course_detail)(request, course_id)
+
+    course, enrollments, comment_page = await asyncio.gather(
+        aget_object_or_404(Course.objects.select_related('teacher__user'), pk=course_id),
+        grading.agrade_enrollments(
+            Enrollment.objects.filter(course_id=course_id, is_active=True).select_related('user')
+        ),
+        comments.acomment_page(course_id, views._comment_cursor(request)),
+    )
+
+    user_enrollment = None
+    user_comment = None
+    if request.user.is_authenticated:
+        user_enrollment = next((e for e in enrollments if e.user_id == request.user.pk), None)
+        user_comment = await views._user_comments(course_id, request.user).afirst()
+
+    context = {
+        'course': course,
+        'enrollments': enrollments,
+        'comments': comment_page,
+        'can_comment': user_enrollment is not None,
+        'user_enrollment': user_enrollment,
+        'user_comment': user_comment,
+        'page': 'course_detail',
+        'title': f'{course.course_name} - 課程詳情'
+    }
+    return render(request, 'courses/course_detail.html', context)
+
+
+@roles.role_required('student', message='只有學生可以訪問此頁面')
+@conditional.conditional_page(conditional.student_state)
+async def student_dashboard(request):
+    """學生成績單"""
+    user = request.user
+    enrollments = await grading.agrade_enrollments(
+        Enrollment.objects.filter(user=user, is_active=True).select_related('course__teacher__user')
+    )
+    summary = grading.summarize(enrollments)
+
+    context = {
+        'user': user,
+        'enrollments': enrollments,
+        'waitlist': await _list(waitlist.entries_for(user)),
+        'average_score': summary['average_score'],
+        'gpa': summary['gpa'],
+        'page': 'student_dashboard',
+        'title': f'{user.get_full_name()}的成績單'
+    }
+    return render(request, 'courses/student_dashboard.html', context)
+
+
+@roles.role_required('teacher', message='只有教師可以訪問此頁面')
+@conditional.conditional_page(conditional.teacher_state)
+async def teacher_dashboard(request):
+    """教師儀表板"""
+    teacher = roles.get_teacher(request.user)
+    if teacher is None:
+        return redirect('courses:complete_profile')
+
+    context = {
+        'teacher': teacher,
+        'courses': await _list(teacher.get_courses()),
+        'page': 'teacher_dashboard',
+        'title': f'{request.user.get_full_name()}的教師儀表板'
+    }
+    return render(request, 'courses/teacher_dashboard.html', context)
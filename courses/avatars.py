@@ -0,0 +1,125 @@
+"""
+頭像處理
+
+使用者上傳頭像後，交易提交時才交給背景執行緒池處理，請求不必等待圖片解碼與
+縮放；個人資料儲存但頭像沒有更換時完全不處理（見 UserProfile.save()）。
+
+每張頭像產生 settings.AVATAR_SIZES（32/64/300 px）的正方形縮圖，各有一份原格式
+（有透明度時為 PNG，否則為 JPEG）與一份 WebP（Pillow 不支援 WebP 時略過），
+檔名記在 UserProfile.avatar_renditions，例如 {'32': '..._32.jpg', '32.webp': '..._32.webp'}。
+原始檔案保留不動。
+
+大型 JPEG 以 Image.draft() 讓解碼器直接以 1/2、1/4、1/8 的比例解碼，只展開
+足以產生最大縮圖的像素，不必先解出整張數千萬像素的原圖。
+
+settings.AVATAR_WORKERS 為背景執行緒數，設為 0 時在交易提交後同步處理
+（測試與管理命令使用）。縮圖尚未產生前，模板退回使用原圖。
+"""
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.AVATAR_WORKERS, thread_name_prefix='avatars')
+    return _executor
+
+
+def schedule(profile, previous=None):
+    """交易提交後處理 profile 目前的頭像，完成後刪除舊頭像的縮圖 previous"""
+    args = (profile.pk, profile.avatar.name, previous)
+
+    def submit():
+        if settings.AVATAR_WORKERS:
+            _get_executor().submit(_run, *args)
+        else:
+            process(*args)
+
+    transaction.on_commit(submit)
+
+
+def _run(profile_id, name, previous):
+    try:
+        process(profile_id, name, previous)
+    except Exception:
+        logger.exception('頭像處理失敗：%s', name)
+    finally:
+        # 背景執行緒有自己的資料庫連線，處理完就關閉
+        connections.close_all()
+
+
+def _open(storage, name, size):
+    with storage.open(name) as f:
+        image = Image.open(BytesIO(f.read()))
+    if image.format == 'JPEG':
+        # 短邊縮到不小於 size 即可，解碼器只產生需要的像素
+        scale = size / min(image.size)
+        image.draft('RGB', (round(image.width * scale), round(image.height * scale)))
+    return ImageOps.exif_transpose(image)
+
+
+def _encode(image, fmt):
+    buffer = BytesIO()
+    if fmt == 'JPEG':
+        image.convert('RGB').save(buffer, 'JPEG', quality=85, optimize=True)
+    else:
+        image.save(buffer, fmt, **({'quality': 80} if fmt == 'WEBP' else {'optimize': True}))
+    return buffer.getvalue()
+
+
+def render(storage, name, sizes):
+    """產生縮圖，回傳 {鍵: (副檔名, 位元組)}"""
+    image = _open(storage, name, max(sizes))
+    has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+    fmt, ext = ('PNG', 'png') if has_alpha else ('JPEG', 'jpg')
+    webp = features.check('webp')
+
+    outputs = {}
+    for size in sorted(sizes, reverse=True):
+        # 由大到小縮放，較小的尺寸以上一張縮圖為來源
+        image = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+        outputs[str(size)] = (ext, _encode(image, fmt))
+        if webp:
+            outputs[f'{size}.webp'] = ('webp', _encode(image, 'WEBP'))
+    return outputs
+
+
+def process(profile_id, name, previous=None):
+    """為頭像 name 產生縮圖；頭像在處理期間又被更換時放棄結果"""
+    from . import roles
+    from .models import UserProfile
+
+    storage = UserProfile._meta.get_field('avatar').storage
+    base = os.path.splitext(name)[0]
+    renditions = {}
+    for key, (ext, data) in render(storage, name, settings.AVATAR_SIZES).items():
+        size = key.split('.')[0]
+        renditions[key] = storage.save(f'{base}_{size}.{ext}', ContentFile(data))
+
+    updated = UserProfile.objects.filter(pk=profile_id, avatar=name).update(
+        avatar_renditions=renditions,
+        updated_at=timezone.now(),
+    )
+    stale = renditions if not updated else (previous or {})
+    for rendition in stale.values():
+        storage.delete(rendition)
+    if updated:
+        # update() 不觸發 signals，自行清除使用者快取
+        user_id = UserProfile.objects.filter(pk=profile_id).values_list('user_id', flat=True).first()
+        roles.invalidate_user(user_id)
+    return renditions if updated else None
@@ -0,0 +1,16 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth.backends import ModelBackend
+
+from . import roles
+
+
+class CachedModelBackend(ModelBackend):
+    """以 roles.get_user() 載入 request.user（含 profile 與 teacher，並經過快取）"""
+
+    def get_user(self, user_id):
+        user = roles.get_user(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        # ModelBackend.aget_user() 直接查詢資料庫，改為經過同一層快取
+        return await sync_to_async(self.get_user)(user_id)
@@ -0,0 +1,329 @@
+"""
+端到端效能基準
+
+benchmark_suite 命令在 seeding 產生的 small/medium/large 資料集上，以 Django 測試
+用戶端（完整經過 URL、中介層、視圖與模板）重複執行各熱門路徑：
+
+- catalog：未登入瀏覽課程目錄，隨機翻到某一頁；
+- search：以科目名稱搜尋課程；
+- course_detail：未登入瀏覽課程詳情；
+- student_dashboard：學生儀表板；
+- grade_entry：教師以 JSON API 批次登錄 GRADE_ROWS 位學生的成績；
+- enrollment_burst：一批學生輪流選修同幾門熱門課程（每次選課後不計時地退選，名額不變）；
+- admin_counts：管理員儀表板的統計數字（admin/ 被 Django admin 佔用，直接呼叫視圖）；
+- login：以種子密碼登入，包含密碼雜湊驗證。
+
+每個情境先暖身 warmup 次，之後記錄每個請求的耗時與查詢數，彙總為 p50/p95/p99、
+平均查詢數與目前行程的最高 RSS（Linux 的 ru_maxrss，為整個行程至今的最大值）。
+亂數種子固定，同一份資料集上每次執行的請求序列相同，查詢數可以逐筆比較。
+
+compare() 將結果與先前儲存的基準比較：p95 延遲與最高 RSS 超出容許比例、平均查詢數
+增加或有請求失敗時列為退化。
+
+SQLite 的資料集由 dataset() 管理：第一次使用時在子行程中以 seed 命令於 BENCHMARK_DIR
+建立（{size}.sqlite3，之後重複使用），每次執行時複製一份工作副本，選課與成績登錄的寫入
+不會改變資料集，結束後刪除副本。其他資料庫請先以 seed 命令填入資料，再以
+--current-db 直接量測。
+"""
+
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection, connections, reset_queries
+from django.db.models import F
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import database, seats, seeding, views
+from .models import Course, Enrollment
+
+# 情境名稱、說明與相對成本（login 每次要驗證一次 PBKDF2，請求數為其他情境的 1/cost）
+SCENARIOS = {
+    'catalog': ('課程目錄', 1),
+    'search': ('課程搜尋', 1),
+    'course_detail': ('課程詳情', 1),
+    'student_dashboard': ('學生儀表板', 1),
+    'grade_entry': ('成績登錄', 1),
+    'enrollment_burst': ('選課尖峰', 1),
+    'admin_counts': ('管理員統計', 1),
+    'login': ('登入', 10),
+}
+
+MIN_REQUESTS = 5
+# 登入後重複使用的學生用戶端數、選課尖峰的熱門課程數與每次登錄成績的筆數
+CLIENTS = 20
+HOT_COURSES = 3
+GRADE_ROWS = 20
+
+# 比較基準時 p95 延遲的最小容許差距（毫秒），避免極短的請求因誤差被判定退化
+LATENCY_SLACK_MS = 1.0
+
+
+def _remove(path):
+    for suffix in ('', '-wal', '-shm'):
+        Path(f'{path}{suffix}').unlink(missing_ok=True)
+
+
+def _use(names):
+    """切換各連線的 SQLite 檔案，names 為 {別名: 路徑}"""
+    connections.close_all()
+    for alias, name in names.items():
+        connections[alias].settings_dict['NAME'] = str(name)
+
+
+def _build(size, path):
+    """在子行程中建立資料集，種子資料佔用的記憶體不計入量測行程的最高 RSS"""
+    env = {
+        **os.environ,
+        'DB_NAME': str(path),
+        'PYTHONPATH': os.pathsep.join(filter(None, [str(settings.BASE_DIR), os.environ.get('PYTHONPATH')])),
+    }
+    for args in (['migrate', '--verbosity', '0'], ['seed', '--size', size]):
+        subprocess.run([sys.executable, '-m', 'django', *args], env=env, check=True)
+
+
+@contextmanager
+def dataset(size, directory, rebuild=False):
+    """切換到 size 資料集的工作副本，結束後刪除副本並恢復原本的資料庫設定"""
+    if connection.vendor != 'sqlite':
+        raise ImproperlyConfigured('自動建立資料集只支援 SQLite，其他資料庫請先執行 seed 後使用 --current-db')
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    template, work = directory / f'{size}.sqlite3', directory / f'{size}.run.sqlite3'
+    original = {alias: connections[alias].settings_dict['NAME'] for alias in connections}
+    try:
+        if rebuild:
+            _remove(template)
+        if not template.exists():
+            # 先寫入暫存檔，種子資料完整產生後才改名，中斷時不會留下不完整的資料集
+            building = directory / f'{size}.building.sqlite3'
+            _remove(building)
+            _build(size, building)
+            os.replace(building, template)
+        _use(dict.fromkeys(original, template))
+        # 資料集建立後新增的 migration
+        call_command('migrate', verbosity=0)
+        _remove(work)
+        database.copy_sqlite(connection, work)
+        _use(dict.fromkeys(original, work))
+        # 快取中的版本號與頁面屬於原本的資料庫
+        cache.clear()
+        yield
+    finally:
+        _use(original)
+        _remove(work)
+        cache.clear()
+
+
+def dataset_counts():
+    return {
+        'users': User.objects.count(),
+        'courses': Course.objects.count(),
+        'enrollments': Enrollment.objects.count(),
+    }
+
+
+def peak_rss_mb():
+    """目前行程的最高 RSS（MB），平台不支援時回傳 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KiB 為單位，macOS 以位元組為單位
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+class Workload:
+    """在目前資料庫中前綴為 prefix 的種子資料上產生各情境的請求"""
+
+    def __init__(self, prefix='seed', random_seed=0, password=seeding.SEED_PASSWORD):
+        self.rng = random.Random(random_seed)
+        self.password = password
+        students = User.objects.filter(username__startswith=f'{prefix}-s').order_by('pk')
+        if not students.exists():
+            raise ValueError(f'找不到前綴為 {prefix}- 的種子資料')
+        self.student_names = list(students.values_list('username', flat=True))
+        self.course_ids = list(
+            Course.objects.filter(course_code__startswith=f'{prefix}-').order_by('pk').values_list('pk', flat=True)
+        )
+        self.course_codes = list(
+            Course.objects.filter(pk__in=self.course_ids).order_by('course_code').values_list('course_code', flat=True)
+        )
+        self.admin = User.objects.get(username=f'{prefix}-admin')
+
+        self.clients = [self._client(user) for user in self.rng.sample(list(students[:CLIENTS * 10]), CLIENTS)]
+
+        # 成績登錄：選課人數最多的課程與其教師
+        graded = (
+            Course.objects.filter(pk__in=self.course_ids, teacher__isnull=False)
+            .order_by('-active_enrollment_count', 'pk')
+            .select_related('teacher__user')
+            .first()
+        )
+        self.grade_course = graded
+        self.teacher_client = self._client(graded.teacher.user)
+        self.grade_enrollments = list(
+            Enrollment.objects.filter(course=graded, is_active=True).values_list('pk', flat=True)
+        )
+
+        # 選課尖峰：仍有名額的熱門課程，以及都沒有選修這些課程的一批學生
+        self.hot_courses = list(
+            Course.objects.filter(pk__in=self.course_ids, active_enrollment_count__lt=F('max_students'))
+            .order_by('-active_enrollment_count', 'pk')[:HOT_COURSES]
+        )
+        burst_users = students.exclude(enrollment_set__course__in=self.hot_courses)[:CLIENTS]
+        self.burst_clients = [(user, self._client(user)) for user in burst_users]
+        self.burst_turn = 0
+
+        self.factory = RequestFactory()
+
+    @staticmethod
+    def _client(user):
+        client = Client()
+        client.force_login(user)
+        return client
+
+    def catalog(self):
+        return Client().get(reverse('courses:course_list'), {'after': self.rng.choice(self.course_codes)})
+
+    def search(self):
+        return Client().get(reverse('courses:course_list'), {'search': self.rng.choice(seeding.SUBJECTS)})
+
+    def course_detail(self):
+        return Client().get(reverse('courses:course_detail', args=[self.rng.choice(self.course_ids)]))
+
+    def student_dashboard(self):
+        return self.rng.choice(self.clients).get(reverse('courses:student_dashboard'))
+
+    def grade_entry(self):
+        rows = [
+            {'enrollment_id': pk, 'midterm_score': self.rng.randint(0, 100), 'final_score': self.rng.randint(0, 100)}
+            for pk in self.rng.sample(self.grade_enrollments, min(GRADE_ROWS, len(self.grade_enrollments)))
+        ]
+        return self.teacher_client.post(
+            reverse('courses:teacher_course_grades', args=[self.grade_course.pk]),
+            json.dumps({'grades': rows}),
+            content_type='application/json',
+        )
+
+    def enrollment_burst(self):
+        user, client = self.burst_clients[self.burst_turn % len(self.burst_clients)]
+        course = self.hot_courses[self.burst_turn % len(self.hot_courses)]
+        self.burst_turn += 1
+        return client.post(reverse('courses:add_enrollment', args=[course.pk]))
+
+    def enrollment_burst_cleanup(self):
+        """退選上一次選修的課程，讓名額維持不變"""
+        turn = self.burst_turn - 1
+        user = self.burst_clients[turn % len(self.burst_clients)][0]
+        course = self.hot_courses[turn % len(self.hot_courses)]
+        enrollment = Enrollment.objects.filter(user=user, course=course, is_active=True).first()
+        if enrollment is not None:
+            seats.release_seat(enrollment)
+
+    def admin_counts(self):
+        request = self.factory.get('/admin/')
+        request.user = self.admin
+        return views.admin_dashboard(request)
+
+    def login(self):
+        return Client().post(reverse('courses:login'), {
+            'username': self.rng.choice(self.student_names),
+            'password': self.password,
+        })
+
+
+def _quantiles(values):
+    if len(values) < 2:
+        value = values[0] if values else None
+        return value, value, value
+    cuts = statistics.quantiles(values, n=100, method='inclusive')
+    return cuts[49], cuts[94], cuts[98]
+
+
+def run_scenario(workload, name, requests, warmup=MIN_REQUESTS):
+    """執行單一情境，回傳彙總結果"""
+    op = getattr(workload, name)
+    cleanup = getattr(workload, f'{name}_cleanup', None)
+    latencies, queries, errors = [], [], []
+    for i in range(warmup + requests):
+        # DEBUG 時 queries_log 有長度上限，額滿後 CaptureQueriesContext 會算不到新的查詢
+        reset_queries()
+        start = time.perf_counter()
+        with CaptureQueriesContext(connection) as captured:
+            response = op()
+        elapsed = time.perf_counter() - start
+        if cleanup is not None:
+            cleanup()
+        if i < warmup:
+            continue
+        # 成功的請求為 200 或重新導向（選課與登入）
+        if response.status_code not in (200, 302):
+            errors.append(response.status_code)
+        latencies.append(elapsed * 1000)
+        queries.append(len(captured))
+
+    p50, p95, p99 = _quantiles(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'p50_ms': p50,
+        'p95_ms': p95,
+        'p99_ms': p99,
+        'mean_ms': statistics.fmean(latencies),
+        'queries_per_request': statistics.fmean(queries),
+        'max_queries': max(queries),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def run(workload, requests, scenarios=tuple(SCENARIOS), warmup=MIN_REQUESTS, log=None):
+    """依序執行 scenarios，回傳 {情境: 結果}"""
+    results = {}
+    for name in scenarios:
+        count = max(MIN_REQUESTS, requests // SCENARIOS[name][1])
+        results[name] = run_scenario(workload, name, count, min(warmup, count))
+        if log:
+            log(name, results[name])
+    return results
+
+
+def compare(results, baseline, tolerance=0.25):
+    """
+    比較 {資料集: {情境: 結果}} 與基準，回傳退化說明的列表；
+    基準中沒有的資料集或情境不比較
+    """
+    regressions = []
+    for dataset, scenarios in results.items():
+        for name, current in scenarios.items():
+            label = f'{dataset}/{name}'
+            if current['errors']:
+                regressions.append(f"{label}：{current['errors']} 個請求失敗")
+            base = baseline.get(dataset, {}).get(name)
+            if base is None:
+                continue
+            limit = base['p95_ms'] * (1 + tolerance) + LATENCY_SLACK_MS
+            if current['p95_ms'] > limit:
+                regressions.append(f"{label}：p95 {current['p95_ms']:.1f} ms，基準 {base['p95_ms']:.1f} ms")
+            if round(current['queries_per_request'], 1) > round(base['queries_per_request'], 1):
+                regressions.append(
+                    f"{label}：平均查詢數 {current['queries_per_request']:.1f}，基準 {base['queries_per_request']:.1f}"
+                )
+            if current['peak_rss_mb'] and base.get('peak_rss_mb') and \
+                    current['peak_rss_mb'] > base['peak_rss_mb'] * (1 + tolerance):
+                regressions.append(f"{label}：最高 RSS {current['peak_rss_mb']:.0f} MB，基準 {base['peak_rss_mb']:.0f} MB")
+    return regressions
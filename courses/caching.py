@@ -0,0 +1,112 @@
+"""
+版本化快取與模板片段快取
+
+每個 Course、Teacher、User 在快取中有一個版本號，片段快取的鍵由片段名稱、
+相依物件的版本號與 vary 值組成。模型儲存或刪除時 signals 呼叫 bump() 遞增版本號，
+舊的片段不必逐一刪除，自然因鍵不再被使用而過期。
+
+版本號初始值取目前時間（奈秒），即使版本號被快取淘汰後重建，也不會與舊片段的
+鍵相同。
+
+快取後端由 settings.CACHES 決定（locmem、file、redis，見 settings.py），
+命中與未命中次數記在同一個快取中，可用 manage.py cache_stats 查看命中率
+（locmem 後端只在各行程內有效，跨 worker 的統計需使用 file 或 redis）。
+"""
+
+import hashlib
+import time
+
+from django.core.cache import cache
+
+# 可快取的片段與逾時秒數
+FRAGMENTS = {
+    'catalog_card': 60 * 10,
+    'course_header': 60 * 10,
+    'teacher_info': 60 * 10,
+    'teacher_course_card': 60 * 10,
+}
+
+# 版本號與計數器不會過期
+VERSION_TIMEOUT = None
+
+
+def _version_key(kind, pk):
+    return f'courses:version:{kind}:{pk}'
+
+
+def _counter_key(name, outcome):
+    return f'courses:fragment:{outcome}:{name}'
+
+
+def get_versions(deps):
+    """以一次快取讀取取得多個 (kind, pk) 的版本號，沒有時初始化"""
+    keys = [_version_key(kind, pk) for kind, pk in deps]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            initial = time.time_ns()
+            # 其他 worker 可能同時初始化，以 add() 保留先寫入的值
+            if not cache.add(key, initial, VERSION_TIMEOUT):
+                initial = cache.get(key, initial)
+            versions[key] = initial
+    return [versions[key] for key in keys]
+
+
+def bump(kind, pk):
+    """使 (kind, pk) 相關的片段全部失效"""
+    key = _version_key(kind, pk)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), VERSION_TIMEOUT)
+
+
+def _incr(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, VERSION_TIMEOUT):
+            cache.incr(key)
+
+
+def fragment_key(name, deps, vary=None):
+    """片段快取鍵；deps 為 (kind, pk) 列表，vary 為額外區分的值"""
+    versions = get_versions(deps)
+    parts = [f'{kind}:{pk}:{version}' for (kind, pk), version in zip(deps, versions)]
+    parts.append(repr(vary))
+    digest = hashlib.md5('|'.join(parts).encode(), usedforsecurity=False).hexdigest()
+    return f'courses:fragment:{name}:{digest}'
+
+
+def get_fragment(name, deps, render, vary=None):
+    """取得快取的片段，未命中時呼叫 render() 產生並存入快取"""
+    key = fragment_key(name, deps, vary)
+    content = cache.get(key)
+    if content is not None:
+        _incr(_counter_key(name, 'hits'))
+        return content
+    _incr(_counter_key(name, 'misses'))
+    content = render()
+    cache.set(key, content, FRAGMENTS[name])
+    return content
+
+
+def fragment_stats():
+    """各片段的命中與未命中次數：{名稱: {'hits', 'misses', 'hit_rate'}}"""
+    keys = [_counter_key(name, outcome) for name in FRAGMENTS for outcome in ('hits', 'misses')]
+    counts = cache.get_many(keys)
+    result = {}
+    for name in FRAGMENTS:
+        hits = counts.get(_counter_key(name, 'hits'), 0)
+        misses = counts.get(_counter_key(name, 'misses'), 0)
+        total = hits + misses
+        result[name] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total * 100, 2) if total else None,
+        }
+    return result
+
+
+def reset_fragment_stats():
+    cache.delete_many([_counter_key(name, outcome) for name in FRAGMENTS for outcome in ('hits', 'misses')])
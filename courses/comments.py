@@ -0,0 +1,133 @@
+"""
+課程留言的分頁與條件式請求
+
+熱門課程累積數千則留言，課程詳情頁只顯示最新的一頁，「載入更多」以 keyset 分頁
+往前翻：游標為最後一則留言的 (created_at, id)，以
+WHERE created_at < t OR (created_at = t AND id < i) ORDER BY created_at DESC, id DESC
+取代 OFFSET，配合 comment_course_feed_idx 索引只讀取需要的列。
+
+輪詢新留言的用戶端以 since 游標取得之後新增的留言，並以 ETag/Last-Modified 發出
+條件式請求。每門課程留言的最後異動時間記在快取中，由 signals 在留言儲存或刪除時
+呼叫 touch() 更新；沒有變更時 changed_at() 只讀取快取，回應 304 不必查詢資料庫。
+快取中沒有記錄時以目前時間初始化，最多讓用戶端多取一次完整回應，不會誤判為未變更。
+Last-Modified 只精確到秒，同一秒內的異動要靠 ETag 區分，用戶端應優先使用 If-None-Match。
+locmem 快取只在各行程內有效，多 worker 部署需使用 file 或 redis 後端（見 settings.py）。
+
+acomment_page() 是 comment_page() 的非同步版本，供 async_views 使用。
+"""
+
+import hashlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import CourseComment
+from .pagination import KeysetPage
+
+PAGE_SIZE = 20
+
+# 異動時間與 caching 的版本號一樣不會過期
+CHANGED_TIMEOUT = None
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def encode_cursor(comment):
+    """留言的游標：建立時間（微秒）與 id"""
+    micros = (comment.created_at - _EPOCH) // timedelta(microseconds=1)
+    return f'{micros}_{comment.pk}'
+
+
+def decode_cursor(cursor):
+    """解析游標，格式錯誤時拋出 ValueError"""
+    micros, _, pk = cursor.partition('_')
+    try:
+        return _EPOCH + timedelta(microseconds=int(micros)), int(pk)
+    except OverflowError:
+        raise ValueError(f'無效的游標：{cursor}')
+
+
+def _base_queryset(course_id):
+    return CourseComment.objects.filter(course_id=course_id).select_related('user')
+
+
+def _older_queryset(course_id, before, per_page):
+    queryset = _base_queryset(course_id).order_by('-created_at', '-id')
+    if before:
+        created_at, pk = decode_cursor(before)
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+    # 多取一筆用來判斷是否還有更早的留言
+    return queryset[:per_page + 1]
+
+
+def _newer_queryset(course_id, since, per_page):
+    created_at, pk = decode_cursor(since)
+    queryset = _base_queryset(course_id).order_by('created_at', 'id')
+    queryset = queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk))
+    return queryset[:per_page + 1]
+
+
+def _page(rows, cursor, per_page):
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    next_cursor = encode_cursor(rows[-1]) if has_next else None
+    return KeysetPage(rows, has_next, next_cursor, cursor)
+
+
+def comment_page(course_id, before=None, per_page=PAGE_SIZE):
+    """由新到舊取出 before 游標之前的 per_page 則留言"""
+    return _page(list(_older_queryset(course_id, before, per_page)), before, per_page)
+
+
+async def acomment_page(course_id, before=None, per_page=PAGE_SIZE):
+    """comment_page() 的非同步版本"""
+    rows = [row async for row in _older_queryset(course_id, before, per_page)]
+    return _page(rows, before, per_page)
+
+
+def newer_comments(course_id, since, per_page=PAGE_SIZE):
+    """由舊到新取出 since 游標之後新增的 per_page 則留言，next_cursor 為下一次的 since"""
+    return _page(list(_newer_queryset(course_id, since, per_page)), since, per_page)
+
+
+def _changed_key(course_id):
+    return f'courses:comments:changed:{course_id}'
+
+
+def changed_at(course_id):
+    """課程留言的最後異動時間，快取中沒有記錄時以目前時間初始化"""
+    key = _changed_key(course_id)
+    value = cache.get(key)
+    if value is None:
+        value = timezone.now()
+        if not cache.add(key, value, CHANGED_TIMEOUT):
+            value = cache.get(key, value)
+    return value
+
+
+def touch(course_id):
+    """留言新增、編輯或刪除後更新異動時間"""
+    cache.set(_changed_key(course_id), timezone.now(), CHANGED_TIMEOUT)
+
+
+def feed_etag(request, course_id):
+    """同一門課程、同一組查詢參數，留言未異動時 ETag 不變"""
+    raw = f'{course_id}|{changed_at(course_id).isoformat()}|{request.GET.urlencode()}'
+    return hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest()
+
+
+def feed_last_modified(request, course_id):
+    return changed_at(course_id)
+
+
+def serialize(comment):
+    return {
+        'id': comment.pk,
+        'author': comment.user.get_full_name() or comment.user.username,
+        'content': comment.content,
+        'created_at': timezone.localtime(comment.created_at).isoformat(),
+        'edited': comment.created_at != comment.updated_at,
+        'cursor': encode_cursor(comment),
+    }
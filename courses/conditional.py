@@ -0,0 +1,150 @@
+"""
+唯讀頁面的條件式請求（ETag/Last-Modified）與 Cache-Control
+
+課程目錄、課程詳情與儀表板以 conditional_page() 包裝，先以一個彙總查詢取得頁面
+相依資料的狀態（最後更新時間與筆數），內容沒有變更時直接回應 304，不執行視圖也不
+渲染模板：
+- 課程目錄：Course 的 MAX(updated_at) 與課程數（選修人數與授課教師姓名異動時，
+  seats 與 signals 會一併更新 Course.updated_at）；
+- 課程詳情：該課程的 updated_at 與選課記錄的 MAX(updated_at)，留言沿用
+  comments.changed_at()（快取中的異動時間，不需查詢）；
+- 學生儀表板：自己選課記錄與所屬課程的 MAX(updated_at) 及選課數，另加候補記錄的
+  MAX(id) 與筆數（名次由頁面輪詢 course_waitlist_api 更新，不列入狀態）；
+- 教師儀表板：自己課程的 MAX(updated_at) 與課程數，教師資料沿用 caching 的版本號。
+
+ETag 另外包含完整路徑（查詢參數）與登入者的身分（姓名、個人資料更新時間），
+同一網址對不同使用者不會誤用彼此的快取。
+
+未登入的回應標示為 public，反向代理可快取 PUBLIC_PAGE_MAX_AGE 秒，過期後以
+ETag 重新驗證；登入後的頁面標示為 private, no-cache，只存在瀏覽器，每次都重新驗證。
+有待顯示的訊息（django.contrib.messages）時照常渲染並標示為 private。
+"""
+
+import hashlib
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.models import User
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from . import caching, comments, roles
+from .models import Course, Enrollment
+
+
+def catalog_state(request):
+    state = Course.objects.aggregate(latest=Max('updated_at'), count=Count('pk'))
+    return [state['latest'], state['count']]
+
+
+def course_state(request, course_id):
+    enrollments_latest = (
+        Enrollment.objects.filter(course=OuterRef('pk'))
+        .order_by()
+        .values('course')
+        .annotate(latest=Max('updated_at'))
+        .values('latest')
+    )
+    row = (
+        Course.objects.filter(pk=course_id)
+        .annotate(enrollments_latest=Subquery(enrollments_latest))
+        .values_list('updated_at', 'enrollments_latest')
+        .first()
+    )
+    if row is None:
+        return None
+    return [*row, comments.changed_at(course_id)]
+
+
+def student_state(request):
+    # 以使用者為起點 LEFT JOIN 選課與候補記錄，一次查詢取得兩者的狀態
+    state = User.objects.filter(pk=request.user.pk).aggregate(
+        latest=Max('enrollment_set__updated_at'),
+        course_latest=Max('enrollment_set__course__updated_at'),
+        count=Count('enrollment_set', distinct=True),
+        waiting_last=Max('waitlist_entries__pk'),
+        waiting=Count('waitlist_entries', distinct=True),
+    )
+    return list(state.values())
+
+
+def teacher_state(request):
+    teacher = roles.get_teacher(request.user)
+    if teacher is None:
+        return None
+    state = Course.objects.filter(teacher=teacher).aggregate(latest=Max('updated_at'), count=Count('pk'))
+    return [state['latest'], state['count'], *caching.get_versions([('teacher', teacher.pk)])]
+
+
+def _identity(user):
+    if not user.is_authenticated:
+        return None
+    profile = getattr(user, 'profile', None)
+    return [user.pk, user.get_full_name(), profile and profile.updated_at]
+
+
+def _validators(state_func, request, args, kwargs):
+    """回傳 (ETag, Last-Modified 時間戳記, 是否可公開快取)，不適用條件式請求時回傳 None"""
+    if request.method not in ('GET', 'HEAD') or len(messages.get_messages(request)):
+        return None
+    state = state_func(request, *args, **kwargs)
+    if state is None:
+        return None
+    identity = _identity(request.user)
+    parts = [request.get_full_path(), identity, *state]
+    etag = hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest()
+    times = [value for value in state if hasattr(value, 'timestamp')]
+    last_modified = int(max(times).timestamp()) if times else None
+    return f'"{etag}"', last_modified, identity is None
+
+
+def _finish(response, validators):
+    public = False
+    if validators is not None and response.status_code in (200, 304):
+        etag, last_modified, public = validators
+        response.headers.setdefault('ETag', etag)
+        if last_modified is not None:
+            response.headers.setdefault('Last-Modified', http_date(last_modified))
+    if public and not response.cookies:
+        patch_cache_control(response, public=True, max_age=settings.PUBLIC_PAGE_MAX_AGE)
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Cookie'])
+    return response
+
+
+def _not_modified(request, validators):
+    if validators is None:
+        return None
+    etag, last_modified, _ = validators
+    return get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+
+def conditional_page(state_func):
+    """
+    以 state_func(request, *args, **kwargs) 回傳的狀態列表產生 ETag/Last-Modified，
+    狀態為 None 時（例如課程不存在）照常執行視圖。支援同步與非同步視圖。
+    """
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def wrapper(request, *args, **kwargs):
+                validators = await sync_to_async(_validators)(state_func, request, args, kwargs)
+                response = _not_modified(request, validators)
+                if response is None:
+                    response = await view_func(request, *args, **kwargs)
+                return _finish(response, validators)
+        else:
+            @wraps(view_func)
+            def wrapper(request, *args, **kwargs):
+                validators = _validators(state_func, request, args, kwargs)
+                response = _not_modified(request, validators)
+                if response is None:
+                    response = view_func(request, *args, **kwargs)
+                return _finish(response, validators)
+        return wrapper
+    return decorator
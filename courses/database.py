@@ -0,0 +1,73 @@
+"""
+資料庫連線設定
+
+SQLite 預設使用 rollback journal：寫入時整個檔案被鎖住，其他連線連讀取都要等待，
+選課或登錄成績的尖峰時段容易出現 "database is locked"。連線建立時由 signals
+呼叫 configure_connection()，依 settings.SQLITE_PRAGMAS 設定：
+- journal_mode=WAL：讀取不會被寫入擋住，寫入之間仍互斥；
+- synchronous=NORMAL：WAL 模式下只在 checkpoint 時 fsync，斷電最多遺失最後幾筆交易，
+  資料庫不會損毀；
+- busy_timeout：取不到寫入鎖時等待的毫秒數，而不是立刻失敗；
+- mmap_size、cache_size：以記憶體映射與較大的頁面快取減少讀取的系統呼叫。
+
+其他資料庫不受影響。
+
+replicate() 是本機測試讀寫分離（routers.py）用的副本複製：以 SQLite 的線上備份
+API 將主資料庫整個複製到副本檔案。正式環境的副本應由資料庫本身的複製機制維護。
+"""
+
+import sqlite3
+from contextlib import closing
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# SQLite 本身的預設值（busy_timeout 為 Python sqlite3 模組預設的 5 秒），供效能比較用
+SQLITE_DEFAULTS = {
+    'journal_mode': 'DELETE',
+    'synchronous': 'FULL',
+    'busy_timeout': 5000,
+    'mmap_size': 0,
+    'cache_size': -2000,
+}
+
+
+def apply_pragmas(connection, pragmas):
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def configure_connection(connection):
+    """新連線建立時套用 settings.SQLITE_PRAGMAS"""
+    if connection.vendor == 'sqlite':
+        apply_pragmas(connection, getattr(settings, 'SQLITE_PRAGMAS', {}))
+
+
+def pragma_values(connection, names=tuple(SQLITE_DEFAULTS)):
+    """目前連線的 PRAGMA 值"""
+    values = {}
+    with connection.cursor() as cursor:
+        for name in names:
+            cursor.execute(f'PRAGMA {name}')
+            row = cursor.fetchone()
+            # 記憶體資料庫不支援 mmap_size，沒有回傳值
+            values[name] = row[0] if row else None
+    return values
+
+
+def replicate(alias, source=DEFAULT_DB_ALIAS):
+    """將 SQLite 主資料庫複製到副本 alias"""
+    source_connection, target = connections[source], connections[alias]
+    if source_connection.vendor != 'sqlite' or target.vendor != 'sqlite':
+        raise ImproperlyConfigured('只能複製 SQLite 資料庫')
+    copy_sqlite(source_connection, target.settings_dict['NAME'])
+
+
+def copy_sqlite(source_connection, path):
+    """以線上備份 API 將 SQLite 連線的資料庫複製到檔案 path"""
+    source_connection.ensure_connection()
+    # 另外開啟連線寫入副本，不影響正在讀取副本的連線
+    with closing(sqlite3.connect(path)) as destination:
+        source_connection.connection.backup(destination)
@@ -0,0 +1,112 @@
+"""
+成績匯出
+
+課程成績單、學生歷年成績與整學期選課資料皆以 CSV 串流輸出：查詢以
+values_list().iterator(chunk_size=...) 分批讀取，每一列轉成 CSV 後立即交給
+StreamingHttpResponse 送出。記憶體用量與資料筆數無關，標題列在查詢執行前就
+送出，第一個位元組不必等整份資料讀完。
+
+檔案開頭加上 UTF-8 BOM，Excel 開啟時中文才不會變成亂碼。
+"""
+
+import csv
+
+from django.http import StreamingHttpResponse
+from django.utils.http import content_disposition_header
+
+from . import grading
+from .models import Enrollment
+
+CHUNK_SIZE = 2000
+
+
+class _Echo:
+    """csv.writer 用的假檔案，write() 直接回傳寫入的字串"""
+
+    def write(self, value):
+        return value
+
+
+def _score(value):
+    return '' if value is None else value
+
+
+def _graded(rows):
+    """在每列最後加上科目分數、等第與績分（每列最後一欄須為 total_score_e4）"""
+    for *values, total_e4 in rows:
+        total = grading.from_e4(total_e4)
+        yield [
+            *map(_score, values),
+            _score(total),
+            grading.letter_grade(total) or '',
+            _score(grading.grade_point(total)),
+        ]
+
+
+def _enrollments():
+    return grading.annotate_totals(Enrollment.objects.filter(is_active=True))
+
+
+def _stream(filename, header, rows):
+    writer = csv.writer(_Echo())
+
+    def content():
+        yield '\ufeff' + writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(content(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    return response
+
+
+def course_gradebook(course):
+    """課程成績單"""
+    rows = (
+        _enrollments().filter(course=course)
+        .order_by('user__username')
+        .values_list(
+            'user__username', 'user__profile__student_id', 'user__last_name', 'user__first_name',
+            'midterm_score', 'final_score', 'total_score_e4',
+        )
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    header = ['帳號', '學號', '姓', '名', '期中分數', '期末分數', '科目分數', '等第', '績分']
+    return _stream(f'{course.course_code}-gradebook.csv', header, _graded(rows))
+
+
+def student_transcript(user):
+    """學生歷年成績"""
+    rows = (
+        _enrollments().filter(user=user)
+        .order_by('course__semester', 'course__course_code')
+        .values_list(
+            'course__semester', 'course__course_code', 'course__course_name', 'course__credits',
+            'midterm_score', 'final_score', 'total_score_e4',
+        )
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    header = ['學期', '課號', '課名', '學分', '期中分數', '期末分數', '科目分數', '等第', '績分']
+    return _stream(f'{user.username}-transcript.csv', header, _graded(rows))
+
+
+def semester_enrollments(semester=None):
+    """整學期（未指定時為全部學期）的選課與成績資料"""
+    enrollments = _enrollments()
+    if semester:
+        enrollments = enrollments.filter(course__semester=semester)
+    rows = (
+        enrollments
+        .order_by('course__course_code', 'user__username')
+        .values_list(
+            'course__semester', 'course__course_code', 'course__course_name', 'course__credits',
+            'user__username', 'user__profile__student_id', 'user__last_name', 'user__first_name',
+            'midterm_score', 'final_score', 'total_score_e4',
+        )
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    header = [
+        '學期', '課號', '課名', '學分', '帳號', '學號', '姓', '名',
+        '期中分數', '期末分數', '科目分數', '等第', '績分',
+    ]
+    return _stream(f"enrollments-{semester or 'all'}.csv", header, _graded(rows))
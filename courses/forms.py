@@ -1,6 +1,7 @@
 from django import forms
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm, UserChangeForm
+from .grade_import import detect_format
 from .models import Course, Enrollment, Student, Teacher, UserProfile, CourseComment
 
 
@@ -76,7 +77,7 @@ class CourseForm(forms.ModelForm):
     """課程表單"""
     class Meta:
         model = Course
-        fields = ['course_code', 'course_name', 'teacher', 'credits', 'description', 'max_students', 'semester']
+        fields = ['course_code', 'course_name', 'teacher', 'credits', 'description', 'max_students', 'semester', 'midterm_weight', 'final_weight']
         widgets = {
             'course_code': forms.TextInput(attrs={'class': 'form-control', 'placeholder': '課號'}),
             'course_name': forms.TextInput(attrs={'class': 'form-control', 'placeholder': '課名'}),
@@ -85,6 +86,8 @@ class CourseForm(forms.ModelForm):
             'description': forms.Textarea(attrs={'class': 'form-control', 'placeholder': '課程描述', 'rows': 4}),
             'max_students': forms.NumberInput(attrs={'class': 'form-control', 'placeholder': '最大選修人數'}),
             'semester': forms.TextInput(attrs={'class': 'form-control', 'placeholder': '學期（如：2024-1）'}),
+            'midterm_weight': forms.NumberInput(attrs={'class': 'form-control', 'placeholder': '期中權重(%)', 'min': '0', 'max': '100'}),
+            'final_weight': forms.NumberInput(attrs={'class': 'form-control', 'placeholder': '期末權重(%)', 'min': '0', 'max': '100'}),
         }
 
 
@@ -92,7 +95,7 @@ class TeacherCourseForm(forms.ModelForm):
     """教師新增課程表單(不包含教師選擇)"""
     class Meta:
         model = Course
-        fields = ['course_code', 'course_name', 'credits', 'description', 'max_students', 'semester']
+        fields = ['course_code', 'course_name', 'credits', 'description', 'max_students', 'semester', 'midterm_weight', 'final_weight']
         widgets = {
             'course_code': forms.TextInput(attrs={'class': 'form-control', 'placeholder': '課號'}),
             'course_name': forms.TextInput(attrs={'class': 'form-control', 'placeholder': '課名'}),
@@ -100,6 +103,8 @@ class TeacherCourseForm(forms.ModelForm):
             'description': forms.Textarea(attrs={'class': 'form-control', 'placeholder': '課程描述', 'rows': 4}),
             'max_students': forms.NumberInput(attrs={'class': 'form-control', 'placeholder': '最大選修人數', 'value': 50}),
             'semester': forms.TextInput(attrs={'class': 'form-control', 'placeholder': '學期（如：2025-1）'}),
+            'midterm_weight': forms.NumberInput(attrs={'class': 'form-control', 'placeholder': '期中權重(%)', 'min': '0', 'max': '100'}),
+            'final_weight': forms.NumberInput(attrs={'class': 'form-control', 'placeholder': '期末權重(%)', 'min': '0', 'max': '100'}),
         }
 
 
@@ -116,6 +121,25 @@ class EnrollmentForm(forms.ModelForm):
         }
 
 
+class GradeImportForm(forms.Form):
+    """成績單匯入表單"""
+    file = forms.FileField(
+        label='成績單檔案',
+        widget=forms.FileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx'}),
+    )
+    dry_run = forms.BooleanField(
+        label='僅預覽變更，不寫入',
+        required=False,
+        initial=True,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+    )
+
+    def clean_file(self):
+        file = self.cleaned_data['file']
+        self.cleaned_data['file_format'] = detect_format(file.name)
+        return file
+
+
 # 課程留言表單
 class CourseCommentForm(forms.ModelForm):
     """課程留言表單"""
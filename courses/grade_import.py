@@ -0,0 +1,271 @@
+"""
+成績單匯入
+
+以串流方式逐列讀取 CSV 或 XLSX（XLSX 需安裝 openpyxl，以唯讀模式讀取），每
+batch_size 列查詢一次選課記錄並寫入一次，記憶體用量只與 batch_size 有關，
+與檔案列數無關。
+
+批次寫入使用參數化的 executemany UPDATE：bulk_update() 會為每一筆記錄組出
+CASE WHEN 運算式，五萬列時光是組 SQL 就要數十秒。
+
+第一列為標題列：以 username（帳號）或 student_id（學號）對應本課程選修中的學生，
+midterm_score/final_score 沿用 gradebook.clean_score() 的驗證規則。檔案中沒有的
+分數欄位維持原值，空白儲存格表示清除分數。
+
+整份檔案在同一個交易中匯入，任何一列有錯誤就全部回滾；dry_run 時只回報會變更的
+內容，不寫入資料庫。
+"""
+
+import csv
+import io
+import os
+
+from django.core.exceptions import ValidationError
+from django.db import connections, router, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .gradebook import SCORE_FIELDS, clean_score
+from .models import Enrollment
+from .stats import invalidate_course_stats
+
+BATCH_SIZE = 1000
+FORMATS = ('csv', 'xlsx')
+
+# 錯誤與差異只保留前幾筆供顯示，數量另外計算
+MAX_REPORTED = 200
+
+HEADER_ALIASES = {
+    'username': 'username',
+    '帳號': 'username',
+    '用戶名': 'username',
+    'student_id': 'student_id',
+    '學號': 'student_id',
+    'midterm_score': 'midterm_score',
+    'midterm': 'midterm_score',
+    '期中': 'midterm_score',
+    '期中分數': 'midterm_score',
+    'final_score': 'final_score',
+    'final': 'final_score',
+    '期末': 'final_score',
+    '期末分數': 'final_score',
+}
+
+
+class ImportResult:
+    """匯入結果；dry_run 時 changed 為「將會」變更的筆數"""
+
+    def __init__(self, dry_run):
+        self.dry_run = dry_run
+        self.applied = False
+        self.rows = 0
+        self.changed = 0
+        self.unchanged = 0
+        self.error_count = 0
+        self.errors = []
+        self.diffs = []
+
+    @property
+    def ok(self):
+        return not self.error_count
+
+    def add_error(self, line, student, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED:
+            self.errors.append({'line': line, 'student': student, 'message': message})
+
+    def add_diff(self, line, student, changes):
+        self.changed += 1
+        if len(self.diffs) < MAX_REPORTED:
+            self.diffs.append({'line': line, 'student': student, 'changes': changes})
+
+
+class _Rollback(Exception):
+    pass
+
+
+def detect_format(filename):
+    """依副檔名判斷檔案格式"""
+    extension = os.path.splitext(filename or '')[1].lower().lstrip('.')
+    if extension not in FORMATS:
+        raise ValidationError('只支援 CSV 與 XLSX 檔案')
+    return extension
+
+
+def _csv_rows(file, encoding):
+    text = io.TextIOWrapper(file, encoding=encoding, newline='')
+    try:
+        yield from csv.reader(text)
+    except UnicodeDecodeError:
+        raise ValidationError(f'無法以 {encoding} 解碼 CSV 檔案')
+    finally:
+        text.detach()
+
+
+def _xlsx_rows(file):
+    try:
+        import openpyxl
+    except ImportError:
+        raise ValidationError('匯入 XLSX 需要安裝 openpyxl')
+    try:
+        workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    except Exception:
+        raise ValidationError('無法讀取 XLSX 檔案')
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _cell_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        # 試算表常把學號存成數值
+        value = int(value)
+    return str(value).strip()
+
+
+def _columns(header):
+    columns = {}
+    for index, name in enumerate(header or ()):
+        field = HEADER_ALIASES.get(_cell_text(name).lower())
+        if field and field not in columns:
+            columns[field] = index
+    if 'username' not in columns and 'student_id' not in columns:
+        raise ValidationError('標題列必須包含 username（帳號）或 student_id（學號）欄位')
+    if not any(field in columns for field in SCORE_FIELDS):
+        raise ValidationError('標題列必須包含 midterm_score（期中分數）或 final_score（期末分數）欄位')
+    return columns
+
+
+def _records(rows, columns):
+    """將資料列轉成 (行號, 欄位字典)，略過空白列"""
+    for line, row in enumerate(rows, 2):
+        row = tuple(row)
+        if not any(_cell_text(value) for value in row):
+            continue
+        record = {}
+        for field, index in columns.items():
+            value = row[index] if index < len(row) else None
+            record[field] = _cell_text(value) if field in ('username', 'student_id') else value
+        yield line, record
+
+
+def _load_enrollments(course, batch):
+    usernames = {record['username'] for _, record in batch if record.get('username')}
+    student_ids = {record['student_id'] for _, record in batch if record.get('student_id')}
+    enrollments = (
+        Enrollment.objects.filter(course=course, is_active=True)
+        .filter(Q(user__username__in=usernames) | Q(user__profile__student_id__in=student_ids))
+        .annotate(import_username=F('user__username'), import_student_id=F('user__profile__student_id'))
+    )
+    by_username, by_student_id = {}, {}
+    for enrollment in enrollments:
+        by_username[enrollment.import_username] = enrollment
+        if enrollment.import_student_id:
+            by_student_id[enrollment.import_student_id] = enrollment
+    return by_username, by_student_id
+
+
+def _write_batch(enrollments, fields):
+    """以一次 executemany 寫入整批選課記錄的指定欄位"""
+    connection = connections[router.db_for_write(Enrollment)]
+    quote = connection.ops.quote_name
+    model_fields = [Enrollment._meta.get_field(name) for name in fields]
+    assignments = ', '.join(f'{quote(field.column)} = %s' for field in model_fields)
+    sql = f'UPDATE {quote(Enrollment._meta.db_table)} SET {assignments} WHERE {quote(Enrollment._meta.pk.column)} = %s'
+    params = [
+        [field.get_db_prep_save(getattr(enrollment, field.attname), connection) for field in model_fields]
+        + [enrollment.pk]
+        for enrollment in enrollments
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def _process_batch(course, batch, seen, result, now):
+    by_username, by_student_id = _load_enrollments(course, batch)
+    changed = []
+    for line, record in batch:
+        result.rows += 1
+        student = record.get('student_id') or record.get('username') or ''
+        if record.get('student_id'):
+            enrollment = by_student_id.get(record['student_id'])
+        elif record.get('username'):
+            enrollment = by_username.get(record['username'])
+        else:
+            result.add_error(line, student, '缺少帳號或學號')
+            continue
+        if enrollment is None:
+            result.add_error(line, student, '找不到此學生在本課程的選修記錄')
+            continue
+        if enrollment.pk in seen:
+            result.add_error(line, student, '同一位學生重複出現')
+            continue
+        seen.add(enrollment.pk)
+
+        values, messages = {}, []
+        for field in SCORE_FIELDS:
+            if field in record:
+                try:
+                    values[field] = clean_score(field, record[field])
+                except ValidationError as e:
+                    messages.append(f"{Enrollment._meta.get_field(field).verbose_name}：{' '.join(e.messages)}")
+        if messages:
+            result.add_error(line, student, '；'.join(messages))
+            continue
+
+        changes = {
+            field: [getattr(enrollment, field), value]
+            for field, value in values.items()
+            if getattr(enrollment, field) != value
+        }
+        if not changes:
+            result.unchanged += 1
+            continue
+        result.add_diff(line, student, changes)
+        for field, value in values.items():
+            setattr(enrollment, field, value)
+        enrollment.updated_at = now
+        changed.append(enrollment)
+
+    # 已有錯誤時整份檔案都會回滾，不必再寫入
+    if changed and not result.dry_run and result.ok:
+        _write_batch(changed, [*SCORE_FIELDS, 'updated_at'])
+
+
+def import_grades(course, file, file_format, dry_run=False, batch_size=BATCH_SIZE, encoding='utf-8-sig'):
+    """
+    匯入課程成績單，file 為二進位檔案物件，回傳 ImportResult。
+
+    標題列或檔案格式錯誤時引發 ValidationError。
+    """
+    if file_format == 'xlsx':
+        rows = _xlsx_rows(file)
+    else:
+        rows = _csv_rows(file, encoding)
+    columns = _columns(next(rows, None))
+
+    result = ImportResult(dry_run)
+    seen = set()
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            batch = []
+            for item in _records(rows, columns):
+                batch.append(item)
+                if len(batch) >= batch_size:
+                    _process_batch(course, batch, seen, result, now)
+                    batch = []
+            if batch:
+                _process_batch(course, batch, seen, result, now)
+
+            if not result.ok:
+                raise _Rollback
+            if result.changed and not dry_run:
+                result.applied = True
+                transaction.on_commit(lambda: invalidate_course_stats(course.pk))
+    except _Rollback:
+        pass
+    return result
@@ -0,0 +1,152 @@
+"""
+批次成績登錄
+
+apply_grades() 一次驗證整批成績，全部正確時才以 bulk_update() 在同一個交易中
+寫入；任何一列有錯誤就不寫入並回報各列的錯誤。分數沒有變更的列會略過，
+不產生 UPDATE，也不更新 updated_at。
+
+選課記錄在交易中以 select_for_update() 鎖定後才讀取（SQLite 以 BEGIN IMMEDIATE
+取得寫入鎖），bulk_update() 寫回的是最新的分數：不會覆蓋同時匯入的成績，
+也不會寫入已在這之間退選的記錄。
+
+bulk_update() 不會觸發 save() 與 signals，因此 updated_at 在這裡明確設定，
+課程統計快取也在交易提交後自行清除。
+"""
+
+import re
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Enrollment
+from .stats import invalidate_course_stats
+
+SCORE_FIELDS = ('midterm_score', 'final_score')
+BATCH_SIZE = 500
+
+# 整頁成績表單的欄位名稱：midterm_score_<選課記錄 id>
+_POST_FIELD_RE = re.compile(rf"^({'|'.join(SCORE_FIELDS)})_(\d+)$")
+
+
+class GradeResult:
+    """批次登錄結果"""
+
+    def __init__(self):
+        self.updated = 0
+        self.unchanged = 0
+        self.errors = []
+        # skip_inactive 時略過的已退選記錄：{'row', 'enrollment_id', 'student'}
+        self.skipped = []
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def as_dict(self):
+        return {'updated': self.updated, 'unchanged': self.unchanged, 'errors': self.errors}
+
+
+def clean_score(field, value):
+    """以模型欄位的驗證規則檢查分數；空白或 None 表示清除分數"""
+    model_field = Enrollment._meta.get_field(field)
+    formfield = model_field.formfield()
+    if isinstance(value, bool):
+        raise ValidationError(formfield.error_messages['invalid'], code='invalid')
+    score = formfield.clean(value)
+    if score is not None:
+        model_field.run_validators(score)
+    return score
+
+
+def rows_from_post(data):
+    """由整頁成績表單的 POST 資料組出 apply_grades() 的輸入"""
+    rows = {}
+    for key, value in data.items():
+        match = _POST_FIELD_RE.match(key)
+        if match:
+            field, enrollment_id = match.groups()
+            rows.setdefault(enrollment_id, {'enrollment_id': enrollment_id})[field] = value
+    return list(rows.values())
+
+
+def _enrollment_id(row):
+    try:
+        return int(row.get('enrollment_id'))
+    except (TypeError, ValueError):
+        return None
+
+
+def apply_grades(course, rows, skip_inactive=False):
+    """
+    驗證並套用整批成績，rows 為含 enrollment_id 與分數欄位的字典。
+
+    沒有提供的分數欄位維持原值。回傳 GradeResult，errors 中每一筆為
+    {'row': 第幾列, 'enrollment_id': ..., 'errors': {欄位: 訊息}}。
+    skip_inactive 為 True 時（整頁表單），表單載入後才退選的記錄列入 skipped，
+    不算錯誤，其餘各列照常套用。
+    """
+    rows = list(rows)
+    with transaction.atomic():
+        enrollments = Enrollment.objects.select_for_update().filter(course=course).in_bulk(
+            {pk for pk in map(_enrollment_id, rows) if pk is not None}
+        )
+        result, changed = _validate(rows, enrollments, skip_inactive)
+        if result.errors:
+            return result
+        if changed:
+            Enrollment.objects.bulk_update(changed, [*SCORE_FIELDS, 'updated_at'], batch_size=BATCH_SIZE)
+            transaction.on_commit(lambda: invalidate_course_stats(course.pk))
+    result.updated = len(changed)
+    return result
+
+
+def _validate(rows, enrollments, skip_inactive):
+    """檢查各列並把新的分數設定到選課記錄上，回傳 (GradeResult, 有變更的記錄)"""
+    result = GradeResult()
+    now = timezone.now()
+    changed = []
+    seen = set()
+    for index, row in enumerate(rows, 1):
+        errors = {}
+        pk = _enrollment_id(row)
+        enrollment = enrollments.get(pk)
+        if pk is None:
+            errors['enrollment_id'] = '缺少或無效的選課記錄編號'
+        elif enrollment is None:
+            errors['enrollment_id'] = '此課程沒有這筆選修中的記錄'
+        elif pk in seen:
+            errors['enrollment_id'] = '同一筆選課記錄重複出現'
+        elif not enrollment.is_active:
+            if skip_inactive:
+                seen.add(pk)
+                result.skipped.append({
+                    'row': index,
+                    'enrollment_id': pk,
+                    'student': enrollment.user.get_full_name() or enrollment.user.username,
+                })
+                continue
+            errors['enrollment_id'] = '此課程沒有這筆選修中的記錄'
+        seen.add(pk)
+
+        values = {}
+        for field in SCORE_FIELDS:
+            if field not in row:
+                continue
+            try:
+                values[field] = clean_score(field, row[field])
+            except ValidationError as e:
+                errors[field] = ' '.join(e.messages)
+
+        if errors:
+            result.errors.append({'row': index, 'enrollment_id': row.get('enrollment_id'), 'errors': errors})
+            continue
+        if all(getattr(enrollment, field) == value for field, value in values.items()):
+            result.unchanged += 1
+            continue
+
+        for field, value in values.items():
+            setattr(enrollment, field, value)
+        enrollment.updated_at = now
+        changed.append(enrollment)
+    return result, changed
@@ -0,0 +1,134 @@
+"""
+成績計算引擎
+
+科目分數 = 期中 × 期中權重% + 期末 × 期末權重%，權重由各課程設定（預設各 50%），
+結果以 Decimal 四捨五入（ROUND_HALF_UP）到小數第二位。
+
+整批計算時由資料庫標註 total_score_e4：先把分數換成以 0.01 為單位的整數，
+再乘上整數權重，得到以 0.0001 為單位的整數加權總和。整數運算在 SQLite 與
+PostgreSQL 上都沒有浮點誤差，Python 端只需一次 quantize 即可得到精確的結果，
+不必為每一筆記錄把 Decimal 轉成 float。
+"""
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db.models import F, IntegerField
+from django.db.models.functions import Cast, Round
+
+TWO_PLACES = Decimal('0.01')
+
+# 成績等第與績分（4.3 制），依下限由高到低排列
+GRADE_SCALE = (
+    (Decimal('90'), 'A+', Decimal('4.3')),
+    (Decimal('85'), 'A', Decimal('4.0')),
+    (Decimal('80'), 'A-', Decimal('3.7')),
+    (Decimal('77'), 'B+', Decimal('3.3')),
+    (Decimal('73'), 'B', Decimal('3.0')),
+    (Decimal('70'), 'B-', Decimal('2.7')),
+    (Decimal('67'), 'C+', Decimal('2.3')),
+    (Decimal('63'), 'C', Decimal('2.0')),
+    (Decimal('60'), 'C-', Decimal('1.7')),
+    (Decimal('50'), 'D', Decimal('1.0')),
+    (Decimal('0'), 'E', Decimal('0.0')),
+)
+
+PASSING_SCORE = Decimal('60')
+
+
+def weighted_total(midterm, final, midterm_weight=50, final_weight=50):
+    """計算單筆科目分數，任一分數未登錄時回傳 None"""
+    if midterm is None or final is None:
+        return None
+    total = (Decimal(midterm) * midterm_weight + Decimal(final) * final_weight) / 100
+    return total.quantize(TWO_PLACES, rounding=ROUND_HALF_UP)
+
+
+def from_e4(value):
+    """將 annotate_totals() 標註的 total_score_e4 換算為科目分數"""
+    if value is None:
+        return None
+    return Decimal(value).scaleb(-4).quantize(TWO_PLACES, rounding=ROUND_HALF_UP)
+
+
+def hundredths(field):
+    """將分數欄位換算為以 0.01 為單位的整數運算式"""
+    return Cast(Round(F(field) * 100), IntegerField())
+
+
+def annotate_totals(enrollments):
+    """為選課記錄 QuerySet 標註 total_score_e4（以 0.0001 為單位的加權總和）"""
+    return enrollments.annotate(
+        total_score_e4=(
+            hundredths('midterm_score') * F('course__midterm_weight')
+            + hundredths('final_score') * F('course__final_weight')
+        )
+    )
+
+
+def letter_grade(total):
+    """科目分數對應的等第"""
+    if total is None:
+        return None
+    for minimum, letter, _ in GRADE_SCALE:
+        if total >= minimum:
+            return letter
+    return GRADE_SCALE[-1][1]
+
+
+def grade_point(total):
+    """科目分數對應的績分"""
+    if total is None:
+        return None
+    for minimum, _, point in GRADE_SCALE:
+        if total >= minimum:
+            return point
+    return GRADE_SCALE[-1][2]
+
+
+def grade_enrollments(enrollments):
+    """
+    以一次查詢計算整批選課記錄的成績，回傳記錄列表。
+
+    每筆記錄會加上 total_score、letter_grade 與 grade_point 屬性，
+    之後 get_total_score() 也直接回傳已計算的結果。
+    """
+    return _apply_grades(list(annotate_totals(enrollments)))
+
+
+async def agrade_enrollments(enrollments):
+    """grade_enrollments() 的非同步版本"""
+    return _apply_grades([enrollment async for enrollment in annotate_totals(enrollments)])
+
+
+def _apply_grades(graded):
+    for enrollment in graded:
+        total = from_e4(enrollment.total_score_e4)
+        enrollment.total_score = total
+        enrollment.letter_grade = letter_grade(total)
+        enrollment.grade_point = grade_point(total)
+    return graded
+
+
+def summarize(graded):
+    """
+    彙總 grade_enrollments() 的結果：平均分數（各科分數的算術平均）、
+    以學分加權的 GPA、已評分科目數與已評分學分數。
+    """
+    totals = [e.total_score for e in graded if e.total_score is not None]
+    credits = [(e.grade_point, e.course.credits) for e in graded if e.total_score is not None]
+    credit_sum = sum(c for _, c in credits)
+
+    average = None
+    if totals:
+        average = (sum(totals) / len(totals)).quantize(TWO_PLACES, rounding=ROUND_HALF_UP)
+
+    gpa = None
+    if credit_sum:
+        gpa = (sum(point * c for point, c in credits) / credit_sum).quantize(TWO_PLACES, rounding=ROUND_HALF_UP)
+
+    return {
+        'average_score': average,
+        'gpa': gpa,
+        'graded_count': len(totals),
+        'graded_credits': credit_sum,
+    }
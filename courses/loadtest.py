@@ -0,0 +1,221 @@
+"""
+選課開放時的負載模擬
+
+run() 以多個執行緒模擬大量已登入的學生同時對少數熱門課程選課與退選，請求經過完整的
+URL、中介層與視圖：
+
+- 預設以 Django 測試用戶端在本行程內送出；指定 base_url 時改以 HTTP 送到本機執行中的
+  伺服器，伺服器必須使用同一個資料庫（session 與退選的選課記錄編號都由本行程查詢）；
+- login_students() 以 django.contrib.auth.login() 為每位學生建立 session（與
+  Client.force_login() 相同），不經過 PBKDF2 驗證密碼，數千位學生也能在數秒內登入；
+  各執行緒共用這些 session，同一位學生可能同時從多個執行緒送出請求，等同重複點擊；
+- 每次操作隨機選一門課程選課（與課程目錄上的連結相同，GET），再以 drop_rate 的機率退選；
+- 鎖等待：本行程模式以 execute_wrapper 累計取得寫入鎖的陳述式耗時，SQLite 為
+  BEGIN IMMEDIATE，PostgreSQL 為佔用名額時對課程列的條件式 UPDATE（列鎖，含執行時間）。
+  HTTP 模式下鎖等待發生在伺服器行程，不列入統計。
+
+結束後以 seats.check_invariants() 核對名額與候補名單的不變量；額滿時的選課請求會加入
+候補名單，退選時由隊首遞補（見 waitlist.py）。
+"""
+
+import http.client
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import Client
+from django.urls import reverse
+
+from . import waitlist
+from .models import Course, Enrollment
+
+# 鎖等待統計的陳述式開頭
+LOCK_STATEMENTS = ('BEGIN IMMEDIATE', 'BEGIN EXCLUSIVE')
+
+
+def login_students(users):
+    """為每位學生建立已登入的 session，回傳 [(使用者編號, session key)]"""
+    sessions = []
+    for user in users:
+        client = Client()
+        client.force_login(user)
+        sessions.append((user.pk, client.cookies[settings.SESSION_COOKIE_NAME].value))
+    return sessions
+
+
+def open_seats(courses, free_seats):
+    """把課程名額設為目前人數加 free_seats，讓課程在測試期間額滿；空出的名額先由候補名單遞補"""
+    Course.objects.filter(pk__in=[c.pk for c in courses]).update(
+        max_students=F('active_enrollment_count') + free_seats,
+    )
+    for course in courses:
+        with transaction.atomic():
+            waitlist.promote(course.pk)
+
+
+class _LockTimer:
+    """connection.execute_wrapper()：累計取得寫入鎖的陳述式耗時"""
+
+    def __init__(self):
+        table = connection.ops.quote_name(Course._meta.db_table)
+        self.prefixes = (*LOCK_STATEMENTS, f'UPDATE {table} SET') if connection.vendor != 'sqlite' else LOCK_STATEMENTS
+        self.waits = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not sql.startswith(self.prefixes):
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.waits.append(time.perf_counter() - start)
+
+
+class _ClientTransport:
+    """以測試用戶端在本行程內送出請求"""
+
+    def __init__(self):
+        self.client = Client(raise_request_exception=False)
+
+    def get(self, path, session_key):
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = session_key
+        return self.client.get(path).status_code
+
+    def close(self):
+        pass
+
+
+class _HttpTransport:
+    """以 HTTP/1.1 keep-alive 連線送出請求"""
+
+    def __init__(self, base_url, timeout=30):
+        parts = urlsplit(base_url)
+        self.prefix = parts.path.rstrip('/')
+        self.connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=timeout)
+
+    def get(self, path, session_key):
+        try:
+            self.connection.request('GET', self.prefix + path, headers={
+                'Cookie': f'{settings.SESSION_COOKIE_NAME}={session_key}',
+            })
+            response = self.connection.getresponse()
+            response.read()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            # 重新連線，本次記為失敗
+            self.connection.close()
+            raise
+
+    def close(self):
+        self.connection.close()
+
+
+def _percentiles(values):
+    if len(values) < 2:
+        value = values[0] if values else 0.0
+        return {'p50': value, 'p95': value, 'p99': value}
+    cuts = statistics.quantiles(values, n=100, method='inclusive')
+    return {'p50': cuts[49], 'p95': cuts[94], 'p99': cuts[98]}
+
+
+def run(sessions, courses, threads=16, ops=50, drop_rate=0.3, base_url=None, random_seed=0):
+    """
+    以 threads 個執行緒各執行 ops 次選課（及隨機退選），回傳統計：
+    requests、elapsed、throughput、statuses、errors、error_rate、latency（毫秒）
+    與 lock_wait（本行程模式，秒）
+    """
+    course_ids = [c.pk for c in courses]
+    latencies = {'enroll': [], 'drop': []}
+    statuses, failures, lock_waits = Counter(), [], []
+    lock = threading.Lock()
+
+    def request(transport, kind, path, session_key, local):
+        start = time.perf_counter()
+        try:
+            status = transport.get(path, session_key)
+        except Exception as e:
+            local['failures'].append(f'{type(e).__name__}: {e}')
+            return None
+        local[kind].append((time.perf_counter() - start) * 1000)
+        local['statuses'][status] += 1
+        return status
+
+    def worker(seed):
+        rng = random.Random(seed)
+        local = {'enroll': [], 'drop': [], 'statuses': Counter(), 'failures': []}
+        transport = _HttpTransport(base_url) if base_url else _ClientTransport()
+        timer = _LockTimer()
+        try:
+            with connection.execute_wrapper(timer):
+                for _ in range(ops):
+                    user_id, session_key = rng.choice(sessions)
+                    course_id = rng.choice(course_ids)
+                    request(transport, 'enroll', reverse('courses:add_enrollment', args=[course_id]), session_key, local)
+                    if rng.random() >= drop_rate:
+                        continue
+                    enrollment_id = (
+                        Enrollment.objects.filter(user_id=user_id, course_id=course_id, is_active=True)
+                        .values_list('pk', flat=True)
+                        .first()
+                    )
+                    if enrollment_id is not None:
+                        request(transport, 'drop', reverse('courses:drop_course', args=[enrollment_id]), session_key, local)
+        finally:
+            transport.close()
+            connection.close()
+            with lock:
+                for kind in latencies:
+                    latencies[kind] += local[kind]
+                statuses.update(local['statuses'])
+                failures.extend(local['failures'])
+                lock_waits.extend(timer.waits)
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(random_seed + i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    completed = sum(statuses.values())
+    errors = sum(count for status, count in statuses.items() if status >= 400) + len(failures)
+    total = completed + len(failures)
+    return {
+        'requests': total,
+        'elapsed': elapsed,
+        'throughput': total / elapsed if elapsed else 0.0,
+        'statuses': dict(sorted(statuses.items())),
+        'errors': errors,
+        'error_rate': errors / total if total else 0.0,
+        'failures': failures[:5],
+        'latency': {kind: {'count': len(values), **_percentiles(values)} for kind, values in latencies.items()},
+        'lock_wait': None if base_url else {
+            'count': len(lock_waits),
+            'total': sum(lock_waits),
+            'max': max(lock_waits, default=0.0),
+            **_percentiles(lock_waits),
+        },
+    }
+
+
+def seeded_students(prefix, count, random_seed=0):
+    """隨機取 count 位種子資料中的學生"""
+    ids = list(User.objects.filter(username__startswith=f'{prefix}-s').values_list('pk', flat=True))
+    ids = random.Random(random_seed).sample(ids, min(count, len(ids)))
+    return list(User.objects.filter(pk__in=ids))
+
+
+def hot_courses(prefix, count):
+    """選修人數最多的 count 門種子課程"""
+    return list(
+        Course.objects.filter(course_code__startswith=f'{prefix}-')
+        .order_by('-active_enrollment_count', 'pk')[:count]
+    )
@@ -0,0 +1,156 @@
+import random
+import statistics
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.test.utils import override_settings
+
+from courses import database, gradebook, seats
+from courses.models import Course, Enrollment, Teacher, UserProfile
+
+# 測試資料的帳號與課號前綴，結束時全部刪除
+PREFIX = 'bench-'
+
+WORKLOADS = {
+    'enrollment': '選課/退選',
+    'grading': '成績登錄',
+}
+
+
+class Command(BaseCommand):
+    help = '以多個執行緒同時選課與登錄成績，量測目前資料庫設定的吞吐量'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workload', choices=[*WORKLOADS, 'all'], default='all')
+        parser.add_argument('--threads', type=int, default=8, help='同時執行的執行緒數')
+        parser.add_argument('--ops', type=int, default=200, help='每個執行緒執行的操作數')
+        parser.add_argument('--students', type=int, default=200, help='測試學生人數')
+        parser.add_argument('--courses', type=int, default=5, help='選課測試的課程數')
+        parser.add_argument('--rows', type=int, default=20, help='每次成績登錄的筆數')
+        parser.add_argument(
+            '--untuned',
+            action='store_true',
+            help='SQLite 改用預設的 PRAGMA 與 DEFERRED 交易，作為比較基準',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['threads'] < 1 or options['ops'] < 1:
+            raise CommandError('--threads 與 --ops 必須大於 0')
+        if options['untuned'] and connection.vendor != 'sqlite':
+            raise CommandError('--untuned 只適用於 SQLite')
+
+        pragmas = database.SQLITE_DEFAULTS if options['untuned'] else getattr(settings, 'SQLITE_PRAGMAS', {})
+        with override_settings(SQLITE_PRAGMAS=pragmas):
+            if options['untuned']:
+                # 重新連線以套用預設值（journal_mode 會寫回資料庫檔案）
+                connection.close()
+            self.describe_database()
+            self.cleanup()
+            try:
+                self.setup(options)
+                workloads = list(WORKLOADS) if options['workload'] == 'all' else [options['workload']]
+                for workload in workloads:
+                    self.report(workload, self.run(getattr(self, f'{workload}_op'), options))
+            finally:
+                self.cleanup()
+                if options['untuned']:
+                    connection.close()
+
+    def describe_database(self):
+        self.stdout.write(f"資料庫：{connection.vendor}（DB_PROFILE={getattr(settings, 'DB_PROFILE', '-')}）")
+        if connection.vendor == 'sqlite':
+            values = '，'.join(f'{name}={value}' for name, value in database.pragma_values(connection).items())
+            self.stdout.write(f'PRAGMA：{values}')
+
+    def setup(self, options):
+        user = User.objects.create_user(username=f'{PREFIX}teacher')
+        teacher = Teacher.objects.create(user=user, teacher_id=f'{PREFIX}T')
+        students = User.objects.bulk_create(
+            User(username=f'{PREFIX}s{i}') for i in range(options['students'])
+        )
+        UserProfile.objects.bulk_create(UserProfile(user=u, role='student') for u in students)
+        self.students = list(User.objects.filter(username__startswith=f'{PREFIX}s'))
+        self.courses = [
+            Course.objects.create(
+                course_code=f'{PREFIX}C{i}', course_name='效能測試', teacher=teacher,
+                max_students=options['students'],
+            )
+            for i in range(options['courses'])
+        ]
+        self.grading_course = Course.objects.create(
+            course_code=f'{PREFIX}G', course_name='效能測試', teacher=teacher,
+        )
+        Enrollment.objects.bulk_create(Enrollment(user=u, course=self.grading_course) for u in self.students)
+        self.enrollment_ids = list(
+            Enrollment.objects.filter(course=self.grading_course).values_list('pk', flat=True)
+        )
+        self.rows = min(options['rows'], len(self.enrollment_ids))
+
+    def cleanup(self):
+        Course.objects.filter(course_code__startswith=PREFIX).delete()
+        User.objects.filter(username__startswith=PREFIX).delete()
+
+    def enrollment_op(self, rng):
+        result, enrollment = seats.allocate_seat(rng.choice(self.students), rng.choice(self.courses))
+        if enrollment is not None:
+            seats.release_seat(enrollment)
+
+    def grading_op(self, rng):
+        rows = [
+            {'enrollment_id': pk, 'midterm_score': rng.randint(0, 100), 'final_score': rng.randint(0, 100)}
+            for pk in rng.sample(self.enrollment_ids, self.rows)
+        ]
+        gradebook.apply_grades(self.grading_course, rows)
+
+    def run(self, op, options):
+        latencies, errors = [], []
+
+        def worker(seed, threaded):
+            rng = random.Random(seed)
+            try:
+                if options['untuned']:
+                    connection.ensure_connection()
+                    connection.transaction_mode = None
+                for _ in range(options['ops']):
+                    start = time.perf_counter()
+                    try:
+                        op(rng)
+                    except OperationalError as e:
+                        errors.append(str(e))
+                        continue
+                    latencies.append(time.perf_counter() - start)
+            finally:
+                if threaded:
+                    connection.close()
+
+        start = time.perf_counter()
+        if options['threads'] == 1:
+            worker(options['seed'], threaded=False)
+        else:
+            threads = [
+                threading.Thread(target=worker, args=(options['seed'] + i, True))
+                for i in range(options['threads'])
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return {'elapsed': time.perf_counter() - start, 'latencies': latencies, 'errors': errors}
+
+    def report(self, workload, result):
+        latencies = sorted(result['latencies'])
+        elapsed = result['elapsed']
+        line = f"{WORKLOADS[workload]}：完成 {len(latencies)} 次，{elapsed:.2f} 秒，{len(latencies) / elapsed:.1f} 次/秒"
+        if len(latencies) >= 2:
+            cuts = statistics.quantiles(latencies, n=100)
+            line += f'，p50 {cuts[49] * 1000:.1f} ms，p95 {cuts[94] * 1000:.1f} ms'
+        self.stdout.write(line)
+        if result['errors']:
+            self.stdout.write(self.style.ERROR(
+                f"{len(result['errors'])} 次失敗（{result['errors'][0]}）"
+            ))
@@ -0,0 +1,113 @@
+import json
+import platform
+from contextlib import nullcontext
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from courses import benchmarks, seeding
+
+
+class Command(BaseCommand):
+    help = '在種子資料集上量測熱門路徑的延遲、查詢數與記憶體用量，並與儲存的基準比較'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', nargs='+', choices=seeding.SIZES, default=['small'], help='資料集規模，可指定多個')
+        parser.add_argument('--scenario', nargs='+', choices=benchmarks.SCENARIOS, help='只執行這些情境')
+        parser.add_argument('--requests', type=int, default=100, help='每個情境記錄的請求數')
+        parser.add_argument('--warmup', type=int, default=benchmarks.MIN_REQUESTS, help='每個情境暖身的請求數')
+        parser.add_argument('--seed', type=int, default=0, help='請求序列的亂數種子')
+        parser.add_argument('--output', help='結果 JSON 檔（預設為 BENCHMARK_DIR/results.json）')
+        parser.add_argument('--baseline', help='基準 JSON 檔（預設為 BENCHMARK_DIR/baseline.json）')
+        parser.add_argument('--save-baseline', action='store_true', help='以本次結果更新基準，不做比較')
+        parser.add_argument('--tolerance', type=float, default=0.25, help='p95 延遲與最高 RSS 可超出基準的比例')
+        parser.add_argument('--rebuild', action='store_true', help='重新產生資料集')
+        parser.add_argument(
+            '--current-db',
+            action='store_true',
+            help='直接使用目前的資料庫（需先以 seed 命令填入資料），結果記為 current 資料集',
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 2 or options['warmup'] < 0:
+            raise CommandError('--requests 至少為 2，--warmup 不可為負')
+        directory = Path(settings.BENCHMARK_DIR)
+        output = Path(options['output'] or directory / 'results.json')
+        baseline_path = Path(options['baseline'] or directory / 'baseline.json')
+        scenarios = options['scenario'] or list(benchmarks.SCENARIOS)
+
+        if options['current_db']:
+            plan = [('current', nullcontext())]
+        else:
+            plan = [
+                (size, benchmarks.dataset(size, directory, options['rebuild']))
+                for size in options['size']
+            ]
+
+        results = {}
+        for size, context in plan:
+            with context:
+                try:
+                    workload = benchmarks.Workload(random_seed=options['seed'])
+                except ValueError as e:
+                    raise CommandError(e)
+                counts = benchmarks.dataset_counts()
+                self.stdout.write(self.style.MIGRATE_HEADING(
+                    f"{size}：使用者 {counts['users']}，課程 {counts['courses']}，選課記錄 {counts['enrollments']}"
+                ))
+                scenario_results = benchmarks.run(
+                    workload, options['requests'], scenarios, options['warmup'], log=self.report,
+                )
+                results[size] = {'counts': counts, 'scenarios': scenario_results}
+
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'requests': options['requests'],
+            'seed': options['seed'],
+            'datasets': results,
+        }
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, ensure_ascii=False, indent=2))
+        self.stdout.write(f'結果已寫入 {output}')
+
+        if options['save_baseline']:
+            baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() else {**report, 'datasets': {}}
+            baseline['datasets'].update(results)
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps(baseline, ensure_ascii=False, indent=2))
+            self.stdout.write(f'基準已更新：{baseline_path}')
+            return
+        if not baseline_path.exists():
+            self.stdout.write(f'沒有基準檔 {baseline_path}，以 --save-baseline 儲存本次結果作為基準')
+            return
+
+        baseline = json.loads(baseline_path.read_text())['datasets']
+        regressions = benchmarks.compare(
+            {size: data['scenarios'] for size, data in results.items()},
+            {size: data['scenarios'] for size, data in baseline.items()},
+            options['tolerance'],
+        )
+        if regressions:
+            for line in regressions:
+                self.stderr.write(self.style.ERROR(line))
+            raise CommandError(f'與基準 {baseline_path} 相比有 {len(regressions)} 項退化')
+        self.stdout.write(self.style.SUCCESS(f'與基準 {baseline_path} 相比沒有退化'))
+
+    def report(self, name, result):
+        line = (
+            f"  {benchmarks.SCENARIOS[name][0]}：{result['requests']} 次，"
+            f"p50 {result['p50_ms']:.1f} ms，p95 {result['p95_ms']:.1f} ms，p99 {result['p99_ms']:.1f} ms，"
+            f"查詢 {result['queries_per_request']:.1f} 次/請求"
+        )
+        if result['peak_rss_mb'] is not None:
+            line += f"，最高 RSS {result['peak_rss_mb']:.0f} MB"
+        self.stdout.write(line)
+        if result['errors']:
+            self.stdout.write(self.style.ERROR(f"  {result['errors']} 個請求失敗"))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from courses.caching import fragment_stats, reset_fragment_stats
+
+
+class Command(BaseCommand):
+    help = '顯示模板片段快取的命中率'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='顯示後將計數器歸零')
+
+    def handle(self, *args, **options):
+        for name, counts in fragment_stats().items():
+            hit_rate = '-' if counts['hit_rate'] is None else f"{counts['hit_rate']}%"
+            self.stdout.write(f"{name}: 命中 {counts['hits']}，未命中 {counts['misses']}，命中率 {hit_rate}")
+        if options['reset']:
+            reset_fragment_stats()
+            self.stdout.write(self.style.SUCCESS('計數器已歸零'))
@@ -0,0 +1,127 @@
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from courses import roles, views
+from courses.models import Course, UserProfile
+
+# (說明, 視圖, 角色, 是否需要課程)；角色為 None 表示未登入
+VIEWS = [
+    ('課程列表', views.course_list, None, False),
+    ('課程列表 API', views.course_list_api, None, False),
+    ('課程詳情', views.course_detail, 'student', True),
+    ('課程留言 API', views.course_comments_api, None, True),
+    ('學生儀表板', views.student_dashboard, 'student', False),
+    ('候補名次 API', views.course_waitlist_api, 'student', True),
+    ('匯出成績單', views.export_transcript, 'student', False),
+    ('教師儀表板', views.teacher_dashboard, 'teacher', False),
+    ('修課學生名單', views.teacher_course_students, 'teacher', True),
+    ('課程成績統計', views.teacher_course_stats, 'teacher', True),
+    ('匯出課程成績', views.export_course_gradebook, 'teacher', True),
+    ('管理員儀表板', views.admin_dashboard, 'admin', False),
+    ('教師列表', views.admin_teacher_list, 'admin', False),
+    ('課程管理', views.admin_course_list, 'admin', False),
+    ('匯出選課記錄', views.export_semester, 'admin', False),
+]
+
+# 各資料庫的執行計畫語法與全表掃描的判斷
+PLANS = {
+    'sqlite': ('EXPLAIN QUERY PLAN ', lambda line: line.startswith('SCAN ') and ' USING ' not in line
+               and not line.startswith(('SCAN CONSTANT', 'SCAN ('))),
+    'postgresql': ('EXPLAIN ', lambda line: 'Seq Scan on ' in line),
+}
+
+
+class Command(BaseCommand):
+    help = '以 EXPLAIN 檢查各頁面執行的查詢，標出全表掃描'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help='列出每個查詢的完整執行計畫')
+        parser.add_argument('--check', action='store_true', help='發現全表掃描時以非零狀態結束')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in PLANS:
+            raise CommandError(f'不支援 {connection.vendor} 的執行計畫')
+        self.prefix, self.is_full_scan = PLANS[connection.vendor]
+
+        users = self.find_users()
+        course = self.find_course(users.get('teacher'))
+        scans = 0
+        # 停用快取，量測每個頁面實際會執行的查詢
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+            for label, view, role, needs_course in VIEWS:
+                if role is not None and role not in users or needs_course and course is None:
+                    self.stdout.write(self.style.WARNING(f'{label}：略過（資料庫中沒有可用的{role or "課程"}資料）'))
+                    continue
+                kwargs = {'course_id': course.pk} if needs_course else {}
+                scans += self.explain(label, view, users.get(role), kwargs, options['verbose_plans'])
+
+        if scans:
+            message = f'共 {scans} 個查詢有全表掃描'
+            if options['check']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS('沒有發現全表掃描'))
+
+    def find_users(self):
+        """各角色挑一位資料最多的使用者"""
+        users = {}
+        candidates = {
+            'student': UserProfile.objects.filter(role='student').annotate(n=Count('user__enrollment_set')),
+            'teacher': UserProfile.objects.filter(role='teacher', user__teacher__isnull=False)
+                       .annotate(n=Count('user__teacher__course_set')),
+            'admin': UserProfile.objects.filter(role='admin', user__is_staff=True).annotate(n=Count('pk')),
+        }
+        for role, profiles in candidates.items():
+            profile = profiles.order_by('-n', 'pk').first()
+            if profile is not None:
+                users[role] = roles.get_user(profile.user_id)
+        return users
+
+    def find_course(self, teacher_user):
+        courses = Course.objects.annotate(n=Count('enrollment')).order_by('-n', 'pk')
+        if teacher_user is not None:
+            courses = courses.filter(teacher__user=teacher_user)
+        return courses.first()
+
+    def request(self, user):
+        request = RequestFactory().get('/')
+        request.user = user or AnonymousUser()
+        request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+        request._messages = FallbackStorage(request)
+        return request
+
+    def explain(self, label, view, user, kwargs, verbose):
+        with CaptureQueriesContext(connection) as ctx:
+            response = view(self.request(user), **kwargs)
+            if response.streaming:
+                for _ in response.streaming_content:
+                    pass
+        selects = [q['sql'] for q in ctx.captured_queries if q['sql'].lstrip().upper().startswith('SELECT')]
+        self.stdout.write(f'{label}（{response.status_code}）：{len(selects)} 個查詢')
+
+        scans = 0
+        with connection.cursor() as cursor:
+            for sql in selects:
+                cursor.execute(self.prefix + sql)
+                lines = [str(row[-1]) for row in cursor.fetchall()]
+                flagged = [line for line in lines if self.is_full_scan(line.strip())]
+                if flagged:
+                    scans += 1
+                    self.stdout.write(self.style.ERROR(f'  全表掃描：{sql[:200]}'))
+                    for line in flagged:
+                        self.stdout.write(f'    {line.strip()}')
+                elif verbose:
+                    self.stdout.write(f'  {sql[:200]}')
+                if verbose:
+                    for line in lines:
+                        self.stdout.write(f'    {line}')
+        return scans
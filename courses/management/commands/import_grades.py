@@ -0,0 +1,48 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.grade_import import BATCH_SIZE, detect_format, import_grades
+from courses.models import Course
+
+
+class Command(BaseCommand):
+    help = '由 CSV/XLSX 成績單匯入課程成績'
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_code', help='課號')
+        parser.add_argument('path', help='成績單檔案路徑（.csv 或 .xlsx）')
+        parser.add_argument('--dry-run', action='store_true', help='只列出將會變更的內容，不寫入')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='每批讀取並寫入的列數')
+        parser.add_argument('--encoding', default='utf-8-sig', help='CSV 檔案編碼（例如 cp950）')
+
+    def handle(self, *args, **options):
+        try:
+            course = Course.objects.get(course_code=options['course_code'])
+        except Course.DoesNotExist:
+            raise CommandError(f"找不到課號 {options['course_code']}")
+
+        try:
+            file_format = detect_format(options['path'])
+            with open(options['path'], 'rb') as file:
+                result = import_grades(
+                    course, file, file_format,
+                    dry_run=options['dry_run'],
+                    batch_size=options['batch_size'],
+                    encoding=options['encoding'],
+                )
+        except (OSError, ValidationError) as e:
+            raise CommandError(' '.join(getattr(e, 'messages', [str(e)])))
+
+        for diff in result.diffs:
+            changes = '，'.join(f'{field} {old} → {new}' for field, (old, new) in diff['changes'].items())
+            self.stdout.write(f"第 {diff['line']} 行 {diff['student']}：{changes}")
+        for error in result.errors:
+            self.stderr.write(f"第 {error['line']} 行 {error['student']}：{error['message']}")
+
+        summary = f'共 {result.rows} 列，變更 {result.changed} 位，未變更 {result.unchanged} 位'
+        if not result.ok:
+            raise CommandError(f'{summary}，{result.error_count} 列有錯誤，所有變更皆未儲存')
+        if result.dry_run:
+            self.stdout.write(self.style.WARNING(f'{summary}（預覽，未寫入）'))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,102 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from courses import loadtest, seats
+from courses.models import Course
+
+
+class Command(BaseCommand):
+    help = (
+        '模擬選課開放：大量已登入的種子學生同時對熱門課程選課與退選，'
+        '回報吞吐量、錯誤率與鎖等待，並核對名額不變量（會修改目前資料庫）'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=1000, help='登入的學生人數')
+        parser.add_argument('--courses', nargs='+', metavar='COURSE_CODE', help='目標課號（預設為最熱門的 --hot 門課）')
+        parser.add_argument('--hot', type=int, default=3, help='未指定 --courses 時的熱門課程數')
+        parser.add_argument(
+            '--free-seats',
+            type=int,
+            help='開始前把目標課程的名額設為目前人數加此數，讓課程在測試期間額滿',
+        )
+        parser.add_argument('--threads', type=int, default=16, help='同時送出請求的執行緒數')
+        parser.add_argument('--ops', type=int, default=50, help='每個執行緒的選課次數')
+        parser.add_argument('--drop-rate', type=float, default=0.3, help='選課後隨即退選的比例')
+        parser.add_argument('--url', help='改以 HTTP 送到執行中的伺服器，例如 http://127.0.0.1:8000（需使用同一個資料庫）')
+        parser.add_argument('--prefix', default='seed', help='種子資料的前綴')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['threads'] < 1 or options['ops'] < 1 or options['students'] < 1:
+            raise CommandError('--threads、--ops 與 --students 必須大於 0')
+        if options['url'] and not options['url'].startswith('http://'):
+            raise CommandError('--url 只支援 http:// 網址')
+
+        if options['courses']:
+            courses = list(Course.objects.filter(course_code__in=options['courses']))
+            missing = set(options['courses']) - {c.course_code for c in courses}
+            if missing:
+                raise CommandError(f"找不到課程：{'、'.join(sorted(missing))}")
+        else:
+            courses = loadtest.hot_courses(options['prefix'], options['hot'])
+        students = loadtest.seeded_students(options['prefix'], options['students'], options['seed'])
+        if not courses or not students:
+            raise CommandError(f"找不到前綴為 {options['prefix']}- 的種子資料，請先執行 seed 命令")
+        if options['free_seats'] is not None:
+            loadtest.open_seats(courses, options['free_seats'])
+
+        start = time.perf_counter()
+        sessions = loadtest.login_students(students)
+        self.stdout.write(f'已登入 {len(sessions)} 位學生（{time.perf_counter() - start:.1f} 秒）')
+        codes = '、'.join(c.course_code for c in courses)
+        mode = options['url'] or '測試用戶端'
+        self.stdout.write(f"目標課程：{codes}；{options['threads']} 個執行緒 × {options['ops']} 次，{mode}")
+
+        result = loadtest.run(
+            sessions, courses,
+            threads=options['threads'],
+            ops=options['ops'],
+            drop_rate=options['drop_rate'],
+            base_url=options['url'],
+            random_seed=options['seed'],
+        )
+        self.report(result)
+
+        violations = seats.check_invariants([c.pk for c in courses])
+        for violation in violations:
+            self.stderr.write(self.style.ERROR(violation))
+        if violations:
+            raise CommandError(f'{len(violations)} 項名額不變量被違反')
+        counts = '，'.join(
+            f'{c.course_code} {c.active_enrollment_count}/{c.max_students}'
+            for c in Course.objects.filter(pk__in=[c.pk for c in courses]).order_by('course_code')
+        )
+        self.stdout.write(self.style.SUCCESS(f'名額不變量正常：{counts}'))
+
+    def report(self, result):
+        statuses = '，'.join(f'{status}×{count}' for status, count in result['statuses'].items())
+        self.stdout.write(
+            f"{result['requests']} 個請求，{result['elapsed']:.2f} 秒，{result['throughput']:.1f} 請求/秒；"
+            f"狀態碼 {statuses or '-'}"
+        )
+        line = f"錯誤 {result['errors']} 個（{result['error_rate']:.1%}）"
+        self.stdout.write(self.style.ERROR(line) if result['errors'] else line)
+        for failure in result['failures']:
+            self.stdout.write(f'  {failure}')
+        for kind, label in (('enroll', '選課'), ('drop', '退選')):
+            latency = result['latency'][kind]
+            if latency['count']:
+                self.stdout.write(
+                    f"{label}：{latency['count']} 次，p50 {latency['p50']:.1f} ms，"
+                    f"p95 {latency['p95']:.1f} ms，p99 {latency['p99']:.1f} ms"
+                )
+        lock_wait = result['lock_wait']
+        if lock_wait is None:
+            self.stdout.write('鎖等待：HTTP 模式下發生在伺服器行程，未量測')
+        else:
+            self.stdout.write(
+                f"鎖等待：{lock_wait['count']} 次，合計 {lock_wait['total']:.2f} 秒，"
+                f"p95 {lock_wait['p95'] * 1000:.1f} ms，最長 {lock_wait['max'] * 1000:.1f} ms"
+            )
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from courses import avatars
+from courses.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = '為尚未產生縮圖的頭像產生縮圖（升級後補齊舊頭像）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='重新產生所有頭像的縮圖')
+
+    def handle(self, *args, **options):
+        profiles = UserProfile.objects.exclude(avatar='').exclude(avatar__isnull=True)
+        if not options['all']:
+            profiles = profiles.filter(avatar_renditions={})
+
+        processed = failed = 0
+        for profile in profiles.iterator():
+            try:
+                avatars.process(profile.pk, profile.avatar.name, profile.avatar_renditions)
+            except (OSError, ValueError) as exc:
+                failed += 1
+                self.stdout.write(self.style.ERROR(f'{profile.avatar.name}：{exc}'))
+            else:
+                processed += 1
+
+        self.stdout.write(self.style.SUCCESS(f'已處理 {processed} 個頭像'))
+        if failed:
+            self.stdout.write(self.style.WARNING(f'{failed} 個頭像無法處理'))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F
+
+from courses.models import Course
+
+
+class Command(BaseCommand):
+    help = '依選課記錄重建並核對所有課程的選修人數計數器'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='只核對計數器，不寫入；發現不一致時以非零狀態結束',
+        )
+
+    def handle(self, *args, **options):
+        drifted = (
+            Course.objects.with_actual_enrollment_count()
+            .exclude(active_enrollment_count=F('actual_enrollment_count'))
+            .order_by('course_code')
+        )
+
+        mismatches = list(drifted.values_list('course_code', 'active_enrollment_count', 'actual_enrollment_count'))
+        for course_code, stored, actual in mismatches:
+            self.stdout.write(f'{course_code}: 計數器 {stored}，實際 {actual}')
+
+        if options['check']:
+            if mismatches:
+                raise CommandError(f'{len(mismatches)} 門課程的選修人數計數器不一致')
+            self.stdout.write(self.style.SUCCESS('所有課程的選修人數計數器皆正確'))
+            return
+
+        updated = Course.objects.recount_active_enrollments()
+        self.stdout.write(self.style.SUCCESS(
+            f'已重建 {updated} 門課程的計數器，其中 {len(mismatches)} 門原本不一致'
+        ))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from courses import search
+
+
+class Command(BaseCommand):
+    help = '重建課程全文檢索索引（SQLite 使用 FTS5，其他資料庫使用反向索引表）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='要重建索引的資料庫')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        search.create_fts_table(connections[using])
+        backend = 'FTS5' if search.fts_available(using) else '反向索引表'
+        total = search.rebuild_index(using=using)
+        self.stdout.write(self.style.SUCCESS(f'已使用{backend}索引 {total} 門課程'))
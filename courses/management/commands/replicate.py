@@ -0,0 +1,36 @@
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.database import replicate
+
+
+class Command(BaseCommand):
+    help = '將 SQLite 主資料庫複製到各唯讀副本（本機測試讀寫分離用）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            help='每隔幾秒複製一次，持續執行直到中斷；未指定時只複製一次',
+        )
+
+    def handle(self, *args, **options):
+        aliases = getattr(settings, 'REPLICA_DATABASES', [])
+        if not aliases:
+            raise CommandError('沒有設定副本（環境變數 DB_REPLICAS）')
+
+        while True:
+            start = time.perf_counter()
+            for alias in aliases:
+                try:
+                    replicate(alias)
+                except ImproperlyConfigured as e:
+                    raise CommandError(str(e))
+            elapsed = (time.perf_counter() - start) * 1000
+            self.stdout.write(f"已複製到 {', '.join(aliases)}（{elapsed:.0f} ms）")
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
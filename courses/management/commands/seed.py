@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from courses import seeding
+
+
+class Command(BaseCommand):
+    help = '分批產生大量教師、學生、課程、選課記錄與留言，供效能與負載測試使用'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', choices=seeding.SIZES, default='small', help='預設的資料規模')
+        parser.add_argument('--teachers', type=int, help='教師人數（覆寫 --size）')
+        parser.add_argument('--students', type=int, help='學生人數（覆寫 --size）')
+        parser.add_argument('--courses', type=int, help='課程數（覆寫 --size）')
+        parser.add_argument('--per-student', type=int, help='每位學生選修的課程數（覆寫 --size）')
+        parser.add_argument('--comment-rate', type=float, default=0.05, help='選課記錄中留下留言的比例')
+        parser.add_argument('--prefix', default='seed', help='帳號與課號的前綴')
+        parser.add_argument('--seed', type=int, default=0, help='亂數種子，相同種子產生相同資料')
+        parser.add_argument('--batch-size', type=int, default=seeding.BATCH_SIZE, help='每批寫入的筆數')
+        parser.add_argument('--password', default=seeding.SEED_PASSWORD, help='所有帳號共用的密碼')
+
+    def handle(self, *args, **options):
+        params = dict(seeding.SIZES[options['size']])
+        for name in params:
+            if options[name] is not None:
+                params[name] = options[name]
+        if params['teachers'] < 1 or params['courses'] < 1 or params['students'] < 0 or params['per_student'] < 0:
+            raise CommandError('教師與課程數必須大於 0，學生人數與選修課程數不可為負')
+        if seeding.exists(options['prefix']):
+            raise CommandError(f"已有前綴為 {options['prefix']}- 的資料，請改用其他 --prefix 或先清空資料庫")
+
+        counts = seeding.seed(
+            prefix=options['prefix'],
+            comment_rate=options['comment_rate'],
+            random_seed=options['seed'],
+            batch_size=options['batch_size'],
+            password=options['password'],
+            log=self.stdout.write,
+            **params,
+        )
+        summary = '，'.join(f'{name} {count}' for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f'完成：{summary}'))
+        self.stdout.write(f"登入帳號：{options['prefix']}-s0（學生）、{options['prefix']}-t0（教師）、"
+                          f"{options['prefix']}-admin（管理員），密碼 {options['password']}")
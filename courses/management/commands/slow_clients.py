@@ -0,0 +1,112 @@
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        '以大量慢速用戶端對執行中的伺服器施壓，同時量測一般請求的延遲，'
+        '用來比較 WSGI（例如 gunicorn）與 ASGI（例如 uvicorn）部署'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='目標網址，例如 http://127.0.0.1:8000/courses/')
+        parser.add_argument('--clients', type=int, default=200, help='同時連線的慢速用戶端數')
+        parser.add_argument('--send-seconds', type=float, default=2.0, help='慢速用戶端送出請求標頭所花的秒數')
+        parser.add_argument('--read-delay', type=float, default=0.05, help='慢速用戶端每讀取一段回應後等待的秒數')
+        parser.add_argument('--chunk', type=int, default=1024, help='慢速用戶端每次讀取的位元組數')
+        parser.add_argument('--probes', type=int, default=50, help='慢速用戶端連線期間送出的一般請求數')
+        parser.add_argument('--timeout', type=float, default=30.0, help='單一請求的逾時秒數')
+        parser.add_argument('--cookie', default='', help='附加的 Cookie 標頭（例如登入後的 sessionid=...）')
+
+    def handle(self, *args, **options):
+        parts = urlsplit(options['url'])
+        if parts.scheme != 'http' or not parts.hostname:
+            raise CommandError('只支援 http:// 網址')
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        path = parts.path or '/'
+        if parts.query:
+            path += f'?{parts.query}'
+        headers = [f'GET {path} HTTP/1.1', f'Host: {parts.netloc}', 'Connection: close']
+        if options['cookie']:
+            headers.append(f"Cookie: {options['cookie']}")
+        self.request = ('\r\n'.join(headers) + '\r\n\r\n').encode()
+        self.options = options
+
+        slow, probes, elapsed = asyncio.run(self.run())
+        self.report('慢速用戶端', slow)
+        self.report('一般請求', probes)
+        self.stdout.write(f'總耗時 {elapsed:.2f} 秒')
+
+    async def run(self):
+        options = self.options
+        start = time.perf_counter()
+        slow_tasks = [asyncio.create_task(self.slow_client()) for _ in range(options['clients'])]
+        # 等慢速用戶端佔滿連線後，再以固定間隔送出一般請求
+        await asyncio.sleep(options['send_seconds'] / 2)
+        probes = []
+        for _ in range(options['probes']):
+            probes.append(await self.fetch())
+            await asyncio.sleep(0.05)
+        slow = await asyncio.gather(*slow_tasks)
+        return slow, probes, time.perf_counter() - start
+
+    async def open(self):
+        return await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.options['timeout'])
+
+    async def fetch(self):
+        """一般請求：一次送出並盡快讀完，回傳 (狀態碼, 秒數)"""
+        start = time.perf_counter()
+        try:
+            reader, writer = await self.open()
+            writer.write(self.request)
+            await writer.drain()
+            response = await asyncio.wait_for(reader.read(), self.options['timeout'])
+            writer.close()
+        except (OSError, asyncio.TimeoutError):
+            return None, time.perf_counter() - start
+        return self.status(response), time.perf_counter() - start
+
+    async def slow_client(self):
+        """慢速用戶端：逐位元組送出請求標頭，再分段慢慢讀取回應"""
+        options = self.options
+        start = time.perf_counter()
+        try:
+            reader, writer = await self.open()
+            delay = options['send_seconds'] / len(self.request)
+            for i in range(len(self.request)):
+                writer.write(self.request[i:i + 1])
+                await writer.drain()
+                await asyncio.sleep(delay)
+            head = b''
+            while True:
+                chunk = await asyncio.wait_for(reader.read(options['chunk']), options['timeout'])
+                if not chunk:
+                    break
+                head = head or chunk
+                await asyncio.sleep(options['read_delay'])
+            writer.close()
+        except (OSError, asyncio.TimeoutError):
+            return None, time.perf_counter() - start
+        return self.status(head), time.perf_counter() - start
+
+    def status(self, response):
+        try:
+            return int(response.split(b' ', 2)[1])
+        except (IndexError, ValueError):
+            return None
+
+    def report(self, label, results):
+        ok = sorted(seconds for status, seconds in results if status == 200)
+        failed = len(results) - len(ok)
+        line = f'{label}：{len(ok)}/{len(results)} 成功'
+        if len(ok) >= 2:
+            cuts = statistics.quantiles(ok, n=100)
+            line += f'，p50 {cuts[49] * 1000:.0f} ms，p95 {cuts[94] * 1000:.0f} ms，最長 {ok[-1] * 1000:.0f} ms'
+        self.stdout.write(line)
+        if failed:
+            self.stdout.write(self.style.ERROR(f'{label}：{failed} 個請求失敗或逾時'))
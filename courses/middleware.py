@@ -0,0 +1,55 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import routers
+
+PIN_COOKIE = 'pin_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaPinMiddleware:
+    """
+    使用者寫入後的 REPLICA_PIN_SECONDS 秒內，讀取都使用主資料庫（見 routers.py）。
+
+    以 cookie 記錄而不是 session，避免每次寫入後還要多寫一次 session。
+    同時支援同步與非同步，ASGI 下請求不必為了這個中介層切換到執行緒；
+    sync_to_async 執行的查詢對 routers 狀態的變更會帶回請求的協程。
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        tokens = routers.start_request(self._is_pinned(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = routers.end_request(tokens)
+        return self._pin(response, wrote)
+
+    async def __acall__(self, request):
+        tokens = routers.start_request(self._is_pinned(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            wrote = routers.end_request(tokens)
+        return self._pin(response, wrote)
+
+    def _is_pinned(self, request):
+        return request.method not in SAFE_METHODS or PIN_COOKIE in request.COOKIES
+
+    def _pin(self, response, wrote):
+        if wrote and routers.replicas():
+            response.set_cookie(
+                PIN_COOKIE, '1',
+                max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 5),
+                httponly=True, samesite='Lax',
+            )
+        return response
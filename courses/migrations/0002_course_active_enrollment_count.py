@@ -0,0 +1,27 @@
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_active_enrollment_count(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    courses = Course.objects.annotate(
+        active_count=Count('enrollment', filter=Q(enrollment__is_active=True))
+    )
+    for course in courses.iterator():
+        Course.objects.filter(pk=course.pk).update(active_enrollment_count=course.active_count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='active_enrollment_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='目前選修人數'),
+        ),
+        migrations.RunPython(backfill_active_enrollment_count, migrations.RunPython.noop),
+    ]
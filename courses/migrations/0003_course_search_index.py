@@ -0,0 +1,44 @@
+# Generated by Django 6.0 on 2026-10-18 07:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from courses import search
+
+
+def build_search_index(apps, schema_editor):
+    search.create_fts_table(schema_editor.connection)
+    search.rebuild_index(
+        apps.get_model('courses', 'Course'),
+        apps.get_model('courses', 'CourseSearchToken'),
+        using=schema_editor.connection.alias,
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    search.drop_fts_table(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0002_course_active_enrollment_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64, verbose_name='詞元')),
+                ('weight', models.FloatField(default=1.0, verbose_name='權重')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='courses.course', verbose_name='課程')),
+            ],
+            options={
+                'verbose_name': '課程檢索詞元',
+                'verbose_name_plural': '課程檢索詞元',
+                'unique_together': {('token', 'course')},
+            },
+        ),
+        migrations.RunPython(build_search_index, drop_search_index),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 6.0 on 2026-10-18 07:34
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0003_course_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='final_weight',
+            field=models.PositiveSmallIntegerField(default=50, validators=[django.core.validators.MaxValueValidator(100)], verbose_name='期末權重(%)'),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='midterm_weight',
+            field=models.PositiveSmallIntegerField(default=50, validators=[django.core.validators.MaxValueValidator(100)], verbose_name='期中權重(%)'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 08:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0005_hot_filter_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='coursecomment',
+            name='comment_course_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='coursecomment',
+            index=models.Index(fields=['course', '-created_at', '-id'], name='comment_course_feed_idx'),
+        ),
+    ]
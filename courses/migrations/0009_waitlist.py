@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-18 08:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0008_avatar_renditions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='加入時間')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to='courses.course', verbose_name='課程')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to=settings.AUTH_USER_MODEL, verbose_name='學生')),
+            ],
+            options={
+                'verbose_name': '候補記錄',
+                'verbose_name_plural': '候補記錄',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['course', 'id'], name='waitlist_course_queue_idx')],
+                'unique_together': {('course', 'user')},
+            },
+        ),
+    ]
@@ -1,8 +1,13 @@
 from django.db import models
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
+from django.utils import timezone
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
-from PIL import Image
-import os
+
+from . import avatars
+from .grading import weighted_total
 
 
 # 用戶資料擴展模型
@@ -18,6 +23,8 @@ class UserProfile(models.Model):
     student_id = models.CharField(max_length=20, unique=True, null=True, blank=True, verbose_name="學號")
     teacher_id = models.CharField(max_length=20, unique=True, null=True, blank=True, verbose_name="教工編號")
     avatar = models.ImageField(upload_to='avatars/%Y/%m/%d/', null=True, blank=True, verbose_name="頭像")
+    # 背景產生的縮圖檔名（見 courses/avatars.py）
+    avatar_renditions = models.JSONField(default=dict, blank=True, editable=False, verbose_name="頭像縮圖")
     bio = models.TextField(blank=True, verbose_name="個人簡介")
     phone = models.CharField(max_length=20, blank=True, verbose_name="電話")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="建立時間")
@@ -26,24 +33,41 @@ class UserProfile(models.Model):
     class Meta:
         verbose_name = "用戶資料"
         verbose_name_plural = "用戶資料"
+        indexes = [
+            models.Index(fields=['role'], name='userprofile_role_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.get_full_name() or self.user.username} ({self.get_role_display()})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 記下載入時的頭像，儲存時據此判斷是否更換
+        instance._loaded_avatar = instance.__dict__.get('avatar')
+        return instance
+
     def save(self, *args, **kwargs):
+        avatar_changed = (
+            'avatar' not in self.get_deferred_fields()
+            and self.avatar.name != getattr(self, '_loaded_avatar', None)
+        )
+        previous_renditions = self.avatar_renditions
+        if avatar_changed:
+            self.avatar_renditions = {}
         super().save(*args, **kwargs)
-        # 處理頭像縮放
-        if self.avatar:
-            self._resize_avatar()
+        # 只有頭像更換時才產生縮圖，交由背景處理
+        if avatar_changed:
+            self._loaded_avatar = self.avatar.name
+            if self.avatar:
+                avatars.schedule(self, previous_renditions)
 
-    def _resize_avatar(self):
-        """將頭像縮放至300x300像素"""
-        if self.avatar:
-            img = Image.open(self.avatar.path)
-            if img.height > 300 or img.width > 300:
-                output_size = (300, 300)
-                img.thumbnail(output_size, Image.Resampling.LANCZOS)
-                img.save(self.avatar.path)
+    def avatar_url(self, size, webp=False):
+        """size px 縮圖的網址，縮圖尚未產生時回傳原圖"""
+        name = self.avatar_renditions.get(f'{size}.webp' if webp else str(size))
+        if name:
+            return self.avatar.storage.url(name)
+        return None if webp else self.avatar.url
 
 
 # 教師模型
@@ -67,6 +91,25 @@ class Teacher(models.Model):
         return self.course_set.all()
 
 
+class CourseQuerySet(models.QuerySet):
+    def with_actual_enrollment_count(self):
+        """以 COUNT 標註實際選修人數（actual_enrollment_count），用於核對計數器"""
+        return self.annotate(
+            actual_enrollment_count=Count('enrollment', filter=Q(enrollment__is_active=True))
+        )
+
+    def recount_active_enrollments(self):
+        """以單一 UPDATE 依選課記錄重新計算選修人數，回傳更新的課程數"""
+        active = (
+            Enrollment.objects.filter(course=OuterRef('pk'), is_active=True)
+            .order_by()
+            .values('course')
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        return self.update(active_enrollment_count=Coalesce(Subquery(active), 0), updated_at=timezone.now())
+
+
 # 課程模型（更新）
 class Course(models.Model):
     course_code = models.CharField(max_length=20, unique=True, verbose_name="課號")
@@ -75,25 +118,55 @@ class Course(models.Model):
     credits = models.IntegerField(default=3, verbose_name="學分")
     description = models.TextField(blank=True, verbose_name="課程描述")
     max_students = models.IntegerField(default=50, verbose_name="最大選修人數")
+    active_enrollment_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="目前選修人數")
     semester = models.CharField(max_length=20, default='2024-1', verbose_name="學期")
+    midterm_weight = models.PositiveSmallIntegerField(default=50, validators=[MaxValueValidator(100)], verbose_name="期中權重(%)")
+    final_weight = models.PositiveSmallIntegerField(default=50, validators=[MaxValueValidator(100)], verbose_name="期末權重(%)")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="建立時間")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="更新時間")
 
+    objects = CourseQuerySet.as_manager()
+
     class Meta:
         verbose_name = "課程"
         verbose_name_plural = "課程"
         ordering = ['course_code']
+        indexes = [
+            models.Index(fields=['updated_at'], name='course_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.course_code} - {self.course_name}"
 
+    def save(self, **kwargs):
+        # 選修人數只由 seats/signals 以條件式 UPDATE 維護；更新時不寫回載入時的舊值，
+        # 否則在並行選課之後儲存會把人數改小，名額檢查就會放行超收
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'active_enrollment_count' and field.attname not in deferred
+            ]
+        super().save(**kwargs)
+
+    def clean(self):
+        if self.midterm_weight is None or self.final_weight is None:
+            return
+        if self.midterm_weight + self.final_weight != 100:
+            raise ValidationError('期中與期末權重相加必須為 100%')
+
     def get_enrolled_students(self):
         """取得選修此課程的學生列表"""
         return User.objects.filter(profile__role='student', enrollment__course=self, enrollment__is_active=True).distinct()
 
     def get_current_enrollment_count(self):
-        """取得目前選修人數"""
-        return self.enrollment_set.filter(is_active=True).count()
+        """取得目前選修人數（讀取計數器，不查詢資料庫）"""
+        return self.active_enrollment_count
+
+    @property
+    def is_full(self):
+        """是否已滿班"""
+        return self.active_enrollment_count >= self.max_students
 
     @property
     def instructor_name(self):
@@ -101,6 +174,10 @@ class Course(models.Model):
         return self.teacher.user.get_full_name() if self.teacher else "未設定"
 
 
+# 載入時缺少 is_active/course 欄位，無法得知是否已計入選修人數
+UNKNOWN_COUNTED_COURSE = object()
+
+
 # 選課記錄模型
 class Enrollment(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='enrollment_set', verbose_name="學生")
@@ -130,15 +207,64 @@ class Enrollment(models.Model):
         verbose_name_plural = "選課記錄"
         unique_together = ('user', 'course')
         ordering = ['-enrolled_at']
+        indexes = [
+            # 課程的修課名單、統計與成績登錄；學生的選課列表（只含選修中的記錄）
+            models.Index(
+                fields=['course', '-enrolled_at'],
+                condition=models.Q(is_active=True),
+                name='enrollment_active_course_idx',
+            ),
+            models.Index(
+                fields=['user', '-enrolled_at'],
+                condition=models.Q(is_active=True),
+                name='enrollment_active_user_idx',
+            ),
+        ]
+
+    # 此記錄目前計入哪一門課的選修人數（None 表示未計入），由 signals 與 seats 維護
+    _counted_course_id = None
 
     def __str__(self):
         return f"{self.user.get_full_name()} - {self.course}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'is_active' in instance.__dict__ and 'course_id' in instance.__dict__:
+            instance._counted_course_id = instance.course_id if instance.is_active else None
+        else:
+            # 延遲載入的欄位無法判斷，儲存時改為重新計算
+            instance._counted_course_id = UNKNOWN_COUNTED_COURSE
+        return instance
+
     def get_total_score(self):
-        """計算該科目的總分（期中、期末平均）"""
+        """計算該科目的總分（依課程的期中、期末權重，Decimal 四捨五入至小數第二位）"""
+        # 已由 grading.grade_enrollments() 整批計算過
+        if hasattr(self, 'total_score'):
+            return self.total_score
         if self.midterm_score is None or self.final_score is None:
             return None
-        return round((float(self.midterm_score) + float(self.final_score)) / 2, 2)
+        return weighted_total(self.midterm_score, self.final_score, self.course.midterm_weight, self.course.final_weight)
+
+
+# 候補名單模型（課程額滿時依加入順序遞補，見 courses/waitlist.py）
+class WaitlistEntry(models.Model):
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='waitlist_entries', verbose_name="課程")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='waitlist_entries', verbose_name="學生")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="加入時間")
+
+    class Meta:
+        verbose_name = "候補記錄"
+        verbose_name_plural = "候補記錄"
+        unique_together = ('course', 'user')
+        ordering = ['id']
+        indexes = [
+            # 依 id 排隊：取出隊首與計算名次都只掃描索引
+            models.Index(fields=['course', 'id'], name='waitlist_course_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.get_full_name()} - {self.course.course_code}"
 
 
 # 課程留言模型
@@ -153,11 +279,29 @@ class CourseComment(models.Model):
         verbose_name = "課程留言"
         verbose_name_plural = "課程留言"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['course', '-created_at', '-id'], name='comment_course_feed_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.get_full_name()} - {self.course.course_code}"
 
 
+# 課程檢索反向索引（資料庫不支援 SQLite FTS5 時使用，見 courses/search.py）
+class CourseSearchToken(models.Model):
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='search_tokens', verbose_name="課程")
+    token = models.CharField(max_length=64, verbose_name="詞元")
+    weight = models.FloatField(default=1.0, verbose_name="權重")
+
+    class Meta:
+        verbose_name = "課程檢索詞元"
+        verbose_name_plural = "課程檢索詞元"
+        unique_together = ('token', 'course')
+
+    def __str__(self):
+        return f"{self.token} - {self.course_id}"
+
+
 # 保持與舊系統相容的學生模型
 class Student(models.Model):
     student_id = models.CharField(max_length=20, unique=True, verbose_name="學號")
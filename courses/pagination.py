@@ -0,0 +1,99 @@
+"""
+課程目錄分頁
+
+HTML 頁面使用頁碼分頁（?page=N）；深層頁面與 API 使用以唯一欄位為游標的
+keyset 分頁（?after=<course_code>），以 WHERE course_code > %s ORDER BY course_code
+LIMIT n 取代 OFFSET，無論翻到第幾頁都只讀取 n 筆資料。
+
+apaginate() 是 paginate() 的非同步版本，供 async_views 使用。
+"""
+
+from django.core.paginator import Paginator
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class KeysetPage:
+    """keyset 分頁結果，介面與 Paginator 的 Page 相容以便共用模板"""
+
+    is_keyset = True
+
+    def __init__(self, object_list, has_next, next_cursor, after):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.after = after
+        self._has_next = has_next
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        # keyset 只能往後翻，「上一頁」回到第一頁
+        return bool(self.after)
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def get_page_size(request, default=PAGE_SIZE):
+    """讀取 per_page 參數，限制在 1..MAX_PAGE_SIZE 之間"""
+    try:
+        per_page = int(request.GET.get('per_page', default))
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(per_page, MAX_PAGE_SIZE))
+
+
+def _keyset_queryset(queryset, key, after, per_page):
+    queryset = queryset.order_by(key)
+    if after:
+        queryset = queryset.filter(**{f'{key}__gt': after})
+    # 多取一筆用來判斷是否還有下一頁，不需要 COUNT(*)
+    return queryset[:per_page + 1]
+
+
+def _keyset_page(rows, key, after, per_page):
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    next_cursor = getattr(rows[-1], key) if has_next else None
+    return KeysetPage(rows, has_next, next_cursor, after)
+
+
+def keyset_paginate(queryset, key, after=None, per_page=PAGE_SIZE):
+    """以 key（必須唯一）排序，取出 after 之後的 per_page 筆"""
+    rows = list(_keyset_queryset(queryset, key, after, per_page))
+    return _keyset_page(rows, key, after, per_page)
+
+
+async def akeyset_paginate(queryset, key, after=None, per_page=PAGE_SIZE):
+    """keyset_paginate() 的非同步版本"""
+    rows = [row async for row in _keyset_queryset(queryset, key, after, per_page)]
+    return _keyset_page(rows, key, after, per_page)
+
+
+def paginate(request, queryset, key, per_page=PAGE_SIZE):
+    """帶 after 參數時使用 keyset 分頁，否則使用頁碼分頁"""
+    after = request.GET.get('after')
+    if after is not None:
+        return keyset_paginate(queryset, key, after, per_page)
+    return Paginator(queryset.order_by(key), per_page).get_page(request.GET.get('page'))
+
+
+async def apaginate(request, queryset, key, per_page=PAGE_SIZE):
+    """paginate() 的非同步版本，回傳的頁面 object_list 已載入為列表"""
+    after = request.GET.get('after')
+    if after is not None:
+        return await akeyset_paginate(queryset, key, after, per_page)
+    paginator = Paginator(queryset.order_by(key), per_page)
+    # 先以非同步查詢取得總數，Paginator 不會再執行 COUNT(*)
+    paginator.count = await queryset.acount()
+    page = paginator.get_page(request.GET.get('page'))
+    page.object_list = [row async for row in page.object_list]
+    return page
@@ -0,0 +1,242 @@
+"""
+請求層級的效能量測
+
+ProfilingMiddleware 為每個 courses 視圖（以 URL 名稱區分，例如 courses:course_list）
+記錄牆鐘時間、資料庫時間、查詢數、重複查詢數（SQL 與參數都相同）、模板渲染時間與
+回應大小。每個視圖保留最近 PROFILING_WINDOW 個請求的樣本，即時計算 p50/p95/p99，
+另外累計總次數與總和；資料只存在各行程的記憶體中，多 worker 部署時每個行程各自統計。
+
+- 資料庫：連線建立時由 signals 在每條連線掛上 record_query()，查詢在哪個執行緒執行
+  就由該執行緒的連線記錄，只在量測中的請求記錄；狀態存放在 ContextVar，非同步視圖
+  交給 sync_to_async 執行的查詢也會算進同一個請求；
+- 模板：settings.TEMPLATES 使用 ProfilingTemplates，計算最外層模板的渲染時間
+  （include/extends 已包含在內）；
+- cProfile 取樣：PROFILING_CPROFILE_RATE 為以 cProfile 執行的請求比例（0 為停用），
+  其中耗時達到該視圖 p99 的請求（最慢的 1%）保留前 PROFILING_PROFILE_LINES 行的
+  統計，每個視圖最多 PROFILING_PROFILES_KEPT 份。cProfile 只量測目前執行緒，
+  只對同步請求取樣。
+
+中介層同時支援同步與非同步，ASGI 下非同步視圖不會因為它而改以執行緒執行。
+
+統計可在 profiling/（員工 JSON）與 profiling/metrics（Prometheus 文字格式）查看。
+"""
+
+import cProfile
+import io
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates, Template
+
+# 記錄的指標與單位
+METRICS = {
+    'wall': 'seconds',
+    'db': 'seconds',
+    'queries': 'total',
+    'duplicate_queries': 'total',
+    'template': 'seconds',
+    'response': 'bytes',
+}
+QUANTILES = (0.5, 0.95, 0.99)
+
+_current = ContextVar('courses_profiling_sample', default=None)
+_lock = threading.Lock()
+_stats = {}
+
+
+class Sample:
+    """單一請求的量測值"""
+
+    def __init__(self):
+        self.db = 0.0
+        self.template = 0.0
+        self.queries = []
+
+    @property
+    def duplicate_queries(self):
+        return len(self.queries) - len(set(self.queries))
+
+
+class ViewStats:
+    """單一視圖最近 window 個請求的樣本與累計值"""
+
+    def __init__(self, window):
+        self.count = 0
+        self.sums = dict.fromkeys(METRICS, 0.0)
+        self.samples = {name: deque(maxlen=window) for name in METRICS}
+        self.profiles = deque(maxlen=settings.PROFILING_PROFILES_KEPT)
+
+    def add(self, values):
+        self.count += 1
+        for name, value in values.items():
+            self.sums[name] += value
+            self.samples[name].append(value)
+
+    def quantile(self, name, q):
+        values = sorted(self.samples[name])
+        if not values:
+            return None
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'metrics': {
+                name: {
+                    'sum': self.sums[name],
+                    **{f'p{round(q * 100)}': self.quantile(name, q) for q in QUANTILES},
+                }
+                for name in METRICS
+            },
+            'profiles': list(self.profiles),
+        }
+
+
+def record_query(execute, sql, params, many, context):
+    """connection.execute_wrapper()：量測中的請求記錄查詢與耗時"""
+    sample = _current.get()
+    if sample is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        sample.db += time.perf_counter() - start
+        sample.queries.append((sql, repr(params)))
+
+
+def install(connection):
+    """新連線建立時由 signals 呼叫"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class ProfilingTemplate(Template):
+    def render(self, context=None, request=None):
+        sample = _current.get()
+        if sample is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            sample.template += time.perf_counter() - start
+
+
+class ProfilingTemplates(DjangoTemplates):
+    """與 DjangoTemplates 相同，另外記錄模板渲染時間"""
+
+    def from_string(self, template_code):
+        return ProfilingTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return ProfilingTemplate(super().get_template(template_name).template, self)
+
+
+def record(view_name, values, profile=None):
+    with _lock:
+        stats = _stats.get(view_name)
+        if stats is None:
+            stats = _stats[view_name] = ViewStats(settings.PROFILING_WINDOW)
+        stats.add(values)
+        # 只保留達到 p99 的請求（最慢的 1%）的 cProfile 統計
+        if profile is not None and values['wall'] >= stats.quantile('wall', 0.99):
+            stats.profiles.append({'wall': values['wall'], 'stats': _format_profile(profile)})
+
+
+def _format_profile(profile):
+    out = io.StringIO()
+    pstats.Stats(profile, stream=out).sort_stats('cumulative').print_stats(settings.PROFILING_PROFILE_LINES)
+    return out.getvalue()
+
+
+def snapshot():
+    """各視圖的統計摘要"""
+    with _lock:
+        return {name: stats.summary() for name, stats in sorted(_stats.items())}
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+def prometheus():
+    """Prometheus 文字格式（summary：分位數、_sum 與 _count）"""
+    data = snapshot()
+    lines = []
+    for metric, unit in METRICS.items():
+        name = f'courses_view_{metric}_{unit}'
+        lines.append(f'# TYPE {name} summary')
+        for view, summary in data.items():
+            values = summary['metrics'][metric]
+            for q in QUANTILES:
+                value = values[f'p{round(q * 100)}']
+                if value is not None:
+                    lines.append(f'{name}{{view="{view}",quantile="{q}"}} {value}')
+            lines.append(f'{name}_sum{{view="{view}"}} {values["sum"]}')
+            lines.append(f'{name}_count{{view="{view}"}} {summary["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+class ProfilingMiddleware:
+    """記錄 courses 視圖的耗時、查詢與回應大小（見模組說明），同時支援同步與非同步"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        sample = Sample()
+        token = _current.set(sample)
+        profile = None
+        if random.random() < settings.PROFILING_CPROFILE_RATE:
+            profile = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            if profile is not None:
+                response = profile.runcall(self.get_response, request)
+            else:
+                response = self.get_response(request)
+        finally:
+            wall = time.perf_counter() - start
+            _current.reset(token)
+        self._record(request, response, sample, wall, profile)
+        return response
+
+    async def __acall__(self, request):
+        # 事件迴圈中同時有其他請求的協程，無法以 cProfile 只量測這個請求，不取樣
+        sample = Sample()
+        token = _current.set(sample)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            wall = time.perf_counter() - start
+            _current.reset(token)
+        self._record(request, response, sample, wall)
+        return response
+
+    def _record(self, request, response, sample, wall, profile=None):
+        match = request.resolver_match
+        if match is not None and 'courses' in match.namespaces:
+            record(match.view_name, {
+                'wall': wall,
+                'db': sample.db,
+                'queries': len(sample.queries),
+                'duplicate_queries': sample.duplicate_queries,
+                'template': sample.template,
+                'response': 0 if response.streaming else len(response.content),
+            }, profile)
@@ -0,0 +1,163 @@
+"""
+使用者角色解析
+
+request.user 由 backends.CachedModelBackend 載入：以一次 JOIN 查詢同時取出 User、
+UserProfile 與 Teacher，之後 request.user.profile、request.user.teacher 與模板中的
+user.profile.avatar 都不再查詢資料庫。載入結果快取在兩層：
+- 行程內快取（PROCESS_TTL 秒），同一個 worker 連續的請求不必讀取共用快取；
+- Django cache（CACHE_TIMEOUT 秒），多個 worker 共用。
+
+User、UserProfile、Teacher 儲存或刪除時由 signals 呼叫 invalidate_user() 清除兩層
+快取；其他 worker 的行程內快取最多晚 PROCESS_TTL 秒失效。快取的是序列化後的
+bytes，每個請求拿到的都是獨立的物件。
+
+視圖以 role_required() 檢查角色，取代各自查詢 profile 的重複程式碼。
+"""
+
+import pickle
+import threading
+import time
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.http import HttpResponseForbidden
+
+PROCESS_TTL = 5
+PROCESS_MAX_ENTRIES = 1000
+CACHE_TIMEOUT = 60
+
+NO_PROFILE_MESSAGE = '您的帳號沒有關聯的用戶資料,請聯繫管理員'
+
+# 各角色登入後的首頁
+DASHBOARDS = {
+    'student': 'courses:student_dashboard',
+    'teacher': 'courses:teacher_dashboard',
+    'admin': 'courses:admin_dashboard',
+}
+
+_process_cache = {}
+_lock = threading.Lock()
+
+
+def _cache_key(user_id):
+    return f'courses:user:{user_id}'
+
+
+def load_user(user_id):
+    """以一次查詢載入 User 及其 UserProfile、Teacher，不存在時回傳 None"""
+    return User.objects.select_related('profile', 'teacher').filter(pk=user_id).first()
+
+
+def get_user(user_id):
+    """取得使用者（含 profile 與 teacher），優先使用快取"""
+    now = time.monotonic()
+    entry = _process_cache.get(user_id)
+    if entry is not None and entry[0] > now:
+        return pickle.loads(entry[1])
+
+    key = _cache_key(user_id)
+    data = cache.get(key)
+    if data is None:
+        user = load_user(user_id)
+        if user is None:
+            return None
+        data = pickle.dumps(user)
+        cache.set(key, data, CACHE_TIMEOUT)
+    else:
+        user = pickle.loads(data)
+
+    with _lock:
+        if len(_process_cache) >= PROCESS_MAX_ENTRIES:
+            _process_cache.clear()
+        _process_cache[user_id] = (now + PROCESS_TTL, data)
+    return user
+
+
+def invalidate_user(user_id):
+    """清除使用者快取"""
+    with _lock:
+        _process_cache.pop(user_id, None)
+    cache.delete(_cache_key(user_id))
+
+
+def get_profile(user):
+    """使用者的 UserProfile，未登入或沒有 profile 時回傳 None"""
+    if not user.is_authenticated:
+        return None
+    try:
+        return user.profile
+    except ObjectDoesNotExist:
+        return None
+
+
+def get_teacher(user):
+    """使用者的 Teacher 資料，沒有時回傳 None"""
+    if not user.is_authenticated:
+        return None
+    try:
+        return user.teacher
+    except ObjectDoesNotExist:
+        return None
+
+
+def has_role(user, *roles):
+    """使用者角色是否屬於 roles；管理員角色另外要求 is_staff"""
+    profile = get_profile(user)
+    if profile is None or profile.role not in roles:
+        return False
+    return profile.role != 'admin' or user.is_staff
+
+
+def is_admin(user):
+    return has_role(user, 'admin')
+
+
+def is_course_teacher(user, course):
+    """使用者是否為課程的任課教師"""
+    return has_role(user, 'teacher') and course.teacher is not None and course.teacher.user_id == user.pk
+
+
+def dashboard_for(user):
+    """使用者登入後應前往的頁面（URL 名稱）"""
+    profile = get_profile(user)
+    if profile is None:
+        return 'courses:complete_profile'
+    return DASHBOARDS.get(profile.role, DASHBOARDS['student'])
+
+
+def _forbidden(user, roles, message):
+    if get_profile(user) is None:
+        return HttpResponseForbidden(NO_PROFILE_MESSAGE)
+    if not has_role(user, *roles):
+        return HttpResponseForbidden(message)
+    return None
+
+
+def role_required(*roles, message='您沒有權限訪問此頁面'):
+    """要求登入且角色屬於 roles，否則回傳 403；同時支援同步與非同步視圖"""
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @login_required
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                # 以 auser() 載入後替換 request.user，模板中取用時不會再同步查詢
+                request.user = await request.auser()
+                forbidden = _forbidden(request.user, roles, message)
+                if forbidden is not None:
+                    return forbidden
+                return await view(request, *args, **kwargs)
+            return async_wrapper
+
+        @login_required
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            forbidden = _forbidden(request.user, roles, message)
+            if forbidden is not None:
+                return forbidden
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
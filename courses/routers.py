@@ -0,0 +1,80 @@
+"""
+讀寫分離的資料庫路由
+
+課程目錄與各儀表板的讀取佔了大部分流量，寫入只有選課、成績登錄與留言。
+settings.REPLICA_DATABASES 有設定副本時，courses 與 auth 的讀取分配到副本，
+寫入一律使用主資料庫（default）。每個請求開始時隨機挑選一個副本，整個請求的讀取都
+使用同一個副本：各副本的複製延遲不同，conditional.py 計算 ETag 的狀態與視圖渲染的
+內容必須來自同一份資料，否則可能把較舊的內容存在較新的 ETag 之下。
+
+副本有複製延遲，以下情況的讀取改用主資料庫（read-your-writes）：
+- 已在主資料庫的交易中，例如 seats.allocate_seat() 在交易內查詢選課記錄；
+- 同一個請求中已經寫入過；
+- 使用者在 REPLICA_PIN_SECONDS 秒內寫入過，由 middleware.ReplicaPinMiddleware 以
+  cookie 記錄，跨 worker 也有效。
+
+只有經過 ReplicaPinMiddleware 的請求會讀取副本，管理命令與腳本一律使用主資料庫。
+狀態存放在 ContextVar，每個請求（包含 ASGI 下的協程）各自獨立。
+"""
+
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+ROUTED_APP_LABELS = {'courses', 'auth'}
+
+# 請求以外（管理命令、腳本）預設使用主資料庫
+_pinned = ContextVar('courses_replica_pinned', default=True)
+_wrote = ContextVar('courses_replica_wrote', default=False)
+_replica = ContextVar('courses_replica_alias', default=None)
+
+
+def replicas():
+    return getattr(settings, 'REPLICA_DATABASES', [])
+
+
+def start_request(pinned):
+    """請求開始時呼叫，挑選本次請求讀取的副本，回傳給 end_request() 的 token"""
+    aliases = replicas()
+    return _pinned.set(pinned), _wrote.set(False), _replica.set(random.choice(aliases) if aliases else None)
+
+
+def end_request(tokens):
+    """請求結束時呼叫，回傳本次請求是否寫入過"""
+    wrote = _wrote.get()
+    pinned_token, wrote_token, replica_token = tokens
+    _pinned.reset(pinned_token)
+    _wrote.reset(wrote_token)
+    _replica.reset(replica_token)
+    return wrote
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in ROUTED_APP_LABELS:
+            return None
+        replica = _replica.get()
+        if replica is None or _pinned.get() or _wrote.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label not in ROUTED_APP_LABELS:
+            return None
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # 副本與主資料庫內容相同，物件之間可以互相關聯
+        aliases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # 副本的結構由複製而來
+        if db in replicas():
+            return False
+        return None
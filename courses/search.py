@@ -0,0 +1,287 @@
+"""
+課程全文檢索
+
+索引涵蓋課號、課名、課程描述、任課教師姓名與所屬部門。文字先由 tokenize()
+切成詞元：英數字以單字為單位（轉小寫），中日韓文字以相鄰兩字（bigram）為單位，
+每段中文的最後一個字另外保留單字詞元，讓單一字的查詢可用前綴比對找到。
+
+有兩種索引後端，由資料庫決定：
+- SQLite 且支援 FTS5：寫入 courses_course_fts 虛擬表，以 bm25() 排序；
+- 其他情況：寫入 CourseSearchToken 反向索引表，以欄位權重加總排序。
+
+查詢的最後一個詞元以前綴比對，輸入到一半（例如「CS1」）也能找到結果。
+搜尋結果以 SearchResults 交給 Paginator：總數以 COUNT 查詢，每頁只以 LIMIT/OFFSET
+取出該頁的課程 id，結果不設上限。
+課程與教師資料異動時由 signals 呼叫 index_courses()/remove_course() 增量更新；
+批次匯入後可執行 manage.py rebuild_search_index 重建。
+"""
+
+import re
+
+from django.db import connections, router, transaction
+from django.db.models import Count, Q, Sum
+from django.db.utils import DatabaseError
+
+FTS_TABLE = 'courses_course_fts'
+
+# 欄位與排序權重（權重越大越重要）
+FIELD_WEIGHTS = {
+    'course_code': 10.0,
+    'course_name': 5.0,
+    'description': 1.0,
+    'teacher': 3.0,
+    'department': 2.0,
+}
+FIELDS = tuple(FIELD_WEIGHTS)
+
+_CJK = (
+    '぀-ヿ'   # 平假名、片假名
+    '㐀-䶿'   # CJK 擴展 A
+    '一-鿿'   # CJK 統一表意文字
+    '豈-﫿'   # CJK 相容表意文字
+    '가-힯'   # 韓文音節
+)
+_TOKEN_RE = re.compile(rf'[{_CJK}]+|[^\W{_CJK}]+')
+_CJK_RE = re.compile(rf'[{_CJK}]')
+
+# 各資料庫連線是否可使用 FTS5，依 alias 快取
+_fts_available = {}
+
+
+def tokenize(text):
+    """將文字切成檢索詞元，索引與查詢共用同一套規則"""
+    tokens = []
+    for run in _TOKEN_RE.findall((text or '').lower()):
+        if _CJK_RE.match(run):
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+            tokens.append(run[-1])
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def _query_tokens(text):
+    """查詢詞元：中文只取 bigram（單字詞元只為單字查詢保留），並去除重複"""
+    tokens = []
+    for run in _TOKEN_RE.findall((text or '').lower()):
+        if _CJK_RE.match(run) and len(run) > 1:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return list(dict.fromkeys(tokens))
+
+
+def _teacher_text(first_name, last_name):
+    # 中文姓名常分存在 first_name/last_name，合併後才能比對「王老師」這類查詢
+    first_name, last_name = first_name or '', last_name or ''
+    return f'{first_name} {last_name} {first_name}{last_name}'
+
+
+def _documents(courses):
+    """由課程 QuerySet 產生 (course_id, {欄位: 文字})，也可用於遷移中的歷史模型"""
+    rows = courses.values_list(
+        'pk', 'course_code', 'course_name', 'description',
+        'teacher__user__first_name', 'teacher__user__last_name', 'teacher__department',
+    )
+    for pk, code, name, description, first_name, last_name, department in rows.iterator():
+        yield pk, {
+            'course_code': code,
+            'course_name': name,
+            'description': description,
+            'teacher': _teacher_text(first_name, last_name),
+            'department': department,
+        }
+
+
+def fts_available(using='default'):
+    """此資料庫是否已建立 FTS5 索引表"""
+    if using not in _fts_available:
+        connection = connections[using]
+        available = False
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE]
+                )
+                available = cursor.fetchone() is not None
+        _fts_available[using] = available
+    return _fts_available[using]
+
+
+def create_fts_table(connection):
+    """在 SQLite 上建立 FTS5 虛擬表，不支援 FTS5 時回傳 False"""
+    if connection.vendor != 'sqlite':
+        return False
+    columns = ', '.join(FIELDS)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                f"{columns}, tokenize = 'unicode61 remove_diacritics 0', prefix = '1 2 3')"
+            )
+    except DatabaseError:
+        return False
+    _fts_available.pop(connection.alias, None)
+    return True
+
+
+def drop_fts_table(connection):
+    """移除 FTS5 虛擬表（遷移回滾時使用）"""
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    _fts_available.pop(connection.alias, None)
+
+
+def _write_fts(connection, documents):
+    placeholders = ', '.join(['%s'] * (len(FIELDS) + 1))
+    with connection.cursor() as cursor:
+        for pk, fields in documents:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [pk])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(FIELDS)}) VALUES ({placeholders})",
+                [pk] + [' '.join(tokenize(fields[field])) for field in FIELDS],
+            )
+
+
+def _write_tokens(token_model, using, documents):
+    for pk, fields in documents:
+        weights = {}
+        for field in FIELDS:
+            for token in tokenize(fields[field]):
+                # 超過欄位長度的詞元（例如很長的英數字串）截斷後仍可前綴比對
+                token = token[:64]
+                weights[token] = weights.get(token, 0.0) + FIELD_WEIGHTS[field]
+        token_model.objects.using(using).filter(course_id=pk).delete()
+        token_model.objects.using(using).bulk_create(
+            token_model(course_id=pk, token=token, weight=weight) for token, weight in weights.items()
+        )
+
+
+def index_courses(courses):
+    """（重新）索引 QuerySet 中的課程"""
+    from .models import CourseSearchToken
+
+    using = router.db_for_write(courses.model)
+    documents = _documents(courses.using(using))
+    with transaction.atomic(using=using):
+        if fts_available(using):
+            _write_fts(connections[using], documents)
+        else:
+            _write_tokens(CourseSearchToken, using, documents)
+
+
+def remove_course(course_id, using='default'):
+    """自索引移除課程（反向索引表會隨課程級聯刪除）"""
+    if fts_available(using):
+        with connections[using].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [course_id])
+
+
+def rebuild_index(course_model=None, token_model=None, using='default'):
+    """
+    清空並重建整個索引，回傳索引的課程數。
+
+    遷移中呼叫時傳入歷史模型；一般情況使用目前的 Course/CourseSearchToken。
+    """
+    if course_model is None:
+        from . import models
+        course_model, token_model = models.Course, models.CourseSearchToken
+
+    connection = connections[using]
+    courses = course_model.objects.using(using).all()
+    with transaction.atomic(using=using):
+        if fts_available(using):
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            _write_fts(connection, _documents(courses))
+        else:
+            token_model.objects.using(using).all().delete()
+            _write_tokens(token_model, using, _documents(courses))
+    return courses.count()
+
+
+def _fts_match_expression(tokens):
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def _token_matches(tokens, using):
+    """反向索引表：每個查詢詞元都要命中（最後一個以前綴比對），依權重加總排序"""
+    from .models import CourseSearchToken
+
+    conditions = [Q(token=token) for token in tokens[:-1]] + [Q(token__startswith=tokens[-1])]
+    any_token = Q()
+    for condition in conditions:
+        any_token |= condition
+    return (
+        CourseSearchToken.objects.using(using)
+        .filter(any_token)
+        .values('course_id')
+        .annotate(score=Sum('weight'), **{
+            f'hit{i}': Count('pk', filter=condition) for i, condition in enumerate(conditions)
+        })
+        .filter(**{f'hit{i}__gt': 0 for i in range(len(conditions))})
+        .order_by('-score', 'course_id')
+    )
+
+
+class SearchResults:
+    """
+    依相關度排序的搜尋結果，介面與 Paginator 相容：count() 執行 COUNT 查詢，
+    切片只以 LIMIT/OFFSET 取出該範圍的課程 id
+    """
+
+    def __init__(self, query):
+        from .models import Course
+
+        self.tokens = _query_tokens(query)
+        self.using = router.db_for_read(Course)
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = self._fetch_count() if self.tokens else 0
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        # Paginator 只以 [bottom:top] 切片取出一頁
+        if not isinstance(index, slice) or index.step is not None:
+            raise TypeError('SearchResults 只支援不含間隔的切片')
+        offset, stop = index.start or 0, index.stop
+        if not self.tokens or (stop is not None and stop <= offset):
+            return []
+        return self._fetch_ids(None if stop is None else stop - offset, offset)
+
+    def _fetch_count(self):
+        if fts_available(self.using):
+            with connections[self.using].cursor() as cursor:
+                cursor.execute(
+                    f'SELECT COUNT(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+                    [_fts_match_expression(self.tokens)],
+                )
+                return cursor.fetchone()[0]
+        return _token_matches(self.tokens, self.using).count()
+
+    def _fetch_ids(self, limit, offset):
+        if fts_available(self.using):
+            weights = ', '.join(str(FIELD_WEIGHTS[field]) for field in FIELDS)
+            with connections[self.using].cursor() as cursor:
+                # SQLite 的 LIMIT -1 表示不限筆數
+                cursor.execute(
+                    f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                    f'ORDER BY bm25({FTS_TABLE}, {weights}), rowid LIMIT %s OFFSET %s',
+                    [_fts_match_expression(self.tokens), -1 if limit is None else limit, offset],
+                )
+                return [row[0] for row in cursor.fetchall()]
+        ids = _token_matches(self.tokens, self.using).values_list('course_id', flat=True)
+        return list(ids[offset:] if limit is None else ids[offset:offset + limit])
+
+
+def search_course_ids(query, limit=None, offset=0):
+    """回傳符合查詢的課程 id，依相關度由高到低排序；limit 為 None 時回傳全部"""
+    return SearchResults(query)[offset:None if limit is None else offset + limit]
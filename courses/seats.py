@@ -0,0 +1,177 @@
+"""
+選課名額分配服務
+
+所有會改變「選修中」狀態的操作都應經過此模組，讓 Course.active_enrollment_count
+與實際的選課記錄保持一致。人數改變時一併更新 Course.updated_at，課程目錄的
+條件式請求（conditional.py）才會看到變更。名額的佔用以單一條件式 UPDATE 完成：
+
+    UPDATE courses_course
+       SET active_enrollment_count = active_enrollment_count + 1
+     WHERE id = %s AND active_enrollment_count < max_students
+
+資料庫保證這個判斷與遞增是原子的，因此同一門課在選課高峰時被大量同時加選，
+也不會超收，而且不需要每次都執行 COUNT(*)。
+"""
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Course, Enrollment, WaitlistEntry
+from .stats import invalidate_course_stats
+
+
+# 選課結果
+ENROLLED = 'enrolled'
+REACTIVATED = 'reactivated'
+ALREADY_ENROLLED = 'already_enrolled'
+FULL = 'full'
+
+# 退選結果
+DROPPED = 'dropped'
+NOT_ACTIVE = 'not_active'
+
+
+class _Rollback(Exception):
+    """中止選課交易，回滾本次已佔用的名額；args[0] 為回傳給呼叫端的結果"""
+
+
+def _take_seat(course_id):
+    """原子地佔用一個名額，成功回傳 True，額滿回傳 False"""
+    return Course.objects.filter(
+        pk=course_id,
+        active_enrollment_count__lt=F('max_students'),
+    ).update(active_enrollment_count=F('active_enrollment_count') + 1, updated_at=timezone.now()) == 1
+
+
+def _release_seat(course_id):
+    """原子地釋放一個名額"""
+    Course.objects.filter(
+        pk=course_id,
+        active_enrollment_count__gt=0,
+    ).update(active_enrollment_count=F('active_enrollment_count') - 1, updated_at=timezone.now())
+
+
+def allocate_seat(user, course):
+    """
+    為學生選課，回傳 (結果, Enrollment 或 None)。
+
+    先以條件式 UPDATE 佔用名額（同時取得寫入鎖），再建立或恢復選課記錄；
+    若發現學生已在選修中，整個交易回滾，名額不會被重複計算。
+    """
+    course_id = getattr(course, 'pk', course)
+
+    try:
+        with transaction.atomic():
+            if not _take_seat(course_id):
+                raise _Rollback(FULL)
+
+            existing = Enrollment.objects.filter(user=user, course_id=course_id).first()
+            if existing is None:
+                # 名額已由 _take_seat 計入，標記後 signals 不會重複計算
+                enrollment = Enrollment(user=user, course_id=course_id)
+                enrollment._counted_course_id = course_id
+                try:
+                    with transaction.atomic():
+                        enrollment.save(force_insert=True)
+                except IntegrityError:
+                    # 同一位學生的並行請求已先建立記錄
+                    raise _Rollback(ALREADY_ENROLLED)
+                return ENROLLED, enrollment
+
+            # 恢復已退選的記錄，以 is_active=False 為條件避免與並行請求重複恢復
+            reactivated = Enrollment.objects.filter(pk=existing.pk, is_active=False).update(
+                is_active=True,
+                updated_at=timezone.now(),
+            )
+            if not reactivated:
+                raise _Rollback(ALREADY_ENROLLED)
+            # QuerySet.update() 不會觸發 signals，需自行清除統計快取
+            transaction.on_commit(lambda: invalidate_course_stats(course_id))
+            existing.is_active = True
+            existing._counted_course_id = course_id
+            return REACTIVATED, existing
+    except _Rollback as rollback:
+        result = rollback.args[0]
+
+    existing = Enrollment.objects.filter(user=user, course_id=course_id).first()
+    if existing is not None and existing.is_active:
+        return ALREADY_ENROLLED, existing
+    return result, None
+
+
+def release_seat(enrollment):
+    """
+    學生退選，回傳 DROPPED 或 NOT_ACTIVE。
+
+    以 is_active=True 為條件停用記錄，只有真正改變狀態的請求才會釋放名額，
+    重複送出的退選請求不會讓人數變成負值或少算。空出的名額在同一個交易中
+    由候補名單的隊首遞補（見 waitlist.py）。
+    """
+    from . import waitlist
+
+    with transaction.atomic():
+        dropped = Enrollment.objects.filter(pk=enrollment.pk, is_active=True).update(
+            is_active=False,
+            updated_at=timezone.now(),
+        )
+        if not dropped:
+            return NOT_ACTIVE
+        _release_seat(enrollment.course_id)
+        transaction.on_commit(lambda: invalidate_course_stats(enrollment.course_id))
+        waitlist.promote(enrollment.course_id)
+
+    enrollment.is_active = False
+    enrollment._counted_course_id = None
+    return DROPPED
+
+
+def check_invariants(course_ids=None):
+    """
+    核對名額的不變量，回傳違反項目的說明列表（空列表表示正常）：
+    選修中人數不超過 max_students、計數器與實際人數一致、同一位學生在同一門課只有一筆記錄，
+    以及候補名單只在額滿時有人、候補中的學生沒有同時選修該課程
+    """
+    waiting = (
+        WaitlistEntry.objects.filter(course=OuterRef('pk'))
+        .order_by()
+        .values('course')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    courses = (
+        Course.objects.with_actual_enrollment_count()
+        .annotate(waiting=Coalesce(Subquery(waiting), 0))
+        .order_by('course_code')
+    )
+    enrollments = Enrollment.objects.all()
+    entries = WaitlistEntry.objects.all()
+    if course_ids is not None:
+        courses = courses.filter(pk__in=course_ids)
+        enrollments = enrollments.filter(course_id__in=course_ids)
+        entries = entries.filter(course_id__in=course_ids)
+
+    violations = []
+    rows = courses.values_list(
+        'course_code', 'max_students', 'active_enrollment_count', 'actual_enrollment_count', 'waiting',
+    )
+    for code, max_students, stored, actual, waiting_count in rows:
+        if actual > max_students:
+            violations.append(f'{code}：選修中 {actual} 人，超過名額 {max_students}')
+        if stored != actual:
+            violations.append(f'{code}：計數器 {stored}，實際 {actual}')
+        if waiting_count and actual < max_students:
+            violations.append(f'{code}：尚有 {max_students - actual} 個名額，候補名單仍有 {waiting_count} 人')
+    duplicates = (
+        enrollments.order_by()
+        .values('user_id', 'course__course_code')
+        .annotate(total=Count('pk'))
+        .filter(total__gt=1)
+    )
+    for row in duplicates:
+        violations.append(f"{row['course__course_code']}：學生 {row['user_id']} 有 {row['total']} 筆選課記錄")
+    enrolled = Enrollment.objects.filter(user=OuterRef('user'), course=OuterRef('course'), is_active=True)
+    for user_id, code in entries.filter(Exists(enrolled)).values_list('user_id', 'course__course_code'):
+        violations.append(f'{code}：學生 {user_id} 已選修仍在候補名單中')
+    return violations
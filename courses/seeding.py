@@ -0,0 +1,205 @@
+"""
+大量測試資料產生
+
+init_test_data.py 以 get_or_create 逐筆建立少數帳號並各自 set_password()，無法重現
+正式環境的資料量。seed() 依參數產生教師、學生、課程、選課記錄與留言：
+- 密碼雜湊只計算一次，所有帳號共用（預設密碼 SEED_PASSWORD）；
+- 先以固定的亂數種子在記憶體中規劃選課，再分批寫入，每批 batch_size 筆，同一張表
+  的寫入在同一個交易中完成。使用者、個人資料、教師與課程以 bulk_create 寫入；
+  筆數最多的選課記錄與留言和 grade_import 一樣使用參數化的 executemany INSERT，
+  不建立模型實例，百萬筆時可省下大半時間；
+- 課程熱門程度呈長尾分布，少數課程被選滿；分數以常態分布產生，期末與期中相關，
+  部分課程尚未登錄期末分數，少數記錄為已退選。
+
+bulk_create 與 executemany 都不觸發 signals，寫入後以 recount_active_enrollments() 重算選修人數，
+並重建這批課程的檢索索引。帳號與課號都以 prefix 開頭，同一個種子產生的資料相同。
+"""
+
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from . import search
+from .models import Course, CourseComment, Enrollment, Teacher, UserProfile
+
+SEED_PASSWORD = 'seed-password'
+BATCH_SIZE = 5000
+
+# 預設的資料規模
+SIZES = {
+    'small': {'teachers': 20, 'students': 1000, 'courses': 100, 'per_student': 5},
+    'medium': {'teachers': 200, 'students': 10000, 'courses': 1000, 'per_student': 8},
+    'large': {'teachers': 2000, 'students': 100000, 'courses': 5000, 'per_student': 10},
+}
+
+SURNAMES = '陳林黃張李王吳劉蔡楊許鄭謝郭洪曾邱廖賴周'
+GIVEN_NAMES = ['志明', '淑芬', '家豪', '雅婷', '冠宇', '怡君', '俊傑', '佳穎', '承翰', '詩涵', '宗翰', '欣怡']
+DEPARTMENTS = ['資訊工程系', '電機工程系', '數學系', '物理系', '企業管理系', '外國語文系']
+SUBJECTS = ['程式設計', '資料結構', '演算法', '線性代數', '微積分', '機率', '作業系統', '計算機網路',
+            '資料庫系統', '機器學習', '電路學', '經濟學', '會計學', '英文寫作']
+LEVELS = ['導論', '（一）', '（二）', '進階', '專題', '實務']
+COMMENTS = ['很實用的課程', '作業量偏多', '老師講解清楚', '考試很難', '推薦修這門課', '期末專題很有收穫']
+
+
+def _name(rng):
+    return rng.choice(SURNAMES), rng.choice(GIVEN_NAMES)
+
+
+def _score(rng, mean, spread):
+    return round(min(100.0, max(0.0, rng.gauss(mean, spread))), 2)
+
+
+def _batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _create(model, objects, batch_size):
+    """分批 bulk_create，回傳建立的物件（含主鍵）"""
+    created = []
+    with transaction.atomic():
+        for batch in _batches(objects, batch_size):
+            created += model.objects.bulk_create(batch)
+    return created
+
+
+def _insert(model, fields, rows, batch_size):
+    """以 executemany INSERT 分批寫入 rows（值需已轉為資料庫格式），不建立模型實例"""
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(model._meta.get_field(name).column) for name in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    sql = f'INSERT INTO {quote(model._meta.db_table)} ({columns}) VALUES ({placeholders})'
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        for batch in _batches(rows, batch_size):
+            cursor.executemany(sql, batch)
+
+
+def plan_enrollments(rng, students, courses, per_student):
+    """每位學生依課程熱門程度選 per_student 門不重複的課，回傳 [(學生序號, 課程序號)]"""
+    per_student = min(per_student, courses)
+    # 長尾分布：第 r 熱門的課程權重為 1/r^0.8
+    cum_weights = list(accumulate(1 / (rank + 1) ** 0.8 for rank in range(courses)))
+    order = list(range(courses))
+    rng.shuffle(order)
+    pairs = []
+    for student in range(students):
+        chosen = set()
+        while len(chosen) < per_student:
+            chosen.update(rng.choices(order, cum_weights=cum_weights, k=per_student - len(chosen)))
+        pairs += [(student, course) for course in sorted(chosen)]
+    return pairs
+
+
+def seed(prefix='seed', teachers=20, students=1000, courses=100, per_student=5, comment_rate=0.05,
+         random_seed=0, batch_size=BATCH_SIZE, password=SEED_PASSWORD, log=None):
+    """產生一組測試資料，回傳各表建立的筆數；log(訊息) 回報各階段耗時"""
+    rng = random.Random(random_seed)
+    log = log or (lambda message: None)
+    password_hash = make_password(password)
+    started = time.perf_counter()
+
+    def phase(label, count):
+        log(f'{label}：{count} 筆（累計 {time.perf_counter() - started:.1f} 秒）')
+
+    # 使用者（教師、學生與一位管理員）
+    users = [
+        User(username=f'{prefix}-t{i}', first_name=first, last_name=last, password=password_hash)
+        for i, (first, last) in enumerate(_name(rng) for _ in range(teachers))
+    ]
+    users += [
+        User(username=f'{prefix}-s{i}', first_name=first, last_name=last, password=password_hash)
+        for i, (first, last) in enumerate(_name(rng) for _ in range(students))
+    ]
+    users.append(User(username=f'{prefix}-admin', first_name='系統', last_name='管理員',
+                      password=password_hash, is_staff=True))
+    users = _create(User, users, batch_size)
+    teacher_users, student_users, admin = users[:teachers], users[teachers:-1], users[-1]
+    phase('使用者', len(users))
+
+    profiles = [
+        UserProfile(user=u, role='teacher', teacher_id=f'{prefix}-T{i}') for i, u in enumerate(teacher_users)
+    ]
+    profiles += [
+        UserProfile(user=u, role='student', student_id=f'{prefix}-S{i}') for i, u in enumerate(student_users)
+    ]
+    profiles.append(UserProfile(user=admin, role='admin'))
+    _create(UserProfile, profiles, batch_size)
+    teacher_objs = _create(Teacher, [
+        Teacher(user=u, teacher_id=f'{prefix}-T{i}', department=rng.choice(DEPARTMENTS))
+        for i, u in enumerate(teacher_users)
+    ], batch_size)
+    phase('個人資料與教師', len(profiles) + len(teacher_objs))
+
+    # 先規劃選課，依每門課的人數決定名額，約一成的課程剛好額滿
+    pairs = plan_enrollments(rng, students, courses, per_student)
+    demand = [0] * courses
+    for _, course in pairs:
+        demand[course] += 1
+    course_objs = _create(Course, [
+        Course(
+            course_code=f'{prefix}-C{i:05d}',
+            course_name=f'{rng.choice(SUBJECTS)}{rng.choice(LEVELS)}',
+            description=f'{rng.choice(DEPARTMENTS)}開設的課程',
+            teacher=teacher_objs[i % teachers] if teachers else None,
+            credits=rng.choice([2, 3, 3, 3, 4]),
+            max_students=demand[i] if demand[i] and rng.random() < 0.1 else demand[i] + rng.randint(5, 30),
+        )
+        for i in range(courses)
+    ], batch_size)
+    phase('課程', len(course_objs))
+
+    # 選課記錄：各課程的難度不同，約兩成的課程尚未登錄期末分數，3% 已退選
+    connection = connections[router.db_for_write(Enrollment)]
+    ops = connection.ops
+    now = timezone.now()
+    db_now = ops.adapt_datetimefield_value(now)
+    difficulty = [rng.gauss(72, 6) for _ in range(courses)]
+    graded = [rng.random() < 0.8 for _ in range(courses)]
+    student_ids = [u.pk for u in student_users]
+    course_ids = [c.pk for c in course_objs]
+    enrollments, comments = [], []
+    for student, course in pairs:
+        midterm = _score(rng, difficulty[course], 12)
+        final = _score(rng, midterm + 3, 8) if graded[course] else None
+        enrollments.append((
+            student_ids[student], course_ids[course],
+            ops.adapt_decimalfield_value(Decimal(f'{midterm:.2f}'), 5, 2),
+            None if final is None else ops.adapt_decimalfield_value(Decimal(f'{final:.2f}'), 5, 2),
+            rng.random() >= 0.03, db_now, db_now,
+        ))
+        if rng.random() < comment_rate:
+            # 留言時間分散在最近 90 天內
+            created = ops.adapt_datetimefield_value(now - timedelta(seconds=rng.randrange(90 * 86400)))
+            comments.append((student_ids[student], course_ids[course], rng.choice(COMMENTS), created, created))
+    _insert(Enrollment, ['user', 'course', 'midterm_score', 'final_score', 'is_active', 'enrolled_at', 'updated_at'],
+            enrollments, batch_size)
+    phase('選課記錄', len(enrollments))
+
+    _insert(CourseComment, ['user', 'course', 'content', 'created_at', 'updated_at'], comments, batch_size)
+    phase('留言', len(comments))
+
+    seeded = Course.objects.filter(course_code__startswith=f'{prefix}-')
+    seeded.recount_active_enrollments()
+    search.index_courses(seeded)
+    phase('選修人數與檢索索引', len(course_objs))
+
+    return {
+        'users': len(users),
+        'teachers': len(teacher_objs),
+        'students': len(student_users),
+        'courses': len(course_objs),
+        'enrollments': len(enrollments),
+        'comments': len(comments),
+    }
+
+
+def exists(prefix):
+    return User.objects.filter(username__startswith=f'{prefix}-').exists()
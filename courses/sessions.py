@@ -0,0 +1,95 @@
+"""
+延遲續期的 session 後端
+
+SESSION_SAVE_EVERY_REQUEST 讓每個請求都延長 session 期限，預設的資料庫後端因此每次
+都要 UPDATE django_session，所有請求都得排隊取得 SQLite 的寫入鎖。
+
+本後端（SESSION_ENGINE = 'courses.sessions'）：
+- 讀取先查快取，快取中同時記錄資料庫中的到期時間，命中時不查詢資料庫；
+- session 資料有變更時照常寫入資料庫與快取；
+- 只是續期時，資料庫中剩餘的期限仍不少於 session 應有的壽命（預設兩週）就不寫入。
+  寫入資料庫時多保留 SESSION_RENEW_INTERVAL 秒，因此每位活躍使用者每
+  SESSION_RENEW_INTERVAL 秒最多寫入一次。
+
+Cookie 仍在每個回應中以完整的壽命重新設定，伺服器端的期限只會比 cookie 長，
+「最後一次活動後兩週到期」的行為不變。
+"""
+
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.sessions.backends import cached_db
+from django.utils import timezone
+
+KEY_PREFIX = 'courses.sessions'
+
+# 預設每小時最多續期寫入一次
+RENEW_INTERVAL = 60 * 60
+
+
+def renew_interval():
+    return getattr(settings, 'SESSION_RENEW_INTERVAL', RENEW_INTERVAL)
+
+
+class SessionStore(cached_db.SessionStore):
+    """快取中存放 (session 資料, 資料庫中的到期時間)"""
+
+    cache_key_prefix = KEY_PREFIX
+
+    def __init__(self, session_key=None):
+        self._db_expiry = None
+        super().__init__(session_key)
+
+    def _cache_set(self, data):
+        timeout = int((self._db_expiry - timezone.now()).total_seconds())
+        if timeout > 0:
+            self._cache.set(self.cache_key, (data, self._db_expiry), timeout)
+
+    def load(self):
+        try:
+            entry = self._cache.get(self.cache_key)
+        except Exception:
+            entry = None
+        if entry is not None:
+            data, self._db_expiry = entry
+            return data
+
+        s = self._get_session_from_db()
+        if s is None:
+            self._db_expiry = None
+            return {}
+        data = self.decode(s.session_data)
+        self._db_expiry = s.expire_date
+        self._cache_set(data)
+        return data
+
+    def needs_write(self):
+        """資料有變更，或資料庫中剩餘的期限已少於 session 應有的壽命"""
+        # 請求中沒有讀取過 session 時，先由快取載入資料庫中的到期時間
+        self._get_session()
+        if self.modified or self._db_expiry is None:
+            return True
+        return self._db_expiry - timezone.now() < timedelta(seconds=self.get_expiry_age())
+
+    def create_model_instance(self, data):
+        obj = super().create_model_instance(data)
+        obj.expire_date += timedelta(seconds=renew_interval())
+        self._db_expiry = obj.expire_date
+        return obj
+
+    def save(self, must_create=False):
+        if not must_create and self.session_key is not None and not self.needs_write():
+            return
+        # 略過 cached_db 的 save()，快取的內容格式不同
+        super(cached_db.SessionStore, self).save(must_create)
+        try:
+            self._cache_set(self._session)
+        except Exception:
+            cached_db.logger.exception('Error saving to cache (%s)', self._cache)
+
+    async def aload(self):
+        return await sync_to_async(self.load)()
+
+    async def asave(self, must_create=False):
+        await sync_to_async(self.save)(must_create)
@@ -0,0 +1,188 @@
+"""
+courses 應用的模型信號處理
+
+課程檢索索引：課程、教師或教師姓名異動時增量更新該課程的索引，並更新課程的
+updated_at，課程目錄的條件式請求（conditional.py）隨之失效。
+
+成績統計：選課記錄寫入或課程（權重）異動時清除該課程的統計快取。
+
+使用者快取：User、UserProfile、Teacher 異動時清除 roles 的使用者快取。
+
+片段快取：Course、Teacher、User 儲存或刪除時遞增 caching 的版本號，相關的模板
+片段隨之失效。
+
+留言異動時間：CourseComment 儲存或刪除時更新該課程留言的異動時間，留言 API 的
+ETag/Last-Modified 隨之改變（見 comments.py）。
+
+資料庫連線：SQLite 連線建立時套用 settings.SQLITE_PRAGMAS（見 database.py），並掛上
+profiling 的查詢記錄。
+
+候補遞補：課程儲存（管理後台調高名額等）後由候補名單依序遞補空出的名額
+（見 waitlist.py）；以 QuerySet.update() 調整名額的程式需自行呼叫 waitlist.promote()。
+
+選修人數：維護 Course.active_enrollment_count，透過 save()/delete() 改變選修狀態的操作
+（管理後台編輯、刪除、初始化腳本等）會在這裡同步計數器。
+QuerySet.update()/bulk_create() 不會觸發信號，批次操作後請呼叫
+Course.objects.filter(...).recount_active_enrollments()。
+"""
+
+from django.contrib.auth.models import User
+from django.db.backends.signals import connection_created
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import caching, comments, database, profiling, roles, search, waitlist
+from .stats import invalidate_course_stats
+from .models import Course, CourseComment, Enrollment, Teacher, UserProfile, UNKNOWN_COUNTED_COURSE
+
+
+@receiver(post_save, sender=Course)
+def index_course_on_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_courses(Course.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Course)
+def invalidate_stats_on_course_save(sender, instance, **kwargs):
+    invalidate_course_stats(instance.pk)
+
+
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+def invalidate_stats_on_enrollment_write(sender, instance, **kwargs):
+    invalidate_course_stats(instance.course_id)
+    counted = instance._counted_course_id
+    if counted not in (None, UNKNOWN_COUNTED_COURSE, instance.course_id):
+        invalidate_course_stats(counted)
+
+
+@receiver(post_save, sender=Course)
+def promote_waitlist_on_course_save(sender, instance, raw=False, created=False, update_fields=None, **kwargs):
+    if raw or created:
+        return
+    if update_fields is not None and 'max_students' not in update_fields:
+        return
+    # 名額不足時 promote() 在第一次佔用名額失敗就停止
+    with transaction.atomic():
+        waitlist.promote(instance.pk)
+
+
+@receiver(post_delete, sender=Course)
+def unindex_course_on_delete(sender, instance, using, **kwargs):
+    search.remove_course(instance.pk, using=using)
+
+
+def _refresh_courses(courses):
+    """授課教師異動：重建檢索索引並更新 updated_at"""
+    search.index_courses(courses)
+    courses.update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Teacher)
+def index_courses_on_teacher_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _refresh_courses(Course.objects.filter(teacher=instance))
+
+
+@receiver(pre_delete, sender=Teacher)
+def remember_courses_on_teacher_delete(sender, instance, **kwargs):
+    # 刪除後課程的 teacher 會被設為 NULL，先記下要重新索引的課程
+    instance._indexed_course_ids = list(instance.course_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Teacher)
+def index_courses_on_teacher_delete(sender, instance, **kwargs):
+    course_ids = getattr(instance, '_indexed_course_ids', [])
+    if course_ids:
+        _refresh_courses(Course.objects.filter(pk__in=course_ids))
+
+
+@receiver(post_save, sender=User)
+def index_courses_on_teacher_rename(sender, instance, raw=False, created=False, update_fields=None, **kwargs):
+    if raw or created:
+        return
+    if update_fields is not None and not {'first_name', 'last_name'} & set(update_fields):
+        return
+    _refresh_courses(Course.objects.filter(teacher__user=instance))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_cache(sender, instance, **kwargs):
+    roles.invalidate_user(instance.pk)
+    caching.bump('user', instance.pk)
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+@receiver(post_save, sender=Teacher)
+@receiver(post_delete, sender=Teacher)
+def invalidate_user_cache_on_related_write(sender, instance, **kwargs):
+    roles.invalidate_user(instance.user_id)
+    if sender is Teacher:
+        caching.bump('teacher', instance.pk)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_course_fragments(sender, instance, **kwargs):
+    caching.bump('course', instance.pk)
+
+
+@receiver(post_save, sender=CourseComment)
+@receiver(post_delete, sender=CourseComment)
+def touch_comment_feed(sender, instance, **kwargs):
+    comments.touch(instance.course_id)
+
+
+def _adjust_count(course_id, delta):
+    if course_id is None:
+        return
+    if delta > 0:
+        Course.objects.filter(pk=course_id).update(
+            active_enrollment_count=F('active_enrollment_count') + delta,
+            updated_at=timezone.now(),
+        )
+    else:
+        Course.objects.filter(pk=course_id, active_enrollment_count__gt=0).update(
+            active_enrollment_count=F('active_enrollment_count') + delta,
+            updated_at=timezone.now(),
+        )
+
+
+@receiver(post_save, sender=Enrollment)
+def sync_count_on_enrollment_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+
+    counted = instance._counted_course_id
+    current = instance.course_id if instance.is_active else None
+
+    if counted is UNKNOWN_COUNTED_COURSE:
+        Course.objects.filter(pk=instance.course_id).recount_active_enrollments()
+    elif counted != current:
+        _adjust_count(counted, -1)
+        _adjust_count(current, 1)
+
+    instance._counted_course_id = current
+
+
+@receiver(post_delete, sender=Enrollment)
+def sync_count_on_enrollment_delete(sender, instance, **kwargs):
+    counted = instance._counted_course_id
+
+    if counted is UNKNOWN_COUNTED_COURSE:
+        Course.objects.filter(pk=instance.course_id).recount_active_enrollments()
+    else:
+        _adjust_count(counted, -1)
+
+    instance._counted_course_id = None
+
+
+@receiver(connection_created)
+def configure_database_connection(sender, connection, **kwargs):
+    database.configure_connection(connection)
+    profiling.install(connection)
@@ -0,0 +1,121 @@
+"""
+課程成績統計
+
+以一次查詢取出課程所有選修中記錄的期中、期末與科目分數（科目分數由
+grading.annotate_totals() 在資料庫端計算），在 Python 中一次算出平均、中位數、
+標準差、百分位數、及格率與 10 區間直方圖。
+
+結果存入快取，直到該課程下一次有成績寫入：Enrollment 的 save()/delete()
+由 signals 清除快取，以 QuerySet.update()/bulk_update() 批次寫入成績的程式
+需自行呼叫 invalidate_course_stats()。
+"""
+
+import math
+
+from django.core.cache import cache
+
+from . import grading
+from .models import Enrollment
+
+CACHE_TIMEOUT = 60 * 60
+PERCENTILES = (10, 25, 50, 75, 90)
+BUCKETS = 10
+
+
+def _cache_key(course_id):
+    return f'courses:stats:{course_id}'
+
+
+def invalidate_course_stats(course_id):
+    """清除課程統計快取"""
+    cache.delete(_cache_key(course_id))
+
+
+def _percentile(ordered, p):
+    """線性內插百分位數（與 numpy.percentile 預設方法相同）"""
+    if len(ordered) == 1:
+        return ordered[0]
+    rank = (len(ordered) - 1) * p / 100
+    low = math.floor(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def _histogram(values):
+    counts = [0] * BUCKETS
+    for value in values:
+        counts[min(int(value // 10), BUCKETS - 1)] += 1
+    total = len(values) or 1
+    return [
+        {
+            'range': f'{i * 10}-{i * 10 + 9 if i < BUCKETS - 1 else 100}',
+            'count': count,
+            'percent': round(count / total * 100, 1),
+        }
+        for i, count in enumerate(counts)
+    ]
+
+
+def describe(values):
+    """計算一組分數的敘述統計；沒有分數時各項為 None"""
+    ordered = sorted(values)
+    count = len(ordered)
+    if not count:
+        return {
+            'count': 0, 'mean': None, 'median': None, 'stddev': None, 'min': None, 'max': None,
+            'pass_rate': None, 'percentiles': {}, 'histogram': _histogram([]),
+        }
+
+    mean = math.fsum(ordered) / count
+    variance = math.fsum((value - mean) ** 2 for value in ordered) / count
+    passing = float(grading.PASSING_SCORE)
+    passed = count - next((i for i, value in enumerate(ordered) if value >= passing), count)
+    return {
+        'count': count,
+        'mean': round(mean, 2),
+        'median': round(_percentile(ordered, 50), 2),
+        'stddev': round(math.sqrt(variance), 2),
+        'min': round(ordered[0], 2),
+        'max': round(ordered[-1], 2),
+        'pass_rate': round(passed / count * 100, 2),
+        'percentiles': {str(p): round(_percentile(ordered, p), 2) for p in PERCENTILES},
+        'histogram': _histogram(ordered),
+    }
+
+
+def compute_course_stats(course):
+    """不經快取直接計算課程統計"""
+    # 分數以整數（0.01 / 0.0001 為單位）取出；科目分數以 grading.from_e4() 四捨五入，
+    # 與成績單顯示的分數一致（float 的 round() 是銀行家捨入，及格邊緣會不同）
+    rows = (
+        grading.annotate_totals(Enrollment.objects.filter(course=course, is_active=True))
+        .annotate(midterm_e2=grading.hundredths('midterm_score'), final_e2=grading.hundredths('final_score'))
+        .order_by()
+        .values_list('midterm_e2', 'final_e2', 'total_score_e4')
+    )
+    midterm, final, total = [], [], []
+    for midterm_e2, final_e2, total_e4 in rows:
+        if midterm_e2 is not None:
+            midterm.append(midterm_e2 / 100)
+        if final_e2 is not None:
+            final.append(final_e2 / 100)
+        if total_e4 is not None:
+            total.append(float(grading.from_e4(total_e4)))
+
+    return {
+        'course_id': course.pk,
+        'enrolled': len(rows),
+        'midterm': describe(midterm),
+        'final': describe(final),
+        'total': describe(total),
+    }
+
+
+def get_course_stats(course):
+    """取得課程統計（有快取時直接回傳）"""
+    key = _cache_key(course.pk)
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_course_stats(course)
+        cache.set(key, stats, CACHE_TIMEOUT)
+    return stats
@@ -0,0 +1,26 @@
+from django import template
+from django.utils.html import format_html
+
+register = template.Library()
+
+
+def _srcset(profile, size, webp):
+    """size 與兩倍大小（高解析度螢幕）的縮圖，沒有對應縮圖時略過"""
+    candidates = [(profile.avatar_url(size, webp), '1x')]
+    if str(size * 2) in profile.avatar_renditions:
+        candidates.append((profile.avatar_url(size * 2, webp), '2x'))
+    return ', '.join(f'{url} {density}' for url, density in candidates if url)
+
+
+@register.simple_tag
+def avatar_picture(profile, size, css_class='', alt=''):
+    """
+    以 <picture> 輸出 size px 的頭像縮圖，支援 WebP 的瀏覽器優先使用 WebP：
+    {% avatar_picture user.profile 32 "user-avatar me-2" "User" %}
+    """
+    webp = _srcset(profile, size, webp=True)
+    source = format_html('<source type="image/webp" srcset="{}">', webp) if webp else ''
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" alt="{}" class="{}" width="{}" height="{}"></picture>',
+        source, profile.avatar_url(size), _srcset(profile, size, webp=False), alt, css_class, size, size,
+    )
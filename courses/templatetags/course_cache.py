@@ -0,0 +1,50 @@
+from django import template
+from django.template.base import token_kwargs
+
+from courses import caching
+
+register = template.Library()
+
+
+class CacheFragmentNode(template.Node):
+    def __init__(self, nodelist, name, kwargs):
+        self.nodelist = nodelist
+        self.name = name
+        self.kwargs = kwargs
+
+    def render(self, context):
+        name = self.name.resolve(context)
+        if name not in caching.FRAGMENTS:
+            raise template.TemplateSyntaxError(f'未定義的快取片段：{name}')
+
+        deps, vary = [], None
+        for kind, expression in self.kwargs.items():
+            value = expression.resolve(context)
+            if kind == 'vary':
+                vary = value
+            elif value not in (None, ''):
+                deps.append((kind, value))
+        return caching.get_fragment(name, deps, lambda: self.nodelist.render(context), vary)
+
+
+@register.tag
+def cachefragment(parser, token):
+    """
+    快取模板片段，相依物件的版本號變更時自動失效：
+
+        {% cachefragment "catalog_card" course=course.pk user=course.teacher.user_id vary=course.active_enrollment_count %}
+            ...
+        {% endcachefragment %}
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError("'cachefragment' 需要片段名稱")
+    name = parser.compile_filter(bits[1])
+    remaining = bits[2:]
+    kwargs = token_kwargs(remaining, parser)
+    if remaining:
+        raise template.TemplateSyntaxError("'cachefragment' 的相依物件須寫成 kind=pk")
+
+    nodelist = parser.parse(('endcachefragment',))
+    parser.delete_first_token()
+    return CacheFragmentNode(nodelist, name, kwargs)
@@ -1,3 +1,1726 @@
-from django.test import TestCase
+import json
+import os
+import sqlite3
+import tempfile
+from contextlib import closing
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import skipUnless
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.handlers.asgi import ASGIHandler
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, resolve, reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import async_views, avatars, benchmarks, caching, comments, database, grade_import, grading, loadtest, profiling, roles, routers, search, seats, seeding, stats, urls, views, waitlist
+from .forms import TeacherCourseForm
+from .middleware import ReplicaPinMiddleware
+from .models import Course, CourseComment, Enrollment, Teacher, UserProfile, WaitlistEntry
+
+
+def make_student(username):
+    user = User.objects.create_user(username=username, first_name=username)
+    UserProfile.objects.create(user=user, role='student')
+    return user
+
+
+def make_teacher(username, teacher_id):
+    user = User.objects.create_user(username=username, first_name=username)
+    UserProfile.objects.create(user=user, role='teacher')
+    return Teacher.objects.create(user=user, teacher_id=teacher_id, department='資訊工程系')
+
+
+class SeatAllocationTests(TestCase):
+    def setUp(self):
+        self.teacher = make_teacher('teacher', 'T001')
+        self.course = Course.objects.create(
+            course_code='CS101', course_name='Python程式設計', teacher=self.teacher, max_students=2
+        )
+        self.students = [make_student(f'student{i}') for i in range(3)]
+
+    def seats_taken(self):
+        self.course.refresh_from_db()
+        return self.course.active_enrollment_count
+
+    def test_allocate_until_full(self):
+        self.assertEqual(seats.allocate_seat(self.students[0], self.course)[0], seats.ENROLLED)
+        self.assertEqual(seats.allocate_seat(self.students[1], self.course)[0], seats.ENROLLED)
+        result, enrollment = seats.allocate_seat(self.students[2], self.course)
+        self.assertEqual(result, seats.FULL)
+        self.assertIsNone(enrollment)
+        self.assertEqual(self.seats_taken(), 2)
+        self.assertEqual(Enrollment.objects.filter(course=self.course).count(), 2)
+
+    def test_already_enrolled_does_not_take_seat(self):
+        seats.allocate_seat(self.students[0], self.course)
+        result, _ = seats.allocate_seat(self.students[0], self.course)
+        self.assertEqual(result, seats.ALREADY_ENROLLED)
+        self.assertEqual(self.seats_taken(), 1)
+
+    def test_already_enrolled_reported_when_full(self):
+        seats.allocate_seat(self.students[0], self.course)
+        seats.allocate_seat(self.students[1], self.course)
+        result, _ = seats.allocate_seat(self.students[0], self.course)
+        self.assertEqual(result, seats.ALREADY_ENROLLED)
+
+    def test_drop_and_reactivate(self):
+        _, enrollment = seats.allocate_seat(self.students[0], self.course)
+        self.assertEqual(seats.release_seat(enrollment), seats.DROPPED)
+        self.assertEqual(seats.release_seat(enrollment), seats.NOT_ACTIVE)
+        self.assertEqual(self.seats_taken(), 0)
+
+        result, reactivated = seats.allocate_seat(self.students[0], self.course)
+        self.assertEqual(result, seats.REACTIVATED)
+        self.assertEqual(reactivated.pk, enrollment.pk)
+        self.assertEqual(self.seats_taken(), 1)
+
+    def test_reactivation_respects_capacity(self):
+        _, enrollment = seats.allocate_seat(self.students[0], self.course)
+        seats.release_seat(enrollment)
+        seats.allocate_seat(self.students[1], self.course)
+        seats.allocate_seat(self.students[2], self.course)
+        result, _ = seats.allocate_seat(self.students[0], self.course)
+        self.assertEqual(result, seats.FULL)
+        self.assertFalse(Enrollment.objects.get(pk=enrollment.pk).is_active)
+
+    def test_enroll_view(self):
+        self.client.force_login(self.students[0])
+        response = self.client.get(reverse('courses:add_enrollment', args=[self.course.pk]))
+        self.assertRedirects(response, reverse('courses:student_dashboard'))
+        self.assertEqual(self.seats_taken(), 1)
+
+
+class EnrollmentCounterTests(TestCase):
+    def setUp(self):
+        teacher = make_teacher('teacher', 'T001')
+        self.course = Course.objects.create(course_code='CS101', course_name='Python程式設計', teacher=teacher)
+        self.other = Course.objects.create(course_code='CS201', course_name='資料結構', teacher=teacher)
+        self.student = make_student('student')
+
+    def counts(self):
+        return list(Course.objects.order_by('course_code').values_list('active_enrollment_count', flat=True))
+
+    def test_save_and_delete_keep_counter(self):
+        enrollment = Enrollment.objects.create(user=self.student, course=self.course)
+        self.assertEqual(self.counts(), [1, 0])
+
+        enrollment = Enrollment.objects.get(pk=enrollment.pk)
+        enrollment.is_active = False
+        enrollment.save()
+        self.assertEqual(self.counts(), [0, 0])
+
+        enrollment.is_active = True
+        enrollment.course = self.other
+        enrollment.save()
+        self.assertEqual(self.counts(), [0, 1])
+
+        Enrollment.objects.get(pk=enrollment.pk).delete()
+        self.assertEqual(self.counts(), [0, 0])
+
+    def test_stale_course_save_keeps_counter(self):
+        self.course.max_students = 1
+        self.course.save()
+        stale = Course.objects.get(pk=self.course.pk)
+        self.assertEqual(seats.allocate_seat(self.student, self.course)[0], seats.ENROLLED)
+
+        # 載入時人數為 0，儲存其他欄位不應把人數寫回 0
+        stale.course_name = 'Python程式設計（一）'
+        stale.save()
+        self.assertEqual(self.counts(), [1, 0])
+        self.assertEqual(seats.allocate_seat(make_student('other'), self.course)[0], seats.FULL)
+        self.assertEqual(Course.objects.get(pk=self.course.pk).course_name, 'Python程式設計（一）')
+
+    def test_deferred_fields_fall_back_to_recount(self):
+        enrollment = Enrollment.objects.create(user=self.student, course=self.course)
+        deferred = Enrollment.objects.only('pk').get(pk=enrollment.pk)
+        deferred.save()
+        self.assertEqual(self.counts(), [1, 0])
+
+    def test_recount_after_bulk_update(self):
+        Enrollment.objects.create(user=self.student, course=self.course)
+        Enrollment.objects.update(is_active=False)
+        self.assertEqual(self.counts(), [1, 0])
+        Course.objects.recount_active_enrollments()
+        self.assertEqual(self.counts(), [0, 0])
+
+    def test_rebuild_command(self):
+        Enrollment.objects.create(user=self.student, course=self.course)
+        Course.objects.update(active_enrollment_count=5)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_enrollment_counts', '--check', stdout=StringIO())
+        call_command('rebuild_enrollment_counts', stdout=StringIO())
+        self.assertEqual(self.counts(), [1, 0])
+        call_command('rebuild_enrollment_counts', '--check', stdout=StringIO())
+
+
+def seed_catalog(prefix, teachers=10, courses=100, students=100, per_student=10):
+    """以 bulk_create 建立一批教師、課程、學生與選課記錄（每位學生選 per_student 門課）"""
+    teacher_users = User.objects.bulk_create(
+        User(username=f'{prefix}t{i}', first_name=f'{prefix}教師{i}') for i in range(teachers)
+    )
+    UserProfile.objects.bulk_create(UserProfile(user=u, role='teacher') for u in teacher_users)
+    teacher_objs = Teacher.objects.bulk_create(
+        Teacher(user=u, teacher_id=f'{prefix}T{i}') for i, u in enumerate(teacher_users)
+    )
+    course_objs = Course.objects.bulk_create(
+        Course(course_code=f'{prefix}C{i:04d}', course_name=f'課程{i}', teacher=teacher_objs[i % teachers],
+               max_students=students)
+        for i in range(courses)
+    )
+    student_users = User.objects.bulk_create(
+        User(username=f'{prefix}s{i}', first_name=f'{prefix}學生{i}') for i in range(students)
+    )
+    UserProfile.objects.bulk_create(UserProfile(user=u, role='student') for u in student_users)
+    Enrollment.objects.bulk_create(
+        Enrollment(user=u, course=course_objs[(i + j) % courses], midterm_score=80, final_score=90)
+        for i, u in enumerate(student_users)
+        for j in range(per_student)
+    )
+    CourseComment.objects.bulk_create(
+        CourseComment(user=u, course=course_objs[i % courses], content='很實用的課程')
+        for i, u in enumerate(student_users)
+    )
+    Course.objects.recount_active_enrollments()
+    return teacher_objs, course_objs, student_users
+
+
+class QueryCountTests(TestCase):
+    """列表視圖的查詢數量不應隨資料筆數成長"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teachers, cls.courses, cls.students = seed_catalog('a', courses=100, students=120, per_student=10)
+        cls.admin = User.objects.create_user(username='admin', is_staff=True)
+        UserProfile.objects.create(user=cls.admin, role='admin')
+
+    def count_queries(self, user, url):
+        if user is None:
+            self.client.logout()
+        else:
+            self.client.force_login(user)
+        # 量測未命中快取時的查詢數
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def assertBoundedQueries(self, user, url, limit, grow):
+        """先在 1k+ 筆資料上量測，再加入更多資料後確認查詢數不變且不超過上限"""
+        before = self.count_queries(user, url)
+        self.assertLessEqual(before, limit)
+        grow()
+        after = self.count_queries(user, url)
+        self.assertEqual(before, after)
+
+    def more_catalog(self):
+        self.batch = getattr(self, 'batch', 0) + 1
+        seed_catalog(f'b{self.batch}', courses=50, students=60, per_student=5)
+
+    def test_course_list(self):
+        self.assertBoundedQueries(None, reverse('courses:course_list'), 3, self.more_catalog)
+        self.assertBoundedQueries(self.students[0], reverse('courses:course_list'), 6, self.more_catalog)
+
+    def test_course_detail(self):
+        course = self.courses[0]
+        url = reverse('courses:course_detail', args=[course.pk])
+
+        def grow():
+            users = User.objects.bulk_create(User(username=f'x{i}', first_name='x') for i in range(50))
+            Enrollment.objects.bulk_create(Enrollment(user=u, course=course) for u in users)
+            CourseComment.objects.bulk_create(CourseComment(user=u, course=course, content='讚') for u in users)
+
+        self.assertBoundedQueries(self.students[0], url, 7, grow)
+
+    def test_student_dashboard(self):
+        student = self.students[0]
+        extra = self.courses[50:80]
+
+        def grow():
+            Enrollment.objects.bulk_create(Enrollment(user=student, course=c) for c in extra)
+
+        self.assertBoundedQueries(student, reverse('courses:student_dashboard'), 6, grow)
+
+    def test_teacher_dashboard(self):
+        teacher = self.teachers[0]
+
+        def grow():
+            Course.objects.bulk_create(
+                Course(course_code=f'N{i:03d}', course_name='新課程', teacher=teacher) for i in range(30)
+            )
+
+        self.assertBoundedQueries(teacher.user, reverse('courses:teacher_dashboard'), 6, grow)
+
+    def test_teacher_course_students(self):
+        course = self.courses[0]
+        url = reverse('courses:teacher_course_students', args=[course.pk])
+
+        def grow():
+            users = User.objects.bulk_create(User(username=f'y{i}', first_name='y') for i in range(50))
+            Enrollment.objects.bulk_create(Enrollment(user=u, course=course) for u in users)
+
+        self.assertBoundedQueries(course.teacher.user, url, 7, grow)
+
+    def test_admin_lists(self):
+        # 專案的 admin/ 路由會先攔截 courses 的管理員網址，這裡直接呼叫視圖
+        for view in (views.admin_teacher_list, views.admin_course_list):
+            def count():
+                request = RequestFactory().get('/')
+                request.user = User.objects.get(pk=self.admin.pk)
+                with CaptureQueriesContext(connection) as ctx:
+                    response = view(request)
+                self.assertEqual(response.status_code, 200)
+                return len(ctx.captured_queries)
+
+            before = count()
+            self.assertLessEqual(before, 3)
+            self.more_catalog()
+            self.assertEqual(count(), before)
+
+
+class PaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_catalog('p', teachers=2, courses=45, students=1, per_student=1)
+
+    def test_course_list_pages(self):
+        response = self.client.get(reverse('courses:course_list'))
+        self.assertEqual(len(response.context['courses']), 20)
+        response = self.client.get(reverse('courses:course_list'), {'page': 3})
+        self.assertEqual([c.course_code for c in response.context['courses']], ['pC0040', 'pC0041', 'pC0042', 'pC0043', 'pC0044'])
+
+    def test_keyset_html_page(self):
+        response = self.client.get(reverse('courses:course_list'), {'after': 'pC0039'})
+        self.assertEqual(len(response.context['courses']), 5)
+        self.assertContains(response, '第一頁')
+        self.assertNotContains(response, 'after=')
+
+    def test_api_walks_catalog_with_cursor(self):
+        codes, after = [], None
+        while True:
+            params = {'per_page': 10}
+            if after:
+                params['after'] = after
+            data = self.client.get(reverse('courses:course_list_api'), params).json()
+            codes.extend(row['course_code'] for row in data['results'])
+            after = data['next_cursor']
+            if after is None:
+                break
+        self.assertEqual(codes, sorted(Course.objects.values_list('course_code', flat=True)))
+
+
+class CourseSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = make_teacher('teacher_wang', 'T001')
+        cls.teacher.user.first_name, cls.teacher.user.last_name = '王', '老師'
+        cls.teacher.user.save()
+        cls.python = Course.objects.create(
+            course_code='CS101', course_name='Python程式設計', teacher=cls.teacher,
+            description='學習Python基礎與應用',
+        )
+        cls.data = Course.objects.create(course_code='CS201', course_name='資料結構', description='程式設計進階')
+        cls.circuit = Course.objects.create(course_code='EE101', course_name='電路基礎')
+
+    def search(self, query):
+        return search.search_course_ids(query)
+
+    def test_tokenize_cjk_bigrams(self):
+        self.assertEqual(search.tokenize('Python程式設計'), ['python', '程式', '式設', '設計', '計'])
+
+    def test_cjk_and_ranking(self):
+        # 課名命中的權重高於描述命中
+        self.assertEqual(self.search('程式設計'), [self.python.pk, self.data.pk])
+        self.assertEqual(self.search('電路'), [self.circuit.pk])
+        self.assertEqual(self.search('電'), [self.circuit.pk])
+        self.assertEqual(self.search('路基礎電'), [])
+
+    def test_prefix_and_code(self):
+        self.assertEqual(self.search('cs1'), [self.python.pk])
+        self.assertEqual(sorted(self.search('CS')), sorted([self.python.pk, self.data.pk]))
+
+    def test_teacher_and_department(self):
+        self.assertEqual(self.search('王老師'), [self.python.pk])
+        self.assertEqual(self.search('資訊工程'), [self.python.pk])
+
+    def test_incremental_updates(self):
+        self.circuit.course_name = '訊號與系統'
+        self.circuit.save()
+        self.assertEqual(self.search('電路'), [])
+        self.assertEqual(self.search('訊號'), [self.circuit.pk])
+
+        self.teacher.department = '電機工程系'
+        self.teacher.save()
+        self.assertEqual(self.search('電機'), [self.python.pk])
+
+        user = self.teacher.user
+        user.first_name = '林'
+        user.save()
+        self.assertEqual(self.search('林老師'), [self.python.pk])
+
+        self.teacher.delete()
+        self.assertEqual(self.search('林老師'), [])
+
+        self.data.delete()
+        self.assertEqual(self.search('資料'), [])
+
+    def test_token_table_backend(self):
+        using = connection.alias
+        search.drop_fts_table(connection)
+        try:
+            self.assertFalse(search.fts_available(using))
+            search.rebuild_index()
+            self.assertEqual(self.search('程式設計'), [self.python.pk, self.data.pk])
+            self.assertEqual(self.search('cs1'), [self.python.pk])
+            self.assertEqual(self.search('王老師'), [self.python.pk])
+        finally:
+            search.create_fts_table(connection)
+            search.rebuild_index()
+
+    def test_course_list_search(self):
+        response = self.client.get(reverse('courses:course_list'), {'search': '程式'})
+        self.assertEqual(list(response.context['courses']), [self.python, self.data])
+        data = self.client.get(reverse('courses:course_list_api'), {'search': '電路'}).json()
+        self.assertEqual([row['course_code'] for row in data['results']], ['EE101'])
+
+    def test_search_pages_past_old_result_cap(self):
+        Course.objects.bulk_create(
+            Course(course_code=f'LAB{i:04d}', course_name=f'實驗{i}') for i in range(1005)
+        )
+        search.rebuild_index()
+        url = reverse('courses:course_list')
+        expected = list(Course.objects.filter(course_code__startswith='LAB').values_list('pk', flat=True))
+        for backend in ('fts', 'tokens'):
+            if backend == 'tokens':
+                search.drop_fts_table(connection)
+                self.addCleanup(search.rebuild_index)
+                self.addCleanup(search.create_fts_table, connection)
+                search.rebuild_index()
+            with self.subTest(backend=backend):
+                response = self.client.get(url, {'search': 'lab', 'per_page': 100, 'page': 11})
+                page_obj = response.context['page_obj']
+                self.assertEqual(page_obj.paginator.count, 1005)
+                self.assertEqual(page_obj.number, 11)
+                self.assertEqual(len(page_obj.object_list), 5)
+                self.assertEqual(sorted(search.search_course_ids('lab')), sorted(expected))
+                self.assertEqual(search.search_course_ids('lab', limit=5, offset=1000), [c.pk for c in page_obj])
+
+                data = self.client.get(reverse('courses:course_list_api'), {'search': 'lab', 'page': 51}).json()
+                self.assertEqual((data['count'], len(data['results']), data['next_page']), (1005, 5, None))
+
+
+class GradingTests(TestCase):
+    def setUp(self):
+        teacher = make_teacher('teacher', 'T001')
+        self.even = Course.objects.create(course_code='CS101', course_name='程式設計', teacher=teacher, credits=3)
+        self.weighted = Course.objects.create(
+            course_code='CS201', course_name='資料結構', teacher=teacher, credits=2,
+            midterm_weight=40, final_weight=60,
+        )
+        self.student = make_student('student')
+
+    def test_weighted_total_rounds_half_up(self):
+        self.assertEqual(grading.weighted_total(Decimal('80.01'), Decimal('80.00')), Decimal('80.01'))
+        self.assertEqual(grading.weighted_total(Decimal('88.25'), Decimal('88.00')), Decimal('88.13'))
+        self.assertIsNone(grading.weighted_total(None, Decimal('90')))
+
+    def test_grade_enrollments_matches_python(self):
+        Enrollment.objects.create(user=self.student, course=self.even, midterm_score=Decimal('88.25'), final_score=Decimal('88.00'))
+        Enrollment.objects.create(user=self.student, course=self.weighted, midterm_score=Decimal('70.05'), final_score=Decimal('90.10'))
+        queryset = Enrollment.objects.filter(user=self.student).select_related('course')
+        with self.assertNumQueries(1):
+            graded = grading.grade_enrollments(queryset)
+        totals = {e.course.course_code: e.total_score for e in graded}
+        self.assertEqual(totals, {'CS101': Decimal('88.13'), 'CS201': Decimal('82.08')})
+        for enrollment in Enrollment.objects.select_related('course'):
+            self.assertEqual(enrollment.get_total_score(), totals[enrollment.course.course_code])
+
+        summary = grading.summarize(graded)
+        self.assertEqual(summary['average_score'], Decimal('85.11'))
+        # A(4.0)×3 學分 + A-(3.7)×2 學分
+        self.assertEqual(summary['gpa'], Decimal('3.88'))
+
+    def test_letter_grades(self):
+        self.assertEqual(grading.letter_grade(Decimal('90.00')), 'A+')
+        self.assertEqual(grading.letter_grade(Decimal('59.99')), 'D')
+        self.assertEqual(grading.grade_point(Decimal('12')), Decimal('0.0'))
+
+    def test_weights_must_sum_to_100(self):
+        form = TeacherCourseForm(data={
+            'course_code': 'CS301', 'course_name': '作業系統', 'credits': 3, 'max_students': 50,
+            'semester': '2025-1', 'midterm_weight': 30, 'final_weight': 60,
+        })
+        self.assertFalse(form.is_valid())
+        self.assertIn('100%', str(form.non_field_errors()))
+
+
+class CourseStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = make_teacher('teacher', 'T001')
+        self.course = Course.objects.create(course_code='CS101', course_name='程式設計', teacher=self.teacher)
+        scores = [(40, 50), (60, 70), (80, 90), (100, 100), (None, 80)]
+        for i, (midterm, final) in enumerate(scores):
+            Enrollment.objects.create(
+                user=make_student(f'student{i}'), course=self.course, midterm_score=midterm, final_score=final
+            )
+
+    def test_describe(self):
+        result = stats.compute_course_stats(self.course)
+        total = result['total']
+        self.assertEqual(result['enrolled'], 5)
+        self.assertEqual(total['count'], 4)
+        self.assertEqual(total['mean'], 73.75)
+        self.assertEqual(total['median'], 75.0)
+        self.assertEqual(total['pass_rate'], 75.0)
+        self.assertEqual(total['percentiles']['25'], 60.0)
+        self.assertEqual([b['count'] for b in total['histogram']], [0, 0, 0, 0, 1, 0, 1, 0, 1, 1])
+        self.assertEqual(result['final']['count'], 5)
+
+    def test_total_rounds_like_transcript(self):
+        # 59.99 與 60.00 各半：科目分數 59.995 四捨五入為 60.00，應計為及格
+        enrollment = Enrollment.objects.get(midterm_score=40)
+        Enrollment.objects.filter(pk=enrollment.pk).update(midterm_score=Decimal('59.99'), final_score=60)
+        self.assertEqual(Enrollment.objects.get(pk=enrollment.pk).get_total_score(), Decimal('60.00'))
+        total = stats.compute_course_stats(self.course)['total']
+        self.assertEqual(total['min'], 60.0)
+        self.assertEqual(total['pass_rate'], 100.0)
+        self.assertEqual(total['histogram'][6]['count'], 2)
+
+    def test_cached_until_score_write(self):
+        stats.get_course_stats(self.course)
+        with self.assertNumQueries(0):
+            stats.get_course_stats(self.course)
+
+        enrollment = Enrollment.objects.get(midterm_score=None)
+        enrollment.midterm_score = 60
+        enrollment.save()
+        self.assertEqual(stats.get_course_stats(self.course)['total']['count'], 5)
+
+    def test_drop_and_reenroll_refresh_cache(self):
+        self.assertEqual(stats.get_course_stats(self.course)['enrolled'], 5)
+        enrollment = Enrollment.objects.get(midterm_score=40)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(seats.release_seat(enrollment), seats.DROPPED)
+        result = stats.get_course_stats(self.course)
+        self.assertEqual((result['enrolled'], result['total']['count'], result['total']['pass_rate']), (4, 3, 100.0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(seats.allocate_seat(enrollment.user, self.course)[0], seats.REACTIVATED)
+        self.assertEqual(stats.get_course_stats(self.course)['total']['pass_rate'], 75.0)
+
+    def test_stats_view_permissions(self):
+        url = reverse('courses:teacher_course_stats', args=[self.course.pk])
+        self.client.force_login(self.teacher.user)
+        self.assertEqual(self.client.get(url).json()['total']['count'], 4)
+        self.client.force_login(User.objects.get(username='student0'))
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+class BulkGradeEntryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = make_teacher('teacher', 'T001')
+        self.course = Course.objects.create(course_code='CS101', course_name='程式設計', teacher=self.teacher)
+        self.enrollments = [
+            Enrollment.objects.create(user=make_student(f'student{i}'), course=self.course, midterm_score=70)
+            for i in range(5)
+        ]
+        self.url = reverse('courses:teacher_course_students', args=[self.course.pk])
+        self.api_url = reverse('courses:teacher_course_grades', args=[self.course.pk])
+        self.client.force_login(self.teacher.user)
+
+    def post_json(self, grades):
+        return self.client.post(self.api_url, {'grades': grades}, content_type='application/json')
+
+    def scores(self):
+        return list(
+            Enrollment.objects.filter(course=self.course).order_by('pk').values_list('midterm_score', 'final_score')
+        )
+
+    def test_form_updates_all_rows(self):
+        data = {}
+        for i, enrollment in enumerate(self.enrollments):
+            data[f'midterm_score_{enrollment.pk}'] = '70' if i < 2 else '80.5'
+            data[f'final_score_{enrollment.pk}'] = '' if i < 2 else '90'
+        response = self.client.post(self.url, data)
+        self.assertRedirects(response, self.url)
+        self.assertEqual(self.scores(), [(Decimal('70'), None)] * 2 + [(Decimal('80.5'), Decimal('90'))] * 3)
+
+    def test_single_bulk_update_and_unchanged_rows_skipped(self):
+        grades = [{'enrollment_id': e.pk, 'midterm_score': 70, 'final_score': 88} for e in self.enrollments[:3]]
+        grades += [{'enrollment_id': e.pk, 'midterm_score': '70.00'} for e in self.enrollments[3:]]
+        before = Enrollment.objects.get(pk=self.enrollments[4].pk).updated_at
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.post_json(grades)
+        self.assertEqual(response.json(), {'updated': 3, 'unchanged': 2, 'errors': []})
+        self.assertEqual(len([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "courses_enrollment"')]), 1)
+        self.assertEqual(Enrollment.objects.get(pk=self.enrollments[4].pk).updated_at, before)
+
+    def test_errors_reject_whole_batch(self):
+        other = Course.objects.create(course_code='CS102', course_name='資料結構')
+        foreign = Enrollment.objects.create(user=make_student('outsider'), course=other)
+        response = self.post_json([
+            {'enrollment_id': self.enrollments[0].pk, 'final_score': 95},
+            {'enrollment_id': self.enrollments[1].pk, 'final_score': 101},
+            {'enrollment_id': self.enrollments[2].pk, 'midterm_score': 'abc'},
+            {'enrollment_id': foreign.pk, 'final_score': 50},
+        ])
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['errors']
+        self.assertEqual([e['row'] for e in errors], [2, 3, 4])
+        self.assertEqual(list(errors[0]['errors']), ['final_score'])
+        self.assertEqual(list(errors[2]['errors']), ['enrollment_id'])
+        self.assertTrue(all(final is None for _, final in self.scores()))
+
+    def test_form_skips_students_dropped_after_load(self):
+        self.client.get(self.url)
+        dropped = self.enrollments[1]
+        seats.release_seat(dropped)
+        data = {f'final_score_{e.pk}': '88' for e in self.enrollments}
+        response = self.client.post(self.url, data, follow=True)
+        self.assertRedirects(response, self.url)
+        self.assertContains(response, f'{dropped.user.get_full_name()} 已退選，其成績未更新')
+        self.assertContains(response, '已更新 4 位學生的成績')
+        self.assertEqual([final for _, final in self.scores()], [Decimal('88')] + [None] + [Decimal('88')] * 3)
+
+    def test_form_errors_keep_input(self):
+        enrollment = self.enrollments[0]
+        response = self.client.post(self.url, {f'final_score_{enrollment.pk}': '-1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'is-invalid')
+        self.assertContains(response, 'value="-1"')
+
+    def write_before_transaction(self, **changes):
+        """在 apply_grades() 的交易開始前，模擬另一個請求提交對第一筆記錄的寫入"""
+        pending = [changes]
+
+        def wrapper(execute, sql, params, many, context):
+            if pending and sql.startswith('SAVEPOINT'):
+                Enrollment.objects.filter(pk=self.enrollments[0].pk).update(**pending.pop())
+            return execute(sql, params, many, context)
+        return connection.execute_wrapper(wrapper)
+
+    def test_concurrent_import_is_not_overwritten(self):
+        with self.write_before_transaction(final_score=77):
+            response = self.post_json([{'enrollment_id': self.enrollments[0].pk, 'midterm_score': 85}])
+        self.assertEqual(response.json()['updated'], 1)
+        self.assertEqual(self.scores()[0], (Decimal('85'), Decimal('77')))
+
+    def test_row_dropped_before_write_is_not_updated(self):
+        with self.write_before_transaction(is_active=False):
+            response = self.post_json([{'enrollment_id': self.enrollments[0].pk, 'midterm_score': 85}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.scores()[0], (Decimal('70'), None))
+
+    def test_invalidates_stats(self):
+        self.assertEqual(stats.get_course_stats(self.course)['total']['count'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post_json([{'enrollment_id': self.enrollments[0].pk, 'final_score': 60}])
+        self.assertEqual(stats.get_course_stats(self.course)['total']['count'], 1)
+
+    def test_other_teacher_forbidden(self):
+        self.client.force_login(make_teacher('other', 'T002').user)
+        self.assertEqual(self.post_json([]).status_code, 403)
+
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+
+class GradeImportTests(TestCase):
+    def setUp(self):
+        self.teacher = make_teacher('teacher', 'T001')
+        self.course = Course.objects.create(course_code='CS101', course_name='程式設計', teacher=self.teacher)
+        self.students = [make_student(f'student{i}') for i in range(5)]
+        for i, student in enumerate(self.students):
+            student.profile.student_id = f'S{i:03d}'
+            student.profile.save()
+            Enrollment.objects.create(user=student, course=self.course, midterm_score=50)
+
+    def csv(self, *lines):
+        return BytesIO('\n'.join(lines).encode('utf-8-sig'))
+
+    def scores(self):
+        return dict(
+            Enrollment.objects.filter(course=self.course).values_list('user__username', 'final_score')
+        )
+
+    def test_import_by_username_and_student_id(self):
+        file = self.csv('學號,username,姓名,期末分數', 'S000,,甲,80', ',student1,乙,90.5', 'S002,,丙,', '', ',student3,丁,')
+        result = grade_import.import_grades(self.course, file, 'csv')
+        self.assertTrue(result.applied)
+        self.assertEqual((result.rows, result.changed, result.unchanged), (4, 2, 2))
+        self.assertEqual(self.scores()['student0'], Decimal('80'))
+        self.assertEqual(self.scores()['student1'], Decimal('90.5'))
+        self.assertEqual(Enrollment.objects.get(user=self.students[0]).midterm_score, Decimal('50'))
+
+    def test_batches(self):
+        lines = ['username,final_score'] + [f'student{i},{70 + i}' for i in range(5)]
+        with CaptureQueriesContext(connection) as ctx:
+            result = grade_import.import_grades(self.course, self.csv(*lines), 'csv', batch_size=2)
+        self.assertEqual(result.changed, 5)
+        updates = [q for q in ctx.captured_queries if 'UPDATE "courses_enrollment"' in q['sql']]
+        self.assertEqual(len(updates), 3)
+
+    def test_dry_run_reports_diffs(self):
+        result = grade_import.import_grades(
+            self.course, self.csv('username,midterm_score', 'student0,61', 'student1,50'), 'csv', dry_run=True
+        )
+        self.assertFalse(result.applied)
+        self.assertEqual(result.diffs, [
+            {'line': 2, 'student': 'student0', 'changes': {'midterm_score': [Decimal('50.00'), Decimal('61')]}},
+        ])
+        self.assertEqual(Enrollment.objects.get(user=self.students[0]).midterm_score, Decimal('50'))
+
+    def test_errors_roll_back_everything(self):
+        outsider = make_student('outsider')
+        file = self.csv('username,final_score', 'student0,80', 'student1,101', 'outsider,70', 'student0,60', 'student2,8.123')
+        result = grade_import.import_grades(self.course, file, 'csv', batch_size=2)
+        self.assertFalse(result.applied)
+        self.assertEqual([e['line'] for e in result.errors], [3, 4, 5, 6])
+        self.assertTrue(all(score is None for score in self.scores().values()))
+        self.assertIsNotNone(outsider)
+
+    def test_missing_columns(self):
+        with self.assertRaises(ValidationError):
+            grade_import.import_grades(self.course, self.csv('name,final_score', 'x,1'), 'csv')
+
+    @skipUnless(openpyxl, 'openpyxl 未安裝')
+    def test_xlsx(self):
+        workbook = openpyxl.Workbook()
+        workbook.active.append(['student_id', 'midterm_score', 'final_score'])
+        workbook.active.append(['S004', 77.5, 88])
+        file = BytesIO()
+        workbook.save(file)
+        file.seek(0)
+        result = grade_import.import_grades(self.course, file, 'xlsx')
+        self.assertTrue(result.applied)
+        self.assertEqual(self.scores()['student4'], Decimal('88'))
+
+    def test_upload_view(self):
+        self.client.force_login(self.teacher.user)
+        url = reverse('courses:teacher_import_grades', args=[self.course.pk])
+        upload = SimpleUploadedFile('grades.csv', 'username,final_score\nstudent0,85\n'.encode())
+        response = self.client.post(url, {'file': upload, 'dry_run': 'on'})
+        self.assertContains(response, '— → 85')
+        self.assertIsNone(self.scores()['student0'])
+
+        upload = SimpleUploadedFile('grades.csv', 'username,final_score\nstudent0,85\n'.encode())
+        response = self.client.post(url, {'file': upload})
+        self.assertRedirects(response, reverse('courses:teacher_course_students', args=[self.course.pk]))
+        self.assertEqual(self.scores()['student0'], Decimal('85'))
+
+        response = self.client.post(url, {'file': SimpleUploadedFile('grades.txt', b'x')})
+        self.assertContains(response, '只支援 CSV 與 XLSX 檔案')
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.teacher = make_teacher('teacher', 'T001')
+        self.course = Course.objects.create(
+            course_code='CS101', course_name='程式設計', teacher=self.teacher, semester='2024-1', midterm_weight=40, final_weight=60
+        )
+        self.other = Course.objects.create(course_code='CS102', course_name='資料結構', semester='2024-2')
+        self.student = make_student('student')
+        Enrollment.objects.create(user=self.student, course=self.course, midterm_score=80, final_score=91)
+        Enrollment.objects.create(user=self.student, course=self.other, midterm_score=70)
+        Enrollment.objects.create(user=make_student('dropped'), course=self.course, is_active=False)
+
+    def download(self, user, url):
+        self.client.force_login(user)
+        response = self.client.get(url)
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertTrue(content.startswith('\ufeff'))
+        return content.lstrip('\ufeff').splitlines()
+
+    def test_course_gradebook(self):
+        lines = self.download(self.teacher.user, reverse('courses:export_course_gradebook', args=[self.course.pk]))
+        self.assertEqual(lines, ['帳號,學號,姓,名,期中分數,期末分數,科目分數,等第,績分', 'student,,,student,80.00,91.00,86.60,A,4.0'])
+
+    def test_transcript(self):
+        lines = self.download(self.student, reverse('courses:export_transcript'))
+        self.assertEqual(lines[1:], ['2024-1,CS101,程式設計,3,80.00,91.00,86.60,A,4.0', '2024-2,CS102,資料結構,3,70.00,,,,'])
+
+    def test_semester_dump(self):
+        admin = User.objects.create_user(username='admin', is_staff=True)
+        UserProfile.objects.create(user=admin, role='admin')
+        url = reverse('courses:export_semester')
+        self.assertEqual(len(self.download(admin, url)), 3)
+        self.assertEqual(len(self.download(admin, url + '?semester=2024-2')), 2)
+
+    def test_permissions(self):
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.get(reverse('courses:export_course_gradebook', args=[self.course.pk])).status_code, 403)
+        self.assertEqual(self.client.get(reverse('courses:export_semester')).status_code, 403)
+
+
+class RoleCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = make_teacher('teacher', 'T001')
+        self.client.force_login(self.teacher.user)
+        self.url = reverse('courses:teacher_dashboard')
+
+    def user_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        return [q['sql'] for q in ctx.captured_queries if 'FROM "auth_user"' in q['sql']]
+
+    def test_user_profile_and_teacher_loaded_once(self):
+        queries = self.user_queries()
+        self.assertEqual(len(queries), 1)
+        self.assertIn('"courses_userprofile"', queries[0])
+        self.assertIn('"courses_teacher"', queries[0])
+        self.assertEqual(self.user_queries(), [])
+
+    def test_invalidated_on_profile_save(self):
+        self.user_queries()
+        profile = self.teacher.user.profile
+        profile.role = 'student'
+        profile.save()
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_cached_user_is_a_copy(self):
+        first = roles.get_user(self.teacher.user.pk)
+        first.first_name = 'changed'
+        self.assertEqual(roles.get_user(self.teacher.user.pk).first_name, 'teacher')
+
+    def test_role_required(self):
+        self.client.force_login(User.objects.create_user(username='nobody'))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.client.logout()
+        self.assertRedirects(self.client.get(self.url), f"{reverse('courses:login')}?next={self.url}")
+
+    def test_admin_role_requires_staff(self):
+        user = User.objects.create_user(username='admin')
+        UserProfile.objects.create(user=user, role='admin')
+        self.assertFalse(roles.is_admin(user))
+        user.is_staff = True
+        self.assertTrue(roles.is_admin(user))
+
+
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = make_teacher('teacher', 'T001')
+        self.course = Course.objects.create(course_code='CS101', course_name='程式設計', teacher=self.teacher)
+        self.url = reverse('courses:course_list')
+
+    def test_catalog_served_from_cache(self):
+        for _ in range(50):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        counts = caching.fragment_stats()['catalog_card']
+        self.assertEqual(counts['misses'], 1)
+        self.assertGreater(counts['hit_rate'], 95)
+
+    def test_course_save_invalidates_card(self):
+        self.client.get(self.url)
+        self.course.course_name = '資料結構'
+        self.course.save()
+        self.assertContains(self.client.get(self.url), '資料結構')
+
+    def test_teacher_name_change_invalidates_card(self):
+        self.client.get(self.url)
+        user = self.teacher.user
+        user.first_name = '王老師'
+        user.save()
+        self.assertContains(self.client.get(self.url), '王老師')
+
+    def test_enrollment_count_varies_card(self):
+        self.client.get(self.url)
+        seats.allocate_seat(make_student('student'), self.course)
+        self.assertContains(self.client.get(self.url), '1/50')
+
+    def test_course_without_teacher(self):
+        Course.objects.create(course_code='CS102', course_name='離散數學')
+        self.assertContains(self.client.get(self.url), '離散數學')
+
+    def test_cache_stats_command(self):
+        self.client.get(self.url)
+        self.client.get(self.url)
+        out = StringIO()
+        call_command('cache_stats', '--reset', stdout=out)
+        self.assertIn('catalog_card: 命中 1，未命中 1，命中率 50.0%', out.getvalue())
+        self.assertIsNone(caching.fragment_stats()['catalog_card']['hit_rate'])
+
+
+class SessionRenewalTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = make_student('student')
+        self.client.force_login(self.student)
+        self.url = reverse('courses:student_dashboard')
+
+    def session_writes(self, requests=20):
+        """連續請求期間寫入 django_session 的次數"""
+        with CaptureQueriesContext(connection) as ctx:
+            for _ in range(requests):
+                self.assertEqual(self.client.get(self.url).status_code, 200)
+        return sum(
+            1 for q in ctx.captured_queries
+            if q['sql'].startswith(('UPDATE "django_session"', 'INSERT INTO "django_session"'))
+        )
+
+    def test_renewal_writes_reduced(self):
+        self.assertEqual(self.session_writes(), 0)
+        with override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db'):
+            # 中介層在建立時決定 session 後端，需換一個新的 client
+            self.client = self.client_class()
+            self.client.force_login(self.student)
+            self.assertEqual(self.session_writes(), 20)
+
+    def test_expiry_covers_full_age(self):
+        session = Session.objects.get()
+        remaining = (session.expire_date - timezone.now()).total_seconds()
+        self.assertGreaterEqual(remaining, settings.SESSION_COOKIE_AGE)
+        response = self.client.get(self.url)
+        self.assertEqual(response.cookies[settings.SESSION_COOKIE_NAME]['max-age'], settings.SESSION_COOKIE_AGE)
+
+    @override_settings(SESSION_RENEW_INTERVAL=0)
+    def test_renews_when_remaining_lifetime_short(self):
+        self.client.force_login(self.student)
+        self.assertEqual(self.session_writes(3), 3)
+
+    def test_modified_session_written(self):
+        session = self.client.session
+        session['seen'] = True
+        session.save()
+        cache.clear()
+        self.assertTrue(self.client.session['seen'])
+        self.assertEqual(self.session_writes(1), 0)
+
+
+class DatabaseProfileTests(TestCase):
+    def test_sqlite_pragmas_applied(self):
+        values = database.pragma_values(connection, ['synchronous', 'busy_timeout', 'cache_size'])
+        self.assertEqual(values['synchronous'], 1)  # NORMAL
+        self.assertEqual(values['busy_timeout'], settings.SQLITE_PRAGMAS['busy_timeout'])
+        self.assertEqual(values['cache_size'], settings.SQLITE_PRAGMAS['cache_size'])
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_db', threads=1, ops=3, students=5, courses=2, rows=3, stdout=out)
+        self.assertIn('選課/退選：完成 3 次', out.getvalue())
+        self.assertIn('成績登錄：完成 3 次', out.getvalue())
+        self.assertFalse(User.objects.filter(username__startswith='bench-').exists())
+        self.assertFalse(Course.objects.filter(course_code__startswith='bench-').exists())
+
+
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_catalog('p', teachers=3, courses=10, students=20, per_student=3)
+        admin = User.objects.create_user(username='admin', is_staff=True)
+        UserProfile.objects.create(user=admin, role='admin')
+
+    def test_hot_filters_use_indexes(self):
+        out = StringIO()
+        call_command('explain_views', '--check', stdout=out)
+        self.assertIn('沒有發現全表掃描', out.getvalue())
+        self.assertNotIn('略過', out.getvalue())
+
+    def test_active_enrollments_use_partial_index(self):
+        sql = str(Enrollment.objects.filter(course_id=1, is_active=True).query)
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('enrollment_active_course_idx', plan)
+
+
+@override_settings(REPLICA_DATABASES=['replica1', 'replica2'])
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+
+    def test_reads_outside_requests_use_primary(self):
+        self.assertEqual(self.router.db_for_read(Course), 'default')
+
+    def test_reads_go_to_replicas_until_write(self):
+        tokens = routers.start_request(pinned=False)
+        try:
+            self.assertIn(self.router.db_for_read(Course), ['replica1', 'replica2'])
+            self.assertIn(self.router.db_for_read(User), ['replica1', 'replica2'])
+            self.assertIsNone(self.router.db_for_read(Session))
+            self.assertEqual(self.router.db_for_write(Enrollment), 'default')
+            self.assertEqual(self.router.db_for_read(Course), 'default')
+        finally:
+            self.assertTrue(routers.end_request(tokens))
+
+    def test_request_reads_stick_to_one_replica(self):
+        chosen = set()
+        for _ in range(20):
+            tokens = routers.start_request(pinned=False)
+            try:
+                aliases = {self.router.db_for_read(model) for model in (Course, Enrollment, User) for _ in range(5)}
+            finally:
+                routers.end_request(tokens)
+            self.assertEqual(len(aliases), 1)
+            chosen |= aliases
+        # 不同請求之間仍分散到各副本
+        self.assertEqual(chosen, {'replica1', 'replica2'})
+
+    def test_pinned_request_uses_primary(self):
+        tokens = routers.start_request(pinned=True)
+        try:
+            self.assertEqual(self.router.db_for_read(Course), 'default')
+        finally:
+            self.assertFalse(routers.end_request(tokens))
+
+    def test_no_migrations_on_replicas(self):
+        self.assertFalse(self.router.allow_migrate('replica1', 'courses'))
+        self.assertIsNone(self.router.allow_migrate('default', 'courses'))
+
+
+# 測試環境沒有副本，以主資料庫充當副本，只驗證 cookie 的設定
+@override_settings(REPLICA_DATABASES=['default'], REPLICA_PIN_SECONDS=5)
+class ReplicaPinMiddlewareTests(TestCase):
+    def setUp(self):
+        self.student = make_student('student')
+        self.course = Course.objects.create(course_code='CS101', course_name='程式設計')
+        self.client.force_login(self.student)
+
+    def test_write_sets_pin_cookie(self):
+        response = self.client.post(reverse('courses:add_enrollment', args=[self.course.pk]))
+        self.assertEqual(response.cookies['pin_primary']['max-age'], 5)
+
+    def test_read_does_not_set_pin_cookie(self):
+        response = self.client.get(reverse('courses:course_list'))
+        self.assertNotIn('pin_primary', response.cookies)
+
+    @override_settings(REPLICA_DATABASES=['replica1'])
+    async def test_async_requests_stay_async(self):
+        async def view(request):
+            # 非同步視圖的查詢在其他執行緒中經過路由
+            return HttpResponse(await sync_to_async(routers.ReplicaRouter().db_for_write)(Enrollment))
+
+        middleware = ReplicaPinMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await middleware(RequestFactory().get('/'))
+        self.assertEqual(response.content, b'default')
+        self.assertIn('pin_primary', response.cookies)
+        self.assertTrue(routers._pinned.get())
+
+
+# 需以 DB_REPLICAS=2 執行：測試環境的副本連線以 TEST MIRROR 指向主資料庫，
+# 各連線各自記錄查詢，可以看出每個請求的讀取落在哪個副本
+@skipUnless(len(settings.REPLICA_DATABASES) >= 2, '需設定 DB_REPLICAS=2')
+class ReplicaRequestTests(TransactionTestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        teacher = make_teacher('teacher', 'T001')
+        self.course = Course.objects.create(course_code='CS101', course_name='程式設計', teacher=teacher)
+        self.student = make_student('student')
+        seats.allocate_seat(self.student, self.course)
+        CourseComment.objects.create(course=self.course, user=self.student, content='很實用的課程')
+
+    def replica_reads(self, url):
+        contexts = {alias: CaptureQueriesContext(connections[alias]) for alias in settings.REPLICA_DATABASES}
+        for context in contexts.values():
+            context.__enter__()
+        try:
+            response = self.client.get(url)
+        finally:
+            for context in contexts.values():
+                context.__exit__(None, None, None)
+        self.assertEqual(response.status_code, 200)
+        return {alias: len(context) for alias, context in contexts.items() if len(context)}
+
+    def test_each_request_reads_one_replica(self):
+        # ETag 的狀態查詢與頁面內容的查詢必須來自同一個副本
+        urls = [reverse('courses:course_list'), reverse('courses:course_detail', args=[self.course.pk])]
+        used = set()
+        for _ in range(10):
+            for url in urls:
+                reads = self.replica_reads(url)
+                self.assertEqual(len(reads), 1, reads)
+                self.assertGreater(sum(reads.values()), 1)
+                used |= reads.keys()
+        # 不同請求之間仍分散到各副本
+        self.assertGreater(len(used), 1)
+
+
+# 線上備份需等待來源的交易結束，不能在 TestCase 的交易中執行
+class ReplicationTests(TransactionTestCase):
+    def test_copy_sqlite(self):
+        Course.objects.create(course_code='CS101', course_name='程式設計')
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'replica.sqlite3')
+            database.copy_sqlite(connection, path)
+            with closing(sqlite3.connect(path)) as replica:
+                rows = replica.execute('SELECT course_code FROM courses_course').fetchall()
+        self.assertEqual(rows, [('CS101',)])
+
+
+ASYNC_VIEW_NAMES = {'course_list', 'course_detail', 'student_dashboard', 'dashboard', 'teacher_dashboard'}
+
+
+class AsyncUrlconf:
+    """將 courses.urls 中的目錄、課程詳情與儀表板換成非同步視圖"""
+
+    urlpatterns = [path('', include(([
+        path(str(p.pattern), getattr(async_views, p.callback.__name__), name=p.name) if p.name in ASYNC_VIEW_NAMES else p
+        for p in urls.urlpatterns
+    ], 'courses')))]
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = make_teacher('teacher', 'T001')
+        self.course = Course.objects.create(course_code='CS101', course_name='程式設計', teacher=self.teacher)
+        self.student = make_student('student')
+        seats.allocate_seat(self.student, self.course)
+        Enrollment.objects.filter(user=self.student).update(midterm_score=80, final_score=90)
+        CourseComment.objects.create(course=self.course, user=self.student, content='很實用的課程')
+        override = override_settings(ROOT_URLCONF=AsyncUrlconf)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_views_are_async(self):
+        for name in ('course_list', 'student_dashboard', 'teacher_dashboard'):
+            self.assertTrue(iscoroutinefunction(resolve(reverse(f'courses:{name}')).func))
+
+    @override_settings(DEBUG=True)
+    def test_asgi_middleware_stack_stays_async(self):
+        # DEBUG 時 Django 會記錄每個需要以 async_to_sync 轉接的中介層
+        with self.assertNoLogs('django.request', 'DEBUG'):
+            handler = ASGIHandler()
+        self.assertTrue(iscoroutinefunction(handler._middleware_chain))
+
+    async def test_course_detail(self):
+        await self.async_client.aforce_login(self.student)
+        response = await self.async_client.get(reverse('courses:course_detail', args=[self.course.pk]))
+        self.assertContains(response, '程式設計')
+        self.assertContains(response, '很實用的課程')
+        self.assertTrue(response.context['can_comment'])
+        self.assertEqual(response.context['enrollments'][0].total_score, Decimal('85.00'))
+
+    async def test_course_detail_not_found(self):
+        response = await self.async_client.get(reverse('courses:course_detail', args=[0]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_comment_post(self):
+        self.client.force_login(self.student)
+        url = reverse('courses:course_detail', args=[self.course.pk])
+        self.assertRedirects(self.client.post(url, {'content': '作業很多'}), url)
+        self.assertTrue(CourseComment.objects.filter(content='作業很多').exists())
+
+    def test_course_list(self):
+        response = self.client.get(reverse('courses:course_list'))
+        self.assertContains(response, '程式設計')
+        self.assertEqual(response.context['page_obj'].paginator.count, 1)
+
+    async def test_dashboards(self):
+        await self.async_client.aforce_login(self.student)
+        response = await self.async_client.get(reverse('courses:student_dashboard'))
+        self.assertEqual(response.context['average_score'], Decimal('85.00'))
+        self.assertEqual((await self.async_client.get(reverse('courses:teacher_dashboard'))).status_code, 403)
+
+        await self.async_client.aforce_login(self.teacher.user)
+        response = await self.async_client.get(reverse('courses:teacher_dashboard'))
+        self.assertContains(response, 'CS101 - 程式設計')
+
+    async def test_dashboard_requires_login(self):
+        response = await self.async_client.get(reverse('courses:student_dashboard'))
+        self.assertEqual(response.status_code, 302)
+
+
+
+class CommentFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = make_teacher('teacher', 'T001')
+        self.course = Course.objects.create(course_code='CS101', course_name='程式設計', teacher=self.teacher)
+        self.student = make_student('student')
+        seats.allocate_seat(self.student, self.course)
+        users = User.objects.bulk_create(User(username=f'c{i}', first_name=f'同學{i}') for i in range(44))
+        CourseComment.objects.bulk_create(
+            CourseComment(course=self.course, user=u, content=f'留言{i}') for i, u in enumerate(users)
+        )
+        # 一半的留言建立時間相同，游標必須以 id 區分
+        tied = CourseComment.objects.order_by('id').values_list('id', flat=True)[:22]
+        CourseComment.objects.filter(id__in=list(tied)).update(created_at=timezone.now())
+        self.mine = CourseComment.objects.create(course=self.course, user=self.student, content='我的留言')
+        self.url = reverse('courses:course_comments_api', args=[self.course.pk])
+
+    def test_cursor_pages_cover_all_comments(self):
+        seen, cursor = [], None
+        while True:
+            response = self.client.get(self.url, {'before': cursor} if cursor else {})
+            data = response.json()
+            seen += [c['id'] for c in data['results']]
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+        expected = CourseComment.objects.order_by('-created_at', '-id').values_list('id', flat=True)
+        self.assertEqual(seen, list(expected))
+        self.assertEqual(len(seen), 45)
+
+    def test_since_returns_newer_comments(self):
+        cursor = comments.encode_cursor(self.mine)
+        self.assertEqual(self.client.get(self.url, {'since': cursor}).json()['results'], [])
+        newer = CourseComment.objects.create(course=self.course, user=self.teacher.user, content='補充說明')
+        results = self.client.get(self.url, {'since': cursor}).json()['results']
+        self.assertEqual([c['id'] for c in results], [newer.pk])
+        self.assertEqual(results[0]['cursor'], comments.encode_cursor(newer))
+
+    def test_not_modified(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+        # 其他頁的 ETag 不同
+        self.assertNotEqual(self.client.get(self.url, {'per_page': 5})['ETag'], etag)
+
+    def test_edit_and_delete_change_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.mine.content = '修改後的留言'
+        self.mine.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['content'], '修改後的留言')
+        self.assertTrue(response.json()['results'][0]['edited'])
+
+        etag = response['ETag']
+        self.mine.delete()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_invalid_cursor_and_course(self):
+        self.assertEqual(self.client.get(self.url, {'before': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'since': '9' * 30 + '_1'}).status_code, 400)
+        missing = reverse('courses:course_comments_api', args=[0])
+        self.assertEqual(self.client.get(missing).status_code, 404)
+
+    def test_course_detail_shows_first_page(self):
+        self.client.force_login(self.student)
+        url = reverse('courses:course_detail', args=[self.course.pk])
+        response = self.client.get(url)
+        page = response.context['comments']
+        self.assertEqual(len(page), comments.PAGE_SIZE)
+        self.assertEqual(response.context['user_comment'], self.mine)
+        self.assertContains(response, f'?before={page.next_cursor}')
+
+        # 沒有 JavaScript 時以 ?before= 翻到下一頁，自己的留言仍可編輯
+        response = self.client.get(url, {'before': page.next_cursor})
+        self.assertEqual(len(response.context['comments']), comments.PAGE_SIZE)
+        self.assertEqual(response.context['user_comment'], self.mine)
+        self.assertNotIn(self.mine, list(response.context['comments']))
+        self.assertEqual(self.client.get(url, {'before': 'abc'}).status_code, 200)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = make_teacher('teacher', 'T001')
+        self.course = Course.objects.create(course_code='CS101', course_name='程式設計', teacher=self.teacher)
+        self.student = make_student('student')
+        self.enrollment = seats.allocate_seat(self.student, self.course)[1]
+        self.catalog = reverse('courses:course_list')
+        self.detail = reverse('courses:course_detail', args=[self.course.pk])
+
+    def assertNotModified(self, url, queries=1):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(queries):
+            repeat = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(repeat.status_code, 304)
+        return response
+
+    def test_anonymous_catalog_is_public(self):
+        response = self.assertNotModified(self.catalog)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn(f'max-age={settings.PUBLIC_PAGE_MAX_AGE}', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+        self.assertIn('Last-Modified', response)
+        self.assertNotModified(reverse('courses:course_list_api'))
+        self.assertNotModified(self.detail)
+
+    def test_catalog_changes_with_enrollment_and_teacher(self):
+        etag = self.client.get(self.catalog)['ETag']
+        seats.allocate_seat(make_student('other'), self.course)
+        response = self.client.get(self.catalog, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, '2/50')
+
+        etag = response['ETag']
+        user = self.teacher.user
+        user.first_name = '王老師'
+        user.save()
+        self.assertContains(self.client.get(self.catalog, HTTP_IF_NONE_MATCH=etag), '王老師')
+
+    def test_dashboards_are_private(self):
+        self.client.force_login(self.student)
+        response = self.assertNotModified(reverse('courses:student_dashboard'))
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('no-cache', response['Cache-Control'])
+        etag = response['ETag']
+        self.enrollment.midterm_score = 75
+        self.enrollment.save()
+        response = self.client.get(reverse('courses:student_dashboard'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        self.client.force_login(self.teacher.user)
+        self.assertIn('private', self.assertNotModified(reverse('courses:teacher_dashboard'))['Cache-Control'])
+
+    def test_course_detail_varies_by_user_and_comments(self):
+        anonymous = self.client.get(self.detail)['ETag']
+        self.client.force_login(self.student)
+        response = self.client.get(self.detail, HTTP_IF_NONE_MATCH=anonymous)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+
+        etag = response['ETag']
+        self.client.post(self.detail, {'content': '很實用的課程'})
+        self.assertContains(self.client.get(self.detail, HTTP_IF_NONE_MATCH=etag), '很實用的課程')
+        self.assertEqual(self.client.get(reverse('courses:course_detail', args=[0])).status_code, 404)
+
+    def test_pending_messages_are_rendered(self):
+        full = Course.objects.create(course_code='CS102', course_name='資料結構', max_students=0)
+        self.client.force_login(self.student)
+        etag = self.client.get(reverse('courses:student_dashboard'))['ETag']
+        # 額滿的課程：選課失敗只留下錯誤訊息，成績單的資料沒有變
+        self.client.get(reverse('courses:add_enrollment', args=[full.pk]))
+        response = self.client.get(reverse('courses:student_dashboard'), HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, '已額滿')
+        self.assertNotIn('ETag', response)
+
+    @override_settings(ROOT_URLCONF=AsyncUrlconf)
+    def test_async_views(self):
+        self.assertNotModified(self.catalog)
+        self.assertNotModified(self.detail)
+        self.client.force_login(self.student)
+        self.assertNotModified(reverse('courses:student_dashboard'))
+
+
+def image_upload(name, size, mode='RGB', fmt='JPEG'):
+    buffer = BytesIO()
+    Image.new(mode, size, (200, 30, 30, 128) if mode == 'RGBA' else (200, 30, 30)).save(buffer, fmt)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+class AvatarTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = override_settings(MEDIA_ROOT=media.name, AVATAR_WORKERS=0)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.student = make_student('student')
+        self.profile = UserProfile.objects.get(user=self.student)
+
+    def upload(self, upload):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.profile.avatar = upload
+            self.profile.save()
+        self.profile.refresh_from_db()
+        return callbacks
+
+    def test_renditions(self):
+        self.assertEqual(len(self.upload(image_upload('me.jpg', (800, 600)))), 1)
+        renditions = self.profile.avatar_renditions
+        self.assertEqual(set(renditions), {'32', '64', '300', '32.webp', '64.webp', '300.webp'})
+        storage = self.profile.avatar.storage
+        for key, name in renditions.items():
+            with storage.open(name) as f, Image.open(f) as image:
+                self.assertEqual(image.size, (int(key.split('.')[0]),) * 2)
+                self.assertEqual(image.format, 'WEBP' if key.endswith('webp') else 'JPEG')
+        # 原圖保留不動
+        self.assertEqual(Image.open(self.profile.avatar.path).size, (800, 600))
+
+    def test_transparent_avatar_uses_png(self):
+        self.upload(image_upload('me.png', (100, 100), mode='RGBA', fmt='PNG'))
+        self.assertTrue(self.profile.avatar_renditions['64'].endswith('.png'))
+
+    def test_unchanged_avatar_is_not_processed(self):
+        self.upload(image_upload('me.jpg', (100, 100)))
+        renditions = self.profile.avatar_renditions
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.profile.bio = '你好'
+            self.profile.save()
+        self.assertEqual(callbacks, [])
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.avatar_renditions, renditions)
+
+    def test_replaced_avatar(self):
+        self.upload(image_upload('old.jpg', (100, 100)))
+        old_name, old_renditions = self.profile.avatar.name, self.profile.avatar_renditions
+        self.upload(image_upload('new.jpg', (100, 100)))
+        storage = self.profile.avatar.storage
+        self.assertFalse(any(storage.exists(name) for name in old_renditions.values()))
+        # 舊頭像的處理結果較晚完成時直接丟棄
+        self.assertIsNone(avatars.process(self.profile.pk, old_name))
+        self.profile.refresh_from_db()
+        self.assertIn('new', self.profile.avatar_renditions['32'])
+
+    def test_large_jpeg_is_drafted(self):
+        self.profile.avatar = image_upload('big.jpg', (4000, 3000))
+        self.profile.save()
+        image = avatars._open(self.profile.avatar.storage, self.profile.avatar.name, 300)
+        self.assertEqual(image.size, (500, 375))
+
+    def test_navbar_uses_small_rendition(self):
+        self.upload(image_upload('me.jpg', (800, 600)))
+        self.client.force_login(self.student)
+        response = self.client.get(reverse('courses:profile'))
+        renditions = self.profile.avatar_renditions
+        self.assertContains(response, f'srcset="/media/{renditions["32.webp"]} 1x, /media/{renditions["64.webp"]} 2x"')
+        self.assertContains(response, f'src="/media/{renditions["300"]}"')
+        self.assertNotContains(response, f'src="/media/{self.profile.avatar.name}"')
+
+    def test_process_avatars_command(self):
+        self.profile.avatar = image_upload('me.jpg', (100, 100))
+        self.profile.save()
+        out = StringIO()
+        call_command('process_avatars', stdout=out)
+        self.assertIn('已處理 1 個頭像', out.getvalue())
+        self.profile.refresh_from_db()
+        self.assertIn('32', self.profile.avatar_renditions)
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        profiling.reset()
+        self.teacher = make_teacher('teacher', 'T001')
+        Course.objects.create(course_code='CS101', course_name='程式設計', teacher=self.teacher)
+        self.staff = User.objects.create_user(username='staff', is_staff=True)
+
+    def test_records_per_view(self):
+        for _ in range(3):
+            self.client.get(reverse('courses:course_list'))
+        stats = profiling.snapshot()['courses:course_list']
+        self.assertEqual(stats['count'], 3)
+        metrics = stats['metrics']
+        self.assertGreater(metrics['queries']['p50'], 0)
+        self.assertGreater(metrics['template']['p99'], 0)
+        self.assertGreater(metrics['db']['sum'], 0)
+        self.assertGreaterEqual(metrics['wall']['p50'], metrics['template']['p50'])
+        self.assertEqual(metrics['response']['p50'], len(self.client.get(reverse('courses:course_list')).content))
+
+    def test_duplicate_queries(self):
+        def view(request):
+            for _ in range(3):
+                list(Course.objects.filter(course_code='CS101'))
+            list(Course.objects.filter(course_code='CS102'))
+            return HttpResponse('ok')
+
+        request = RequestFactory().get('/')
+        request.resolver_match = resolve(reverse('courses:course_list'))
+        profiling.ProfilingMiddleware(view)(request)
+        metrics = profiling.snapshot()['courses:course_list']['metrics']
+        self.assertEqual(metrics['queries']['sum'], 4)
+        self.assertEqual(metrics['duplicate_queries']['sum'], 2)
+
+    async def test_async_requests_stay_async(self):
+        async def view(request):
+            await sync_to_async(list)(Course.objects.filter(course_code='CS101'))
+            await Course.objects.filter(course_code='CS101').acount()
+            return HttpResponse('ok')
+
+        middleware = profiling.ProfilingMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        request = RequestFactory().get('/')
+        request.resolver_match = resolve(reverse('courses:course_list'))
+        await middleware(request)
+        metrics = profiling.snapshot()['courses:course_list']['metrics']
+        self.assertEqual(metrics['queries']['sum'], 2)
+        self.assertEqual(metrics['response']['sum'], 2)
+
+    @override_settings(PROFILING_CPROFILE_RATE=1)
+    def test_cprofile_sampling(self):
+        self.client.get(reverse('courses:course_list'))
+        profiles = profiling.snapshot()['courses:course_list']['profiles']
+        self.assertEqual(len(profiles), 1)
+        self.assertIn('function calls', profiles[0]['stats'])
+
+    def test_endpoints_are_staff_only(self):
+        self.client.get(reverse('courses:course_list'))
+        self.assertEqual(self.client.get(reverse('courses:profiling_metrics')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('courses:profiling_stats')).status_code, 302)
+
+        self.client.force_login(self.staff)
+        data = self.client.get(reverse('courses:profiling_stats')).json()
+        self.assertIn('courses:course_list', data['views'])
+        response = self.client.get(reverse('courses:profiling_metrics'))
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        self.assertContains(response, 'courses_view_wall_seconds{view="courses:course_list",quantile="0.99"}')
+        self.assertContains(response, 'courses_view_queries_total_count{view="courses:course_list"} 1')
+
+    @override_settings(PROFILING_METRICS_TOKEN='secret')
+    def test_metrics_token(self):
+        url = reverse('courses:profiling_metrics')
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+
+class SeedTests(TestCase):
+    def seed(self, **kwargs):
+        params = {'teachers': 3, 'students': 40, 'courses': 10, 'per_student': 3, 'comment_rate': 0.2, **kwargs}
+        return seeding.seed(**params)
+
+    def test_counts_and_invariants(self):
+        counts = self.seed()
+        self.assertEqual(counts['users'], 44)
+        self.assertEqual(counts['enrollments'], 120)
+        self.assertEqual(Enrollment.objects.count(), 120)
+        self.assertEqual(CourseComment.objects.count(), counts['comments'])
+        self.assertEqual(UserProfile.objects.filter(role='student').count(), 40)
+        self.assertTrue(User.objects.get(username='seed-admin').is_staff)
+
+        # 選修人數已重算，沒有課程超過名額，也沒有重複選課
+        for course in Course.objects.all():
+            active = Enrollment.objects.filter(course=course, is_active=True).count()
+            self.assertEqual(course.active_enrollment_count, active)
+            self.assertLessEqual(active, course.max_students)
+        self.assertEqual(Enrollment.objects.values('user', 'course').distinct().count(), 120)
+        self.assertIn(Course.objects.get(course_code='seed-C00001').pk, search.search_course_ids('seed-C00001'))
+
+    def test_shared_password_and_decimal_scores(self):
+        self.seed(students=5)
+        hashes = set(User.objects.values_list('password', flat=True))
+        self.assertEqual(len(hashes), 1)
+        self.assertTrue(User.objects.get(username='seed-s0').check_password(seeding.SEED_PASSWORD))
+        enrollment = Enrollment.objects.first()
+        self.assertIsInstance(enrollment.midterm_score, Decimal)
+        self.assertTrue(0 <= enrollment.midterm_score <= 100)
+
+    def test_deterministic(self):
+        self.seed(prefix='a', random_seed=7)
+        self.seed(prefix='b', random_seed=7)
+        plan = lambda prefix: list(
+            Enrollment.objects.filter(user__username__startswith=prefix + '-')
+            .order_by('user__username', 'course__course_code')
+            .values_list('user__username', 'course__course_code', 'midterm_score')
+        )
+        self.assertEqual(
+            [(u[2:], c[2:], s) for u, c, s in plan('a')],
+            [(u[2:], c[2:], s) for u, c, s in plan('b')],
+        )
+
+    def test_command_refuses_existing_prefix(self):
+        out = StringIO()
+        call_command('seed', students=10, teachers=2, courses=3, per_student=2, stdout=out)
+        self.assertIn('enrollments 20', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('seed', students=10, stdout=StringIO())
+
+
+class BenchmarkTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        seeding.seed(teachers=2, students=30, courses=6, per_student=2)
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.output = os.path.join(self.dir.name, 'results.json')
+        self.baseline = os.path.join(self.dir.name, 'baseline.json')
+
+    def bench(self, *args):
+        call_command(
+            'benchmark_suite', '--current-db', '--requests', '3', '--warmup', '1',
+            '--output', self.output, '--baseline', self.baseline, *args, stdout=StringIO(), stderr=StringIO(),
+        )
+        with open(self.output) as f:
+            return json.load(f)
+
+    def test_runs_every_scenario(self):
+        report = self.bench()
+        scenarios = report['datasets']['current']['scenarios']
+        self.assertEqual(list(scenarios), list(benchmarks.SCENARIOS))
+        for name, result in scenarios.items():
+            self.assertEqual(result['errors'], 0, name)
+            self.assertGreater(result['queries_per_request'], 0, name)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+        self.assertEqual(scenarios['login']['requests'], benchmarks.MIN_REQUESTS)
+        # 選課尖峰每次都退選，名額與選修人數不變
+        self.assertEqual(Enrollment.objects.filter(is_active=True).count(),
+                         sum(Course.objects.values_list('active_enrollment_count', flat=True)))
+
+    def test_baseline_regression_fails(self):
+        self.bench('--scenario', 'catalog', '--save-baseline')
+        with open(self.baseline) as f:
+            baseline = json.load(f)
+        # 只讓查詢數退化；延遲與 RSS 放寬到不會因機器負載而誤報
+        baseline['datasets']['current']['scenarios']['catalog'].update(
+            queries_per_request=0, p95_ms=10 ** 6, peak_rss_mb=None,
+        )
+        with open(self.baseline, 'w') as f:
+            json.dump(baseline, f)
+        with self.assertRaisesMessage(CommandError, '1 項退化'):
+            self.bench('--scenario', 'catalog')
+
+    def test_compare(self):
+        base = {'p95_ms': 10.0, 'queries_per_request': 3.0, 'peak_rss_mb': 100.0, 'errors': 0}
+        self.assertEqual(benchmarks.compare({'small': {'catalog': base}}, {'small': {'catalog': base}}), [])
+        slower = {**base, 'p95_ms': 20.0, 'peak_rss_mb': 200.0}
+        self.assertEqual(len(benchmarks.compare({'small': {'catalog': slower}}, {'small': {'catalog': base}})), 2)
+        # 基準中沒有的資料集只檢查失敗的請求
+        failed = {**base, 'errors': 1}
+        self.assertEqual(len(benchmarks.compare({'large': {'catalog': failed}}, {'small': {'catalog': base}})), 1)
+
+
+class SeatInvariantTests(TestCase):
+    def test_reports_overbooking_and_drift(self):
+        course = Course.objects.create(course_code='CS101', course_name='程式設計', max_students=1)
+        self.assertEqual(seats.check_invariants(), [])
+        # bulk_create 不經過 seats，計數器不會更新
+        Enrollment.objects.bulk_create([Enrollment(user=make_student(f's{i}'), course=course) for i in range(2)])
+        violations = seats.check_invariants([course.pk])
+        self.assertEqual(violations, ['CS101：選修中 2 人，超過名額 1', 'CS101：計數器 0，實際 2'])
+
+
+class LoadTestTests(TransactionTestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+        seeding.seed(teachers=2, students=30, courses=4, per_student=2)
+
+    def test_concurrent_registration_keeps_invariants(self):
+        courses = loadtest.hot_courses('seed', 2)
+        loadtest.open_seats(courses, 1)
+        sessions = loadtest.login_students(loadtest.seeded_students('seed', 20))
+        # 測試用的記憶體資料庫在並行寫入時直接回報 table is locked，不會等待 busy_timeout，
+        # 因此只用一個執行緒；並行情境以 load_registration 命令在檔案資料庫上執行
+        result = loadtest.run(sessions, courses, threads=1, ops=40, drop_rate=0.5)
+
+        self.assertEqual(result['errors'], 0, result['failures'])
+        self.assertEqual(result['latency']['enroll']['count'], 40)
+        self.assertEqual(result['requests'], 40 + result['latency']['drop']['count'])
+        self.assertGreaterEqual(result['lock_wait']['count'], result['requests'])
+        self.assertEqual(seats.check_invariants([c.pk for c in courses]), [])
+
+    def test_command(self):
+        out = StringIO()
+        call_command('load_registration', students=10, hot=1, free_seats=1, threads=1, ops=5, stdout=out)
+        self.assertIn('名額不變量正常', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('load_registration', courses=['NOPE'], stdout=StringIO())
+
+
+class WaitlistTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.course = Course.objects.create(course_code='CS101', course_name='程式設計', max_students=1)
+        self.first, self.second, self.third = (make_student(name) for name in ('first', 'second', 'third'))
+        seats.allocate_seat(self.first, self.course)
+
+    def test_join_in_order(self):
+        self.assertEqual(waitlist.join(self.second, self.course), (waitlist.WAITING, 1))
+        self.assertEqual(waitlist.join(self.third, self.course), (waitlist.WAITING, 2))
+        self.assertEqual(waitlist.join(self.second, self.course), (waitlist.ALREADY_WAITING, 1))
+        with self.assertNumQueries(1):
+            self.assertEqual(waitlist.position(self.third, self.course), 2)
+        self.assertIsNone(waitlist.position(self.first, self.course))
+
+    def test_drop_promotes_head(self):
+        waitlist.join(self.second, self.course)
+        waitlist.join(self.third, self.course)
+        enrollment = Enrollment.objects.get(user=self.first)
+
+        self.assertEqual(seats.release_seat(enrollment), seats.DROPPED)
+        self.assertTrue(Enrollment.objects.get(user=self.second, course=self.course).is_active)
+        self.assertEqual(waitlist.position(self.third, self.course), 1)
+        self.assertFalse(WaitlistEntry.objects.filter(user=self.second).exists())
+        self.assertEqual(seats.check_invariants(), [])
+
+    def test_promotion_skips_students_already_enrolled(self):
+        waitlist.join(self.second, self.course)
+        waitlist.join(self.third, self.course)
+        # 名次在前的學生已另外選上（例如名額調整後直接加選）
+        Course.objects.filter(pk=self.course.pk).update(max_students=2)
+        seats.allocate_seat(self.second, self.course)
+
+        seats.release_seat(Enrollment.objects.get(user=self.first))
+        self.assertTrue(Enrollment.objects.get(user=self.third).is_active)
+        self.assertFalse(WaitlistEntry.objects.exists())
+        self.assertEqual(seats.check_invariants(), [])
+
+    def test_raising_capacity_promotes(self):
+        for student in (self.second, self.third):
+            waitlist.join(student, self.course)
+        stale = Course.objects.get(pk=self.course.pk)
+        stale.course_name = '程式設計（一）'
+        stale.save()
+        self.assertEqual(WaitlistEntry.objects.count(), 2)
+
+        stale.max_students = 2
+        stale.save()
+        self.assertTrue(Enrollment.objects.get(user=self.second).is_active)
+        self.assertEqual(waitlist.position(self.third, self.course), 1)
+        self.assertEqual(seats.check_invariants(), [])
+
+        admin = User.objects.create_superuser(username='admin', password='x')
+        self.client.force_login(admin)
+        data = {
+            field: getattr(stale, field) for field in
+            ('course_code', 'course_name', 'credits', 'description', 'semester', 'midterm_weight', 'final_weight')
+        }
+        data['teacher'] = make_teacher('teacher', 'T001').pk
+        response = self.client.post(reverse('admin:courses_course_change', args=[stale.pk]), {**data, 'max_students': 3})
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Enrollment.objects.get(user=self.third).is_active)
+        self.assertFalse(WaitlistEntry.objects.exists())
+        self.assertEqual(Course.objects.get(pk=self.course.pk).active_enrollment_count, 3)
+
+    def test_join_takes_free_seat(self):
+        # 退選時名單還是空的，名額空出後才加入
+        Course.objects.filter(pk=self.course.pk).update(max_students=2)
+        self.assertEqual(waitlist.join(self.second, self.course), (waitlist.PROMOTED, None))
+        self.assertTrue(Enrollment.objects.get(user=self.second).is_active)
+        self.assertFalse(WaitlistEntry.objects.exists())
+
+    def test_invariants(self):
+        WaitlistEntry.objects.create(course=self.course, user=self.first)
+        Course.objects.filter(pk=self.course.pk).update(max_students=3)
+        WaitlistEntry.objects.create(course=self.course, user=self.second)
+        self.assertEqual(seats.check_invariants(), [
+            'CS101：尚有 2 個名額，候補名單仍有 2 人',
+            f'CS101：學生 {self.first.pk} 已選修仍在候補名單中',
+        ])
+
+    def test_leave(self):
+        waitlist.join(self.second, self.course)
+        waitlist.join(self.third, self.course)
+        self.assertTrue(waitlist.leave(self.second, self.course))
+        self.assertFalse(waitlist.leave(self.second, self.course))
+        self.assertEqual(waitlist.position(self.third, self.course), 1)
+
+    def test_views(self):
+        self.client.force_login(self.second)
+        response = self.client.get(reverse('courses:add_enrollment', args=[self.course.pk]), follow=True)
+        self.assertContains(response, '已加入候補名單，目前排第 1 位')
+        self.assertContains(response, '候補中的課程')
+        api = reverse('courses:course_waitlist_api', args=[self.course.pk])
+        self.assertEqual(self.client.get(api).json(), {'course_id': self.course.pk, 'position': 1})
+
+        # 已快取的儀表板在加入或退出候補後不會回應 304
+        etag = self.client.get(reverse('courses:student_dashboard'))['ETag']
+        self.client.get(reverse('courses:leave_waitlist', args=[self.course.pk]))
+        self.client.get(reverse('courses:add_enrollment', args=[self.course.pk]))
+        response = self.client.get(reverse('courses:student_dashboard'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        self.client.force_login(self.first)
+        self.client.get(reverse('courses:drop_course', args=[Enrollment.objects.get(user=self.first).pk]))
+        self.client.force_login(self.second)
+        self.assertEqual(self.client.get(api).json(), {'course_id': self.course.pk, 'position': None, 'enrolled': True})
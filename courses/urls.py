@@ -1,5 +1,9 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+
+# 以 ASGI 部署時，目錄、課程詳情與儀表板使用非同步版本（見 async_views.py）
+catalog_views = async_views if settings.ASYNC_VIEWS else views
 
 app_name = 'courses'
 
@@ -13,19 +17,31 @@ urlpatterns = [
     path('profile/', views.profile, name='profile'),
     
     # 課程相關
-    path('courses/', views.course_list, name='course_list'),
-    path('course/<int:course_id>/', views.course_detail, name='course_detail'),
+    path('courses/', catalog_views.course_list, name='course_list'),
+    path('api/courses/', views.course_list_api, name='course_list_api'),
+    path('course/<int:course_id>/', catalog_views.course_detail, name='course_detail'),
+    path('api/course/<int:course_id>/comments/', views.course_comments_api, name='course_comments_api'),
     
     # 學生功能
-    path('dashboard/', views.student_dashboard, name='student_dashboard'),
-    path('dashboard/',views.student_dashboard, name='dashboard'),
+    path('dashboard/', catalog_views.student_dashboard, name='student_dashboard'),
+    path('dashboard/', catalog_views.student_dashboard, name='dashboard'),
     path('course/<int:course_id>/enroll/', views.add_enrollment, name='add_enrollment'),
     path('enrollment/<int:enrollment_id>/drop/', views.drop_course, name='drop_course'),
+    path('course/<int:course_id>/waitlist/leave/', views.leave_waitlist, name='leave_waitlist'),
+    path('api/course/<int:course_id>/waitlist/', views.course_waitlist_api, name='course_waitlist_api'),
     
     # 教師功能
-    path('teacher/', views.teacher_dashboard, name='teacher_dashboard'),
+    path('teacher/', catalog_views.teacher_dashboard, name='teacher_dashboard'),
     path('teacher/add-course/', views.teacher_add_course, name='teacher_add_course'),
     path('teacher/course/<int:course_id>/students/', views.teacher_course_students, name='teacher_course_students'),
+    path('teacher/course/<int:course_id>/stats/', views.teacher_course_stats, name='teacher_course_stats'),
+    path('teacher/course/<int:course_id>/grades/', views.teacher_course_grades, name='teacher_course_grades'),
+    path('teacher/course/<int:course_id>/import/', views.teacher_import_grades, name='teacher_import_grades'),
+    
+    # 成績匯出
+    path('export/course/<int:course_id>/gradebook.csv', views.export_course_gradebook, name='export_course_gradebook'),
+    path('export/transcript.csv', views.export_transcript, name='export_transcript'),
+    path('export/enrollments.csv', views.export_semester, name='export_semester'),
     
     # 管理員功能
     path('admin/', views.admin_dashboard, name='admin_dashboard'),
@@ -35,4 +51,8 @@ urlpatterns = [
     path('admin/courses/', views.admin_course_list, name='admin_course_list'),
     path('admin/courses/add/', views.admin_add_course, name='admin_add_course'),
     path('admin/courses/<int:course_id>/delete/', views.admin_delete_course, name='admin_delete_course'),
+    
+    # 效能統計
+    path('profiling/', views.profiling_stats, name='profiling_stats'),
+    path('profiling/metrics', views.profiling_metrics, name='profiling_metrics'),
 ]
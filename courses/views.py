@@ -1,14 +1,26 @@
+import json
+
+from django.conf import settings
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
+from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
-from django.http import JsonResponse, HttpResponseForbidden
-from django.views.decorators.http import require_http_methods
-from django.db.models import Q, Avg
+from django.http import HttpResponse, JsonResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import condition, require_http_methods
+from django.db.models import Avg, Count
 from .models import Student, Course, Enrollment, Teacher, UserProfile, CourseComment
+from . import comments, conditional, exports, grade_import, gradebook, grading, profiling, roles, seats, stats, waitlist
+from .pagination import get_page_size, keyset_paginate, paginate
+from .search import SearchResults
 from .forms import (
     UserRegistrationForm, UserProfileForm, UserEditForm, 
-    TeacherForm, CourseForm, TeacherCourseForm, EnrollmentForm, CourseCommentForm
+    TeacherForm, CourseForm, TeacherCourseForm, EnrollmentForm, CourseCommentForm, GradeImportForm
 )
 
 
@@ -27,16 +39,7 @@ def register(request):
     """用戶註冊"""
     if request.user.is_authenticated:
         # 根據角色重定向到相應的儀表板
-        try:
-            profile = request.user.profile
-            if profile.role == 'teacher':
-                return redirect('courses:teacher_dashboard')
-            elif profile.role == 'admin':
-                return redirect('courses:admin_dashboard')
-            else:
-                return redirect('courses:student_dashboard')
-        except UserProfile.DoesNotExist:
-            return redirect('courses:complete_profile')
+        return redirect(roles.dashboard_for(request.user))
     
     if request.method == 'POST':
         form = UserRegistrationForm(request.POST)
@@ -61,16 +64,7 @@ def user_login(request):
     """用戶登入"""
     if request.user.is_authenticated:
         # 根據角色重定向到相應的儀表板
-        try:
-            profile = request.user.profile
-            if profile.role == 'teacher':
-                return redirect('courses:teacher_dashboard')
-            elif profile.role == 'admin':
-                return redirect('courses:admin_dashboard')
-            else:
-                return redirect('courses:student_dashboard')
-        except UserProfile.DoesNotExist:
-            return redirect('courses:complete_profile')
+        return redirect(roles.dashboard_for(request.user))
     
     if request.method == 'POST':
         username = request.POST.get('username')
@@ -180,34 +174,24 @@ def profile(request):
 
 
 # 學生視圖
-@login_required
+@roles.role_required('student', message='只有學生可以訪問此頁面')
+@conditional.conditional_page(conditional.student_state)
 def student_dashboard(request):
     """學生成績單"""
-    try:
-        profile = request.user.profile
-    except UserProfile.DoesNotExist:
-        return HttpResponseForbidden('您的帳號尚未完成設定,請聯繫管理員')
-    
-    if profile.role != 'student':
-        return HttpResponseForbidden('只有學生可以訪問此頁面')
-    
     user = request.user
-    enrollments = Enrollment.objects.filter(user=user, is_active=True)
-    
-    # 計算平均分數
-    total_scores = []
-    for enrollment in enrollments:
-        score = enrollment.get_total_score()
-        if score is not None:
-            total_scores.append(score)
+    enrollments = grading.grade_enrollments(
+        Enrollment.objects.filter(user=user, is_active=True).select_related('course__teacher__user')
+    )
     
-    average_score = sum(total_scores) / len(total_scores) if total_scores else 0
-    average_score = round(average_score, 2)
+    # 計算平均分數與 GPA
+    summary = grading.summarize(enrollments)
     
     context = {
         'user': user,
         'enrollments': enrollments,
-        'average_score': average_score,
+        'waitlist': list(waitlist.entries_for(user)),
+        'average_score': summary['average_score'],
+        'gpa': summary['gpa'],
         'page': 'student_dashboard',
         'title': f'{user.get_full_name()}的成績單'
     }
@@ -215,20 +199,28 @@ def student_dashboard(request):
 
 
 # 課程視圖
+def _search_page(request, search):
+    """以檢索索引取得依相關度排序的課程，並依頁碼分頁（只取出該頁的課程 id）"""
+    page_obj = Paginator(SearchResults(search), get_page_size(request)).get_page(request.GET.get('page'))
+    courses = Course.objects.select_related('teacher__user').in_bulk(page_obj.object_list)
+    page_obj.object_list = [courses[pk] for pk in page_obj.object_list if pk in courses]
+    return page_obj
+
+
+@conditional.conditional_page(conditional.catalog_state)
 def course_list(request):
     """課程列表"""
-    courses = Course.objects.all()
+    courses = Course.objects.select_related('teacher__user')
     search = request.GET.get('search', '')
     
     if search:
-        courses = courses.filter(
-            Q(course_code__icontains=search) | 
-            Q(course_name__icontains=search) |
-            Q(teacher__user__first_name__icontains=search)
-        )
+        page_obj = _search_page(request, search)
+    else:
+        page_obj = paginate(request, courses, 'course_code', get_page_size(request))
     
     context = {
-        'courses': courses,
+        'courses': page_obj,
+        'page_obj': page_obj,
         'search': search,
         'page': 'course_list',
         'title': '課程列表'
@@ -236,23 +228,71 @@ def course_list(request):
     return render(request, 'courses/course_list.html', context)
 
 
+@conditional.conditional_page(conditional.catalog_state)
+def course_list_api(request):
+    """課程列表 API（keyset 分頁，以 ?after=<課號> 取下一頁；搜尋結果依相關度以 ?page=N 分頁）"""
+    courses = Course.objects.select_related('teacher__user')
+    search = request.GET.get('search', '')
+    
+    if search:
+        page_obj = _search_page(request, search)
+        next_page = page_obj.next_page_number() if page_obj.has_next() else None
+    else:
+        page_obj = keyset_paginate(courses, 'course_code', request.GET.get('after'), get_page_size(request))
+    
+    results = [
+        {
+            'id': course.pk,
+            'course_code': course.course_code,
+            'course_name': course.course_name,
+            'teacher': course.instructor_name,
+            'credits': course.credits,
+            'semester': course.semester,
+            'enrolled': course.active_enrollment_count,
+            'max_students': course.max_students,
+        }
+        for course in page_obj
+    ]
+    if search:
+        return JsonResponse({'results': results, 'count': page_obj.paginator.count, 'next_page': next_page})
+    return JsonResponse({'results': results, 'next_cursor': page_obj.next_cursor})
+
+
+def _comment_cursor(request):
+    """課程詳情的 ?before= 留言游標，格式錯誤時回到第一頁"""
+    before = request.GET.get('before')
+    try:
+        comments.decode_cursor(before or '')
+    except ValueError:
+        return None
+    return before
+
+
+def _user_comments(course_id, user):
+    return CourseComment.objects.filter(course_id=course_id, user=user).order_by('-created_at', '-id')
+
+
+@conditional.conditional_page(conditional.course_state)
 def course_detail(request, course_id):
     """課程詳細信息和留言"""
-    course = get_object_or_404(Course, pk=course_id)
-    enrollments = Enrollment.objects.filter(course=course, is_active=True)
-    comments = CourseComment.objects.filter(course=course)
+    course = get_object_or_404(Course.objects.select_related('teacher__user'), pk=course_id)
+    enrollments = grading.grade_enrollments(
+        Enrollment.objects.filter(course=course, is_active=True).select_related('user')
+    )
+    comment_page = comments.comment_page(course.pk, _comment_cursor(request))
     
     can_comment = False
+    user_enrollment = None
     user_comment = None
     
     if request.user.is_authenticated:
-        # 檢查用戶是否選修了該課程
-        user_enrollment = enrollments.filter(user=request.user).exists()
+        # 檢查用戶是否選修了該課程（名單本來就要顯示，直接從已載入的結果中尋找）
+        user_enrollment = next((e for e in enrollments if e.user_id == request.user.pk), None)
         if user_enrollment:
             can_comment = True
         
-        # 獲取用戶自己的留言
-        user_comment = comments.filter(user=request.user).first()
+        # 獲取用戶自己的留言（不一定在目前這一頁）
+        user_comment = _user_comments(course.pk, request.user).first()
     
     # 處理留言提交
     if request.method == 'POST' and request.user.is_authenticated and can_comment:
@@ -277,8 +317,9 @@ def course_detail(request, course_id):
     context = {
         'course': course,
         'enrollments': enrollments,
-        'comments': comments,
+        'comments': comment_page,
         'can_comment': can_comment,
+        'user_enrollment': user_enrollment,
         'user_comment': user_comment,
         'page': 'course_detail',
         'title': f'{course.course_name} - 課程詳情'
@@ -286,29 +327,71 @@ def course_detail(request, course_id):
     return render(request, 'courses/course_detail.html', context)
 
 
-@login_required
+@require_http_methods(['GET', 'HEAD'])
+@condition(etag_func=comments.feed_etag, last_modified_func=comments.feed_last_modified)
+def course_comments_api(request, course_id):
+    """課程留言 API：?before=<游標> 取更早的留言，?since=<游標> 取之後新增的留言（輪詢用）"""
+    since = request.GET.get('since')
+    before = request.GET.get('before')
+    per_page = get_page_size(request, comments.PAGE_SIZE)
+    try:
+        if since:
+            page_obj = comments.newer_comments(course_id, since, per_page)
+        else:
+            page_obj = comments.comment_page(course_id, before, per_page)
+    except ValueError:
+        return JsonResponse({'error': '無效的游標'}, status=400)
+    
+    if not page_obj and not Course.objects.filter(pk=course_id).exists():
+        return JsonResponse({'error': '課程不存在'}, status=404)
+    
+    return JsonResponse({
+        'results': [comments.serialize(comment) for comment in page_obj],
+        'next_cursor': page_obj.next_cursor,
+    })
+
+
+@roles.role_required('student', message='只有學生可以選課')
 def add_enrollment(request, course_id):
     """學生選課"""
-    if request.user.profile.role != 'student':
-        return HttpResponseForbidden('只有學生可以選課')
-    
     course = get_object_or_404(Course, pk=course_id)
-    user = request.user
     
-    # 檢查是否已選修
-    existing = Enrollment.objects.filter(user=user, course=course).first()
+    result, _ = seats.allocate_seat(request.user, course)
     
-    if existing:
-        if not existing.is_active:
-            existing.is_active = True
-            existing.save()
-    else:
-        if course.get_current_enrollment_count() < course.max_students:
-            Enrollment.objects.create(user=user, course=course)
+    if result == seats.FULL:
+        # 額滿時加入候補名單，之後以 course_waitlist_api 查詢名次
+        result, position = waitlist.join(request.user, course)
+        if result != waitlist.PROMOTED:
+            messages.warning(request, f'{course.course_name} 已額滿，已加入候補名單，目前排第 {position} 位')
+    
+    if result in (seats.ENROLLED, seats.REACTIVATED, waitlist.PROMOTED):
+        messages.success(request, f'已成功選修 {course.course_name}!')
+    
+    return redirect('courses:student_dashboard')
+
+
+@roles.role_required('student', message='只有學生可以選課')
+def leave_waitlist(request, course_id):
+    """學生退出候補名單"""
+    course = get_object_or_404(Course, pk=course_id)
+    
+    if waitlist.leave(request.user, course):
+        messages.success(request, f'已退出 {course.course_name} 的候補名單')
     
     return redirect('courses:student_dashboard')
 
 
+@roles.role_required('student', message='只有學生可以選課')
+def course_waitlist_api(request, course_id):
+    """學生在課程候補名單中的名次（position 為 null 表示不在名單中），供頁面輪詢"""
+    position = waitlist.position(request.user, course_id)
+    data = {'course_id': course_id, 'position': position}
+    if position is None:
+        # 不在名單中：可能已遞補選上
+        data['enrolled'] = Enrollment.objects.filter(user=request.user, course_id=course_id, is_active=True).exists()
+    return JsonResponse(data)
+
+
 @login_required
 def drop_course(request, enrollment_id):
     """學生退選課程"""
@@ -317,27 +400,18 @@ def drop_course(request, enrollment_id):
     if enrollment.user != request.user:
         return HttpResponseForbidden('無法退選他人的課程')
     
-    enrollment.is_active = False
-    enrollment.save()
+    seats.release_seat(enrollment)
     
     return redirect('courses:student_dashboard')
 
 
 # 教師視圖
-@login_required
+@roles.role_required('teacher', message='只有教師可以訪問此頁面')
+@conditional.conditional_page(conditional.teacher_state)
 def teacher_dashboard(request):
     """教師儀表板"""
-    try:
-        profile = request.user.profile
-    except UserProfile.DoesNotExist:
-        return HttpResponseForbidden('您的帳號沒有關聯的用戶資料，請聯繫管理員')
-    
-    if profile.role != 'teacher':
-        return HttpResponseForbidden('只有教師可以訪問此頁面')
-    
-    try:
-        teacher = Teacher.objects.get(user=request.user)
-    except Teacher.DoesNotExist:
+    teacher = roles.get_teacher(request.user)
+    if teacher is None:
         return redirect('courses:complete_profile')
     
     courses = teacher.get_courses()
@@ -351,20 +425,11 @@ def teacher_dashboard(request):
     return render(request, 'courses/teacher_dashboard.html', context)
 
 
-@login_required
+@roles.role_required('teacher', message='只有教師可以新增課程')
 def teacher_add_course(request):
     """教師新增課程"""
-    try:
-        profile = request.user.profile
-    except UserProfile.DoesNotExist:
-        return HttpResponseForbidden('您的帳號沒有關聯的用戶資料,請聯繫管理員')
-    
-    if profile.role != 'teacher':
-        return HttpResponseForbidden('只有教師可以新增課程')
-    
-    try:
-        teacher = Teacher.objects.get(user=request.user)
-    except Teacher.DoesNotExist:
+    teacher = roles.get_teacher(request.user)
+    if teacher is None:
         return HttpResponseForbidden('您的教師資料不完整,請聯繫管理員')
     
     if request.method == 'POST':
@@ -374,7 +439,6 @@ def teacher_add_course(request):
             course.teacher = teacher
             course.save()
             
-            from django.contrib import messages
             messages.success(request, f'課程 {course.course_name} 已成功建立!')
             return redirect('courses:teacher_dashboard')
     else:
@@ -388,64 +452,146 @@ def teacher_add_course(request):
     return render(request, 'courses/teacher_add_course.html', context)
 
 
-@login_required
+@roles.role_required('teacher')
 def teacher_course_students(request, course_id):
     """查看教師的課程選修學生"""
-    try:
-        profile = request.user.profile
-    except UserProfile.DoesNotExist:
-        return HttpResponseForbidden('您的帳號沒有關聯的用戶資料,請聯繫管理員')
+    course = get_object_or_404(Course.objects.select_related('teacher'), pk=course_id)
     
-    course = get_object_or_404(Course, pk=course_id)
-    
-    if profile.role != 'teacher' or course.teacher.user != request.user:
+    if not roles.is_course_teacher(request.user, course):
         return HttpResponseForbidden('無法訪問其他教師的課程')
     
-    enrollments = Enrollment.objects.filter(course=course, is_active=True)
+    enrollments = Enrollment.objects.filter(course=course, is_active=True).select_related('user')
     
-    # 處理成績更新
+    # 處理整頁成績登錄
+    rows, errors = [], {}
     if request.method == 'POST':
-        enrollment_id = request.POST.get('enrollment_id')
-        midterm = request.POST.get('midterm_score')
-        final = request.POST.get('final_score')
-        
-        enrollment = get_object_or_404(Enrollment, id=enrollment_id, course=course)
-        updated = False
-        if midterm:
-            enrollment.midterm_score = midterm
-            updated = True
-        if final:
-            enrollment.final_score = final
-            updated = True
-        
-        if updated:
-            enrollment.save()
-            from django.contrib import messages
-            messages.success(request, f'已成功更新 {enrollment.user.get_full_name()} 的成績!')
-        
-        return redirect('courses:teacher_course_students', course_id=course.pk)
+        rows = gradebook.rows_from_post(request.POST)
+        # 表單載入後才退選的學生略過，不影響其他學生的成績
+        result = gradebook.apply_grades(course, rows, skip_inactive=True)
+        if result.skipped:
+            names = '、'.join(row['student'] for row in result.skipped)
+            messages.warning(request, f'{names} 已退選，其成績未更新')
+        if result.ok:
+            messages.success(request, f'已更新 {result.updated} 位學生的成績，{result.unchanged} 位未變更')
+            return redirect('courses:teacher_course_students', course_id=course.pk)
+        messages.error(request, f'有 {len(result.errors)} 位學生的成績格式錯誤，所有變更皆未儲存')
+        errors = {str(error['enrollment_id']): error['errors'] for error in result.errors}
+    
+    # 驗證失敗時保留已輸入的分數
+    posted = {str(row['enrollment_id']): row for row in rows}
+    graded = grading.grade_enrollments(enrollments)
+    for enrollment in graded:
+        row = posted.get(str(enrollment.pk), {})
+        enrollment.score_inputs = {field: row.get(field, getattr(enrollment, field)) for field in gradebook.SCORE_FIELDS}
+        enrollment.score_errors = errors.get(str(enrollment.pk), {})
     
     context = {
         'course': course,
-        'enrollments': enrollments,
+        'enrollments': graded,
+        'stats': stats.get_course_stats(course),
         'page': 'teacher_course_students',
         'title': f'{course.course_name} - 修課學生'
     }
     return render(request, 'courses/teacher_course_students.html', context)
 
 
-# 管理員視圖
-@login_required
-def admin_dashboard(request):
-    """管理員儀表板"""
+@roles.role_required('teacher', 'admin')
+def teacher_course_stats(request, course_id):
+    """課程成績統計 API（任課教師與管理員可查看）"""
+    course = get_object_or_404(Course.objects.select_related('teacher'), pk=course_id)
+    
+    if not (roles.is_course_teacher(request.user, course) or roles.is_admin(request.user)):
+        return HttpResponseForbidden('無法訪問其他教師的課程')
+    
+    return JsonResponse(stats.get_course_stats(course))
+
+
+@roles.role_required('teacher')
+@require_http_methods(["POST"])
+def teacher_course_grades(request, course_id):
+    """
+    批次成績登錄 API，請求內容為
+    {"grades": [{"enrollment_id": 1, "midterm_score": 85, "final_score": 90}, ...]}
+    """
+    course = get_object_or_404(Course.objects.select_related('teacher'), pk=course_id)
+    
+    if not roles.is_course_teacher(request.user, course):
+        return HttpResponseForbidden('無法訪問其他教師的課程')
+    
     try:
-        profile = request.user.profile
-    except UserProfile.DoesNotExist:
-        return HttpResponseForbidden('您的帳號沒有關聯的用戶資料，請聯繫管理員')
+        grades = json.loads(request.body)['grades']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': '請求內容必須是含 grades 陣列的 JSON'}, status=400)
+    if not isinstance(grades, list) or not all(isinstance(row, dict) for row in grades):
+        return JsonResponse({'error': 'grades 必須是物件陣列'}, status=400)
+    
+    result = gradebook.apply_grades(course, grades)
+    return JsonResponse(result.as_dict(), status=200 if result.ok else 400)
+
+
+@roles.role_required('teacher')
+def teacher_import_grades(request, course_id):
+    """匯入課程成績單（CSV/XLSX）"""
+    course = get_object_or_404(Course.objects.select_related('teacher'), pk=course_id)
+    
+    if not roles.is_course_teacher(request.user, course):
+        return HttpResponseForbidden('無法訪問其他教師的課程')
+    
+    result = None
+    if request.method == 'POST':
+        form = GradeImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            try:
+                result = grade_import.import_grades(
+                    course, form.cleaned_data['file'], form.cleaned_data['file_format'],
+                    dry_run=form.cleaned_data['dry_run'],
+                )
+            except ValidationError as e:
+                form.add_error('file', e)
+        if result is not None and result.applied:
+            messages.success(request, f'已匯入 {result.changed} 位學生的成績，{result.unchanged} 位未變更')
+            return redirect('courses:teacher_course_students', course_id=course.pk)
+    else:
+        form = GradeImportForm()
+    
+    context = {
+        'course': course,
+        'form': form,
+        'result': result,
+        'page': 'teacher_import_grades',
+        'title': f'{course.course_name} - 匯入成績'
+    }
+    return render(request, 'courses/teacher_import_grades.html', context)
+
+
+# 成績匯出
+@roles.role_required('teacher', 'admin')
+def export_course_gradebook(request, course_id):
+    """匯出課程成績單（任課教師與管理員）"""
+    course = get_object_or_404(Course.objects.select_related('teacher'), pk=course_id)
     
-    if not request.user.is_staff or profile.role != 'admin':
-        return HttpResponseForbidden('只有管理員可以訪問此頁面')
+    if not (roles.is_course_teacher(request.user, course) or roles.is_admin(request.user)):
+        return HttpResponseForbidden('無法訪問其他教師的課程')
     
+    return exports.course_gradebook(course)
+
+
+@roles.role_required('student', message='只有學生可以匯出成績單')
+def export_transcript(request):
+    """匯出自己的歷年成績"""
+    return exports.student_transcript(request.user)
+
+
+@roles.role_required('admin', message='只有管理員可以匯出全校資料')
+def export_semester(request):
+    """匯出整學期選課與成績資料（?semester=2024-1，未指定時為全部學期）"""
+    return exports.semester_enrollments(request.GET.get('semester', '').strip())
+
+
+# 管理員視圖
+@roles.role_required('admin', message='只有管理員可以訪問此頁面')
+def admin_dashboard(request):
+    """管理員儀表板"""
     stats = {
         'total_users': User.objects.count(),
         'total_students': UserProfile.objects.filter(role='student').count(),
@@ -462,17 +608,9 @@ def admin_dashboard(request):
     return render(request, 'courses/admin_dashboard.html', context)
 
 
-@login_required
+@roles.role_required('admin', message='只有管理員可以執行此操作')
 def admin_add_teacher(request):
     """管理員新增教師帳號"""
-    try:
-        profile = request.user.profile
-    except UserProfile.DoesNotExist:
-        return HttpResponseForbidden('您的帳號沒有關聯的用戶資料,請聯繫管理員')
-    
-    if not request.user.is_staff or profile.role != 'admin':
-        return HttpResponseForbidden('只有管理員可以執行此操作')
-    
     if request.method == 'POST':
         user_form = UserRegistrationForm(request.POST)
         teacher_form = TeacherForm(request.POST)
@@ -498,11 +636,9 @@ def admin_add_teacher(request):
                 teacher.save()
                 
                 # 重定向到教師列表頁面,顯示成功訊息
-                from django.contrib import messages
                 messages.success(request, f'教師帳號 {user.username} 已成功建立!')
                 return redirect('courses:admin_teacher_list')
             except Exception as e:
-                from django.contrib import messages
                 messages.error(request, f'建立教師帳號時發生錯誤: {str(e)}')
     else:
         user_form = UserRegistrationForm()
@@ -517,12 +653,9 @@ def admin_add_teacher(request):
     return render(request, 'courses/admin_add_teacher.html', context)
 
 
-@login_required
+@roles.role_required('admin', message='只有管理員可以執行此操作')
 def admin_add_course(request):
     """管理員新增課程"""
-    if not request.user.is_staff or request.user.profile.role != 'admin':
-        return HttpResponseForbidden('只有管理員可以執行此操作')
-    
     if request.method == 'POST':
         form = CourseForm(request.POST)
         if form.is_valid():
@@ -544,13 +677,10 @@ def admin_add_course(request):
     return render(request, 'courses/admin_add_course.html', context)
 
 
-@login_required
+@roles.role_required('admin', message='只有管理員可以執行此操作')
 def admin_teacher_list(request):
     """管理員查看教師列表"""
-    if not request.user.is_staff or request.user.profile.role != 'admin':
-        return HttpResponseForbidden('只有管理員可以執行此操作')
-    
-    teachers = Teacher.objects.all()
+    teachers = Teacher.objects.select_related('user').annotate(course_count=Count('course_set'))
     
     context = {
         'teachers': teachers,
@@ -560,12 +690,9 @@ def admin_teacher_list(request):
     return render(request, 'courses/admin_teacher_list.html', context)
 
 
-@login_required
+@roles.role_required('admin', message='只有管理員可以執行此操作')
 def admin_delete_teacher(request, teacher_id):
     """管理員刪除教師"""
-    if not request.user.is_staff or request.user.profile.role != 'admin':
-        return HttpResponseForbidden('只有管理員可以執行此操作')
-    
     teacher = get_object_or_404(Teacher, pk=teacher_id)
     user = teacher.user
     
@@ -582,28 +709,24 @@ def admin_delete_teacher(request, teacher_id):
     return render(request, 'courses/confirm_delete.html', context)
 
 
-@login_required
+@roles.role_required('admin', message='只有管理員可以執行此操作')
 def admin_course_list(request):
     """管理員查看課程列表"""
-    if not request.user.is_staff or request.user.profile.role != 'admin':
-        return HttpResponseForbidden('只有管理員可以執行此操作')
-    
-    courses = Course.objects.all()
+    courses = Course.objects.select_related('teacher__user')
+    page_obj = paginate(request, courses, 'course_code', get_page_size(request))
     
     context = {
-        'courses': courses,
+        'courses': page_obj,
+        'page_obj': page_obj,
         'title': '課程管理',
         'page': 'admin_course_list'
     }
     return render(request, 'courses/admin_course_list.html', context)
 
 
-@login_required
+@roles.role_required('admin', message='只有管理員可以執行此操作')
 def admin_delete_course(request, course_id):
     """管理員刪除課程"""
-    if not request.user.is_staff or request.user.profile.role != 'admin':
-        return HttpResponseForbidden('只有管理員可以執行此操作')
-    
     course = get_object_or_404(Course, pk=course_id)
     
     if request.method == 'POST':
@@ -616,3 +739,22 @@ def admin_delete_course(request, course_id):
         'title': '確認刪除'
     }
     return render(request, 'courses/confirm_delete.html', context)
+
+
+# 效能統計
+@staff_member_required
+def profiling_stats(request):
+    """各視圖的耗時與查詢統計（?reset=1 清除）"""
+    if request.GET.get('reset'):
+        profiling.reset()
+    return JsonResponse({'views': profiling.snapshot()}, json_dumps_params={'ensure_ascii': False})
+
+
+def profiling_metrics(request):
+    """Prometheus 文字格式；員工登入或帶有 PROFILING_METRICS_TOKEN 的 Bearer 權杖時可存取"""
+    token = settings.PROFILING_METRICS_TOKEN
+    header = request.headers.get('Authorization', '')
+    authorized = bool(token) and constant_time_compare(header, f'Bearer {token}')
+    if not authorized and not (request.user.is_active and request.user.is_staff):
+        return HttpResponseForbidden('只有員工可以查看效能統計')
+    return HttpResponse(profiling.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
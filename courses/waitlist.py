@@ -0,0 +1,101 @@
+"""
+課程候補名單
+
+課程額滿時學生加入候補名單（WaitlistEntry），依加入順序遞補：
+- 排隊順序就是自動遞增的 id，加入只需一次 INSERT，不必讀取或更新隊尾；
+- 名次為同一門課中 id 不大於自己的記錄數，以 (course, id) 索引計算，
+  學生可以輪詢 course_waitlist_api 取得名次，不必重新載入儀表板；
+- seats.release_seat() 在退選的同一個交易中呼叫 promote()，名額空出時由隊首遞補，
+  不會有其他學生在兩者之間搶走名額；
+- 課程儲存時（例如在管理後台調高 max_students）由 signals 呼叫 promote()；
+- join() 加入後也呼叫一次 promote()，避免與退選同時發生時，退選的交易看不到尚未
+  提交的候補記錄、名額就此空著。
+
+遞補透過 seats.allocate_seat() 佔用名額，與一般選課共用同一個條件式 UPDATE，
+候補不會造成超收。
+"""
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, OuterRef, Subquery
+
+from . import seats
+from .models import WaitlistEntry
+
+# 加入候補的結果
+WAITING = 'waiting'
+ALREADY_WAITING = 'already_waiting'
+PROMOTED = 'promoted'
+
+
+def _rank_subquery(entry_ref):
+    """entry_ref 所指候補記錄的名次（同一門課中 id 不大於它的記錄數）"""
+    return Subquery(
+        WaitlistEntry.objects.filter(course=OuterRef(f'{entry_ref}course'), pk__lte=OuterRef(f'{entry_ref}pk'))
+        .order_by()
+        .values('course')
+        .annotate(rank=Count('pk'))
+        .values('rank')
+    )
+
+
+def position(user, course):
+    """學生在課程候補名單中的名次（從 1 起算），不在名單中回傳 None；只執行一次查詢"""
+    course_id = getattr(course, 'pk', course)
+    entry = WaitlistEntry.objects.filter(course_id=course_id, user=user)
+    rank = (
+        WaitlistEntry.objects.filter(course_id=course_id, pk__lte=Subquery(entry.order_by().values('pk')[:1]))
+        .count()
+    )
+    return rank or None
+
+
+def entries_for(user):
+    """學生所有的候補記錄，附上課程與名次（position）"""
+    return (
+        WaitlistEntry.objects.filter(user=user)
+        .select_related('course')
+        .annotate(position=_rank_subquery(''))
+        .order_by('created_at')
+    )
+
+
+def promote(course_id):
+    """名額空出時依序讓隊首學生遞補，回傳 [(使用者, Enrollment)]；應在交易中呼叫"""
+    promoted = []
+    while True:
+        entry = WaitlistEntry.objects.filter(course_id=course_id).select_related('user').order_by('pk').first()
+        if entry is None:
+            break
+        result, enrollment = seats.allocate_seat(entry.user, course_id)
+        if result == seats.FULL:
+            break
+        # 已在選修中（例如退選後又自行加選）的學生直接移出名單
+        entry.delete()
+        if result in (seats.ENROLLED, seats.REACTIVATED):
+            promoted.append((entry.user, enrollment))
+    return promoted
+
+
+def join(user, course):
+    """
+    課程額滿時加入候補，回傳 (結果, 名次)：WAITING 或 ALREADY_WAITING 時為目前名次，
+    PROMOTED 表示加入時恰好有空出的名額，已直接選課
+    """
+    course_id = getattr(course, 'pk', course)
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                WaitlistEntry.objects.create(course_id=course_id, user=user)
+            result = WAITING
+        except IntegrityError:
+            result = ALREADY_WAITING
+        if any(promoted_user.pk == user.pk for promoted_user, _ in promote(course_id)):
+            return PROMOTED, None
+    return result, position(user, course_id)
+
+
+def leave(user, course):
+    """退出候補，回傳是否原本在名單中"""
+    course_id = getattr(course, 'pk', course)
+    deleted, _ = WaitlistEntry.objects.filter(course_id=course_id, user=user).delete()
+    return bool(deleted)
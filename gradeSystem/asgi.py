@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gradeSystem.settings')
+# 課程目錄與儀表板改用非同步視圖（courses/async_views.py）
+os.environ.setdefault('ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
@@ -42,10 +42,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'courses.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
+    'courses.middleware.ReplicaPinMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
@@ -55,7 +57,8 @@ ROOT_URLCONF = 'gradeSystem.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # 與 DjangoTemplates 相同，另外記錄渲染時間（courses/profiling.py）
+        'BACKEND': 'courses.profiling.ProfilingTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -70,14 +73,120 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'gradeSystem.wsgi.application'
 
+# 課程目錄、課程詳情與儀表板使用非同步視圖，asgi.py 預設開啟
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', '0') == '1'
+
 
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
+# 以環境變數 DB_PROFILE 選擇資料庫設定：sqlite（預設）或 postgresql（需安裝 psycopg）
+
+DB_PROFILE = os.environ.get('DB_PROFILE', 'sqlite')
+
+DATABASE_PROFILES = {
+    'sqlite': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+        'OPTIONS': {
+            # 交易一開始就取得寫入鎖，鎖被佔用時依 busy_timeout 等待，
+            # 避免讀取後才升級為寫入時直接回報 database is locked
+            'transaction_mode': 'IMMEDIATE',
+        },
+    },
+    'postgresql': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('DB_NAME', 'grade_system'),
+        'USER': os.environ.get('DB_USER', ''),
+        'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+        'HOST': os.environ.get('DB_HOST', ''),
+        'PORT': os.environ.get('DB_PORT', ''),
+        # 持久連線，重複使用前先檢查連線是否仍可用
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+    },
+}
 
 DATABASES = {
+    'default': DATABASE_PROFILES[DB_PROFILE],
+}
+
+# 唯讀副本，由 courses.routers.ReplicaRouter 分配讀取
+# sqlite：DB_REPLICAS 為副本數量，副本為 db.replica1.sqlite3 等檔案，
+#         由 manage.py replicate 從主資料庫複製（本機測試用）
+# postgresql：DB_REPLICA_HOSTS 以逗號分隔各副本的主機
+if DB_PROFILE == 'sqlite':
+    REPLICA_SETTINGS = [
+        {'NAME': BASE_DIR / f'db.replica{i}.sqlite3'}
+        for i in range(1, int(os.environ.get('DB_REPLICAS', 0)) + 1)
+    ]
+else:
+    REPLICA_SETTINGS = [
+        {'HOST': host}
+        for host in os.environ.get('DB_REPLICA_HOSTS', '').split(',') if host
+    ]
+
+REPLICA_DATABASES = []
+for i, replica in enumerate(REPLICA_SETTINGS, 1):
+    DATABASES[f'replica{i}'] = {**DATABASES['default'], **replica, 'TEST': {'MIRROR': 'default'}}
+    REPLICA_DATABASES.append(f'replica{i}')
+
+DATABASE_ROUTERS = ['courses.routers.ReplicaRouter']
+
+# 使用者寫入後，這段時間內的讀取都使用主資料庫（秒）
+REPLICA_PIN_SECONDS = 5
+
+# 效能統計（courses/profiling.py）：每個視圖保留的樣本數、以 cProfile 取樣的請求比例，
+# 以及 Prometheus 以 Bearer 權杖抓取 /profiling/metrics 時使用的權杖（空字串表示只限員工）
+PROFILING_WINDOW = 1000
+PROFILING_CPROFILE_RATE = float(os.environ.get('PROFILING_CPROFILE_RATE', 0))
+PROFILING_PROFILES_KEPT = 5
+PROFILING_PROFILE_LINES = 30
+PROFILING_METRICS_TOKEN = os.environ.get('PROFILING_METRICS_TOKEN', '')
+
+# benchmark_suite 命令存放資料集、結果與基準的目錄（courses/benchmarks.py）
+BENCHMARK_DIR = os.environ.get('BENCHMARK_DIR', os.path.join(BASE_DIR, 'benchmarks'))
+
+# 未登入的課程目錄與課程頁面可由反向代理快取的秒數，過期後以 ETag 重新驗證（courses/conditional.py）
+PUBLIC_PAGE_MAX_AGE = 60
+
+# SQLite 連線建立時執行的 PRAGMA（courses/database.py）
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 10000,  # 毫秒
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64000,  # 負值表示 KiB
+}
+
+
+# Cache
+# 以環境變數 CACHE_BACKEND 選擇快取後端：locmem（預設，單一行程）、
+# file（CACHE_DIR，同一台主機的多個 worker 共用）、redis（REDIS_URL，多台主機共用）
+
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'grade-system',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR', os.path.join(BASE_DIR, '.cache')),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/1'),
+    },
+}
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        **CACHE_BACKENDS[CACHE_BACKEND],
+        'KEY_PREFIX': 'grade-system',
+        'TIMEOUT': 600,
     }
 }
 
@@ -123,14 +232,24 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = 'media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# 頭像縮圖尺寸（px）與背景處理的執行緒數，0 表示交易提交後同步處理（courses/avatars.py）
+AVATAR_SIZES = (32, 64, 300)
+AVATAR_WORKERS = 2
+
 # Login settings
 LOGIN_URL = 'courses:login'
 LOGIN_REDIRECT_URL = 'courses:dashboard'
 LOGOUT_REDIRECT_URL = 'courses:index'
 
+# 以一次查詢載入 request.user 及其 profile/teacher，並經過快取（courses/roles.py）
+AUTHENTICATION_BACKENDS = ['courses.backends.CachedModelBackend']
+
 # Session settings
 SESSION_COOKIE_AGE = 1209600  # 2 weeks
 SESSION_SAVE_EVERY_REQUEST = True  # Renew session on every request
+# 續期只在資料庫中的期限不足時寫入，每位使用者每小時最多一次（courses/sessions.py）
+SESSION_ENGINE = 'courses.sessions'
+SESSION_RENEW_INTERVAL = 60 * 60
 
 # CSRF settings
 CSRF_TRUSTED_ORIGINS = [